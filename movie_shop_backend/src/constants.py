@@ -1,4 +1,90 @@
-STATE_FILE = "app_state.json"
+import os
+
+STATE_FILE = os.getenv("STATE_FILE", "app_state.json")
 MOVIE_NOT_FOUND_MESSAGE = "Movie Not Found"
 SHOP_NOT_FOUND_MESSAGE = "Shop Not Found"
 SHOP_INVALID_MESSAGE = "Invalid Shop Id"
+INVALID_CURSOR_MESSAGE = "Invalid Cursor"
+DUPLICATE_MOVIE_MESSAGE = "Duplicate Movie Id"
+RESERVED_MOVIE_ID_MESSAGE = "Movie Id Not Yet Issued By This Shard"
+BULK_TOO_LARGE_MESSAGE = "Too Many Items"
+PRIMARY_UNAVAILABLE_MESSAGE = "Primary Unavailable"
+STORAGE_UNAVAILABLE_MESSAGE = "Storage Unavailable"
+
+# Largest array accepted by the /movies/bulk routes
+BULK_MAX_ITEMS = int(os.getenv("BULK_MAX_ITEMS", "50000"))
+
+# Listing pagination: `limit` is capped at MAX_PAGE_LIMIT; requests without `limit`
+# use DEFAULT_PAGE_LIMIT, where 0 keeps returning the whole collection
+MAX_PAGE_LIMIT = int(os.getenv("MAX_PAGE_LIMIT", "1000"))
+DEFAULT_PAGE_LIMIT = int(os.getenv("DEFAULT_PAGE_LIMIT", "0"))
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+# Seconds the server took to answer, on every response (also recorded for GET /metrics)
+PROCESS_TIME_HEADER = "X-Process-Time"
+# Listings requested with "Accept: application/x-ndjson" are streamed one record per
+# line, reading STREAM_PAGE_SIZE records from the repository at a time
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+STREAM_PAGE_SIZE = int(os.getenv("STREAM_PAGE_SIZE", "500"))
+# Search result cache: up to SEARCH_CACHE_SIZE queries (0 disables it), each kept at most
+# SEARCH_CACHE_TTL seconds (0 = until a movie changes)
+SEARCH_CACHE_SIZE = int(os.getenv("SEARCH_CACHE_SIZE", "256"))
+SEARCH_CACHE_TTL = float(os.getenv("SEARCH_CACHE_TTL", "60"))
+
+# Threads running the (synchronous) route handlers; the repositories are thread safe
+THREADPOOL_SIZE = int(os.getenv("THREADPOOL_SIZE", "40"))
+
+# Storage backend: "memory" keeps everything in process memory and persists it with the
+# snapshot/journal settings below, "sqlite" stores it in SQLITE_FILE (WAL mode)
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "memory")
+SQLITE_FILE = os.getenv("SQLITE_FILE", "app_state.db")
+
+# Persistence
+# "snapshot": rewrite STATE_FILE after every mutation (the default, as before the journal existed)
+# "journal": append one record per mutation to JOURNAL_FILE and fold it into STATE_FILE periodically;
+# opt-in, and required by read replicas
+PERSISTENCE_MODE = os.getenv("PERSISTENCE_MODE", "snapshot")
+JOURNAL_FILE = os.getenv("JOURNAL_FILE", "app_state.journal")
+JOURNAL_COMPACT_EVERY = int(os.getenv("JOURNAL_COMPACT_EVERY", "10000"))
+# Snapshot written to STATE_FILE: "json", "binary" ("none", "gzip" or "zstd" compression) or
+# "segments" (STATE_FILE is a manifest of per-shop files and a save only rewrites the shops
+# that changed). load_state detects the format of an existing file on its own.
+SNAPSHOT_FORMAT = os.getenv("SNAPSHOT_FORMAT", "json")
+SNAPSHOT_COMPRESSION = os.getenv("SNAPSHOT_COMPRESSION", "none")
+# Startup from an uncompressed binary snapshot: memory-map it and decode movies and shops on first access.
+# Records whose file checksum was verified are trusted and skip pydantic validation.
+# The checksum covers the whole file, so verifying it reads every page the lazy load
+# means to skip: there it is opt-in (SNAPSHOT_LAZY_VERIFY_CHECKSUM) and each record is
+# validated when decoded instead.
+SNAPSHOT_LAZY_LOAD = os.getenv("SNAPSHOT_LAZY_LOAD", "0") == "1"
+SNAPSHOT_VERIFY_CHECKSUM = os.getenv("SNAPSHOT_VERIFY_CHECKSUM", "1") == "1"
+SNAPSHOT_LAZY_VERIFY_CHECKSUM = os.getenv("SNAPSHOT_LAZY_VERIFY_CHECKSUM", "0") == "1"
+# Snapshots and journal compactions written by a forked child process, so the server does
+# no serialization work at all (needs os.fork, ignored elsewhere). Off by default: the server
+# runs threads, and a lock one of them holds at the fork stays locked forever in the child,
+# so a save can hang. The server kills a child still running after SNAPSHOT_FORK_TIMEOUT
+# seconds (0 = wait forever) and counts the save as failed.
+SNAPSHOT_FORK = os.getenv("SNAPSHOT_FORK", "0") == "1"
+SNAPSHOT_FORK_TIMEOUT = float(os.getenv("SNAPSHOT_FORK_TIMEOUT", "600"))
+# Background writer: flush at most every PERSISTENCE_FLUSH_INTERVAL seconds, or as soon
+# as PERSISTENCE_FLUSH_BATCH_SIZE writes are pending.
+# PERSISTENCE_ACK "flush" answers a write once it is on disk, "immediate" answers right away.
+PERSISTENCE_FLUSH_INTERVAL = float(os.getenv("PERSISTENCE_FLUSH_INTERVAL", "0.01"))
+PERSISTENCE_FLUSH_BATCH_SIZE = int(os.getenv("PERSISTENCE_FLUSH_BATCH_SIZE", "100"))
+PERSISTENCE_ACK = os.getenv("PERSISTENCE_ACK", "flush")
+
+# Multi-process deployment. A process without PRIMARY_URL owns the data and is the only
+# writer (a second one on the same STATE_FILE fails at startup). With PRIMARY_URL set the
+# process is a read replica: it loads the primary's snapshot, applies the records the primary
+# appends to JOURNAL_FILE every REPLICA_POLL_INTERVAL seconds, serves the GET routes itself
+# and forwards writes to the primary. Replicas need the memory backend in journal mode.
+PRIMARY_URL = os.getenv("PRIMARY_URL", "")
+REPLICA_POLL_INTERVAL = float(os.getenv("REPLICA_POLL_INTERVAL", "0.05"))
+
+# Sharding by shop id. Shard SHARD_INDEX of SHARD_COUNT (each with its own STATE_FILE and
+# JOURNAL_FILE) only hands out ids i + 1, i + 1 + K, ...; a shop and all its movies live on the
+# shard that created the shop. The router (src/shard_router.py) takes the comma separated
+# SHARD_URLS, in shard order, and sends every request to the shard(s) that hold its data.
+SHARD_INDEX = int(os.getenv("SHARD_INDEX", "0"))
+SHARD_COUNT = int(os.getenv("SHARD_COUNT", "1"))
+SHARD_URLS = [url for url in os.getenv("SHARD_URLS", "").split(",") if url]
+SHARD_UNAVAILABLE_MESSAGE = "Shard Unavailable"
@@ -0,0 +1,139 @@
+import os, gc, time, signal, threading
+from datetime import datetime, timezone
+from typing import Callable, Optional
+
+class SnapshotProcessError(RuntimeError):
+    pass
+
+
+class SnapshotWriter:
+    """
+    Runs the saves of the in-memory store (snapshots and journal compactions)
+    and keeps their status for /admin/snapshot.
+
+    With `fork` every save runs in a child process forked for it, like a Redis
+    BGSAVE: the child gets a copy-on-write image of the parent's memory, so the
+    version taken before the fork is all there, serializes it, writes the file
+    and exits. The parent only waits for it in the calling thread, without the
+    GIL, and keeps answering requests with no serialization work of its own.
+    Pages the parent changes while the child runs are copied, so memory can
+    grow by up to the size of the store during a save. Without os.fork
+    (Windows) saves run in the calling thread, as without `fork`.
+
+    Forking a process that runs threads is unsafe: any lock another thread
+    holds at the fork (logging, the journal, a lazily loaded snapshot, the
+    allocator) is copied locked and never released in the child. The child
+    therefore only runs the save and reports errors with a bare write to
+    fd 2, and the parent kills it when it has not finished after `timeout`
+    seconds (None for no limit), which counts as a failed save.
+    """
+
+    def __init__(self, fork: bool = False, timeout: Optional[float] = None):
+        self.mode = "fork" if fork and hasattr(os, "fork") else "thread"
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self.in_progress = False
+        self.pid: Optional[int] = None
+        self.started_at: Optional[datetime] = None
+        self.last_duration: Optional[float] = None
+        self.last_success_at: Optional[datetime] = None
+        self.last_error: Optional[str] = None
+        self.saves = 0
+        self.failures = 0
+
+    def run(self, save: Callable[[], None]):
+        """Runs `save`, in a child process in fork mode; raises when it fails"""
+        with self._lock:
+            self.in_progress = True
+            self.started_at = datetime.now(timezone.utc)
+        start = time.perf_counter()
+        try:
+            if self.mode == "fork":
+                self._run_forked(save)
+            else:
+                save()
+        except BaseException as exc:
+            with self._lock:
+                self._finish(start)
+                self.failures += 1
+                self.last_error = str(exc) or type(exc).__name__
+            raise
+        with self._lock:
+            self._finish(start)
+            self.saves += 1
+            self.last_success_at = datetime.now(timezone.utc)
+            self.last_error = None
+
+    def _finish(self, start: float):
+        self.in_progress = False
+        self.pid = None
+        self.last_duration = time.perf_counter() - start
+
+    def _run_forked(self, save: Callable[[], None]):
+        pid = os.fork()
+        if pid == 0:
+            _run_child(save)
+        self.pid = pid
+        exit_code = _wait_child(pid, self.timeout)
+        if exit_code is None:
+            os.kill(pid, signal.SIGKILL)
+            os.waitpid(pid, 0)
+            raise SnapshotProcessError(f"Snapshot process {pid} killed after {self.timeout:g} s")
+        if exit_code != 0:
+            raise SnapshotProcessError(f"Snapshot process {pid} failed with exit code {exit_code}")
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "mode": self.mode,
+                "in_progress": self.in_progress,
+                "pid": self.pid,
+                "started_at": self.started_at,
+                "last_duration": self.last_duration,
+                "last_success_at": self.last_success_at,
+                "last_error": self.last_error,
+                "saves": self.saves,
+                "failures": self.failures,
+            }
+
+
+def _wait_child(pid: int, timeout: Optional[float]) -> Optional[int]:
+    # Exit code of the child, None when it is still running after `timeout` seconds
+    if timeout is None:
+        return os.waitstatus_to_exitcode(os.waitpid(pid, 0)[1])
+    deadline = time.monotonic() + timeout
+    delay = 0.001
+    while True:
+        finished, wait_status = os.waitpid(pid, os.WNOHANG)
+        if finished:
+            return os.waitstatus_to_exitcode(wait_status)
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return None
+        time.sleep(min(delay, remaining))
+        delay = min(delay * 2, 0.1)
+
+
+def _run_child(save: Callable[[], None]):
+    # Only this thread exists in the child, and locks other threads held at the fork
+    # stay locked: nothing but the save runs here, and no logging. It never returns:
+    # os._exit skips the cleanup of the parent's copies, above all the journal buffer,
+    # which must not be flushed a second time from here.
+    exit_code = 1
+    try:
+        # A collection would write to every object, copying the pages shared with the parent
+        gc.disable()
+        # Signals are for the server: Ctrl-C lets the save finish (the parent waits for
+        # it when shutting down) and none is passed on to the parent's event loop
+        signal.set_wakeup_fd(-1)
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        save()
+        exit_code = 0
+    except BaseException as exc:
+        try:
+            os.write(2, f"Snapshot process {os.getpid()} failed: {type(exc).__name__}: {exc}\n".encode(errors="replace"))
+        except BaseException:
+            pass
+    finally:
+        os._exit(exit_code)
@@ -0,0 +1,246 @@
+import gzip, struct, zlib
+from array import array
+from typing import Dict, List
+from src.schemas.schemas import Movie, Shop
+
+try:
+    import zstandard
+except ImportError:  # optional dependency, only needed for zstd snapshots
+    zstandard = None
+
+# Binary snapshot layout (little endian)
+#
+#     magic        8 bytes  b"MSHPSNAP"
+#     header       version u16, compression u8, pad u8, next_movie_id u64, next_shop_id u64
+#     body         (compressed as a whole when compression != none)
+#         strings  u32 count, then per string: u32 length + utf-8 bytes
+#         movies   u32 count, then per movie: u32 record length + record
+#                  record: id u64, shop u64, rent u8, director u32, genre count u16,
+#                          genre u32 * count, name u32 (version 3; before: name length u32 + utf-8 bytes)
+#         shops    u32 count, then per shop: u32 record length + record
+#                  record: id u64, address length u32 + bytes, manager length u32 + bytes,
+#                          movie count u32, movie id u64 * count
+#     index        (version 2 and later, never compressed)
+#                  movies: u32 count, then (id u64, record offset u64) * count
+#                  shops:  u32 count, then (id u64, record offset u64) * count
+#                  offsets are relative to the start of the uncompressed body
+#     footer       (version 2 and later) index offset u64, crc32 u32 of everything before the footer, b"MIDX"
+#
+# Names, directors and genres are stored once in the string table and referenced by
+# index, so the copies of a film in many shops share one name.
+
+MAGIC = b"MSHPSNAP"
+VERSION = 3
+COMPRESSIONS = {"none": 0, "gzip": 1, "zstd": 2}
+FOOTER_MAGIC = b"MIDX"
+
+_HEADER = struct.Struct("<HBxQQ")
+_U32 = struct.Struct("<I")
+_U64 = struct.Struct("<Q")
+_MOVIE_HEAD = struct.Struct("<QQBIH")
+_FOOTER = struct.Struct("<QI4s")
+
+BODY_OFFSET = len(MAGIC) + _HEADER.size
+
+
+class SnapshotChecksumError(ValueError):
+    pass
+
+
+def is_binary_snapshot(filename: str) -> bool:
+    with open(filename, "rb") as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def _pack_str(value: str) -> bytes:
+    raw = value.encode("utf-8")
+    return _U32.pack(len(raw)) + raw
+
+
+def _compress(body: bytes, compression: str) -> bytes:
+    if compression == "gzip":
+        return gzip.compress(body, compresslevel=6)
+    if compression == "zstd":
+        if zstandard is None:
+            raise RuntimeError("zstd snapshots require the 'zstandard' package")
+        return zstandard.ZstdCompressor().compress(body)
+    return body
+
+
+def _decompress(body: bytes, compression: int) -> bytes:
+    if compression == COMPRESSIONS["gzip"]:
+        return gzip.decompress(body)
+    if compression == COMPRESSIONS["zstd"]:
+        if zstandard is None:
+            raise RuntimeError("zstd snapshots require the 'zstandard' package")
+        return zstandard.ZstdDecompressor().decompress(body)
+    return body
+
+
+def _pack_index(entries: List[int]) -> bytes:
+    # entries is a flat [id, offset, id, offset, ...] list
+    return _U32.pack(len(entries) // 2) + array("Q", entries).tobytes()
+
+
+def read_str(buf, pos: int):
+    (length,) = _U32.unpack_from(buf, pos)
+    pos += 4
+    return bytes(buf[pos:pos + length]).decode("utf-8"), pos + length
+
+
+def read_movie(buf, pos: int, strings: List[str], trusted: bool, version: int = VERSION) -> Movie:
+    movie_id, shop_id, rent, director, n_genres = _MOVIE_HEAD.unpack_from(buf, pos)
+    pos += _MOVIE_HEAD.size
+    genres = [strings[i] for i in struct.unpack_from(f"<{n_genres}I", buf, pos)]
+    if version >= 3:
+        name = strings[_U32.unpack_from(buf, pos + 4 * n_genres)[0]]
+    else:
+        name, _ = read_str(buf, pos + 4 * n_genres)
+    if trusted:
+        # The checksum proves this is the record we wrote from an already valid Movie
+        return Movie.model_construct(id=movie_id, name=name, director=strings[director], genres=genres, shop=shop_id, rent=bool(rent))
+    return Movie(id=movie_id, name=name, director=strings[director], genres=genres, shop=shop_id, rent=bool(rent))
+
+
+def read_shop_record(buf, pos: int):
+    (shop_id,) = _U64.unpack_from(buf, pos)
+    address, pos = read_str(buf, pos + 8)
+    manager, pos = read_str(buf, pos)
+    (n_movies,) = _U32.unpack_from(buf, pos)
+    movie_ids = struct.unpack_from(f"<{n_movies}Q", buf, pos + 4)
+    return shop_id, address, manager, movie_ids
+
+
+def read_strings(buf, pos: int = 0):
+    (count,) = _U32.unpack_from(buf, pos)
+    pos += 4
+    strings = []
+    for _ in range(count):
+        value, pos = read_str(buf, pos)
+        strings.append(value)
+    return strings, pos
+
+
+def read_index(buf, pos: int):
+    # Returns {id: offset} straight from the packed (id, offset) pairs
+    (count,) = _U32.unpack_from(buf, pos)
+    pos += 4
+    pairs = array("Q")
+    pairs.frombytes(bytes(buf[pos:pos + 16 * count]))
+    return dict(zip(pairs[0::2], pairs[1::2])), pos + 16 * count
+
+
+def read_header(buf):
+    if bytes(buf[:len(MAGIC)]) != MAGIC:
+        raise ValueError("Not a binary snapshot")
+    version, compression, next_movie_id, next_shop_id = _HEADER.unpack_from(buf, len(MAGIC))
+    if version not in (1, 2, VERSION):
+        raise ValueError(f"Unsupported snapshot version: {version}")
+    return version, compression, next_movie_id, next_shop_id
+
+
+def read_footer(buf, verify_checksum: bool):
+    # Returns the index offset, and whether the checksum was verified
+    footer_start = len(buf) - _FOOTER.size
+    index_offset, crc, footer_magic = _FOOTER.unpack_from(buf, footer_start)
+    if footer_magic != FOOTER_MAGIC:
+        raise ValueError("Corrupt snapshot footer")
+    if verify_checksum:
+        if zlib.crc32(buf[:footer_start]) != crc:
+            raise SnapshotChecksumError("Snapshot checksum mismatch")
+    return index_offset, verify_checksum
+
+
+def encode_state(movies: Dict[int, Movie], shops: Dict[int, Shop], next_movie_id: int, next_shop_id: int, compression: str = "none") -> bytes:
+    if compression not in COMPRESSIONS:
+        raise ValueError(f"Unknown snapshot compression: {compression}")
+    string_ids: Dict[str, int] = {}
+    strings: List[bytes] = []
+
+    def intern(value: str) -> int:
+        idx = string_ids.get(value)
+        if idx is None:
+            idx = string_ids[value] = len(strings)
+            strings.append(_pack_str(value))
+        return idx
+
+    movie_records = []
+    for movie in movies.values():
+        genres = [intern(g) for g in movie.genres]
+        movie_records.append((movie.id, b"".join((
+            _MOVIE_HEAD.pack(movie.id, movie.shop, movie.rent, intern(movie.director), len(genres)),
+            struct.pack(f"<{len(genres)}I", *genres),
+            _U32.pack(intern(movie.name)),
+        ))))
+
+    shop_records = []
+    for shop in shops.values():
+        movie_ids = [m.id for m in shop.movies]
+        shop_records.append((shop.id, b"".join((
+            _U64.pack(shop.id),
+            _pack_str(shop.address),
+            _pack_str(shop.manager),
+            _U32.pack(len(movie_ids)),
+            struct.pack(f"<{len(movie_ids)}Q", *movie_ids),
+        ))))
+
+    parts = [_U32.pack(len(strings)), *strings]
+    offset = sum(len(p) for p in parts)
+    indexes = []
+    for records in (movie_records, shop_records):
+        parts.append(_U32.pack(len(records)))
+        offset += 4
+        entries = []
+        for entity_id, record in records:
+            parts.append(_U32.pack(len(record)))
+            parts.append(record)
+            entries += (entity_id, offset + 4)
+            offset += 4 + len(record)
+        indexes.append(_pack_index(entries))
+
+    header = MAGIC + _HEADER.pack(VERSION, COMPRESSIONS[compression], next_movie_id, next_shop_id)
+    head = header + _compress(b"".join(parts), compression)
+    data = head + b"".join(indexes)
+    return data + _FOOTER.pack(len(head), zlib.crc32(data), FOOTER_MAGIC)
+
+
+def decode_state(data: bytes, verify_checksum: bool = True):
+    version, compression, next_movie_id, next_shop_id = read_header(data)
+    trusted = False
+    body_end = len(data)
+    if version >= 2:
+        body_end, trusted = read_footer(data, verify_checksum)
+    body = _decompress(data[BODY_OFFSET:body_end], compression)
+
+    strings, pos = read_strings(body)
+
+    movies: Dict[int, Movie] = {}
+    (count,) = _U32.unpack_from(body, pos)
+    pos += 4
+    for _ in range(count):
+        (length,) = _U32.unpack_from(body, pos)
+        movie = read_movie(body, pos + 4, strings, trusted, version)
+        movies[movie.id] = movie
+        pos += 4 + length
+
+    shops: Dict[int, Shop] = {}
+    (count,) = _U32.unpack_from(body, pos)
+    pos += 4
+    for _ in range(count):
+        (length,) = _U32.unpack_from(body, pos)
+        shop_id, address, manager, movie_ids = read_shop_record(body, pos + 4)
+        shop_movies = [movies[mid] for mid in movie_ids if mid in movies]
+        shops[shop_id] = Shop(id=shop_id, address=address, manager=manager, movies=shop_movies)
+        pos += 4 + length
+
+    return movies, shops, next_movie_id, next_shop_id
+
+
+def save_state_binary(filename: str, movies: Dict[int, Movie], shops: Dict[int, Shop], next_movie_id: int, next_shop_id: int, compression: str = "none"):
+    with open(filename, "wb") as f:
+        f.write(encode_state(movies, shops, next_movie_id, next_shop_id, compression))
+
+
+def load_state_binary(filename: str, verify_checksum: bool = True):
+    with open(filename, "rb") as f:
+        return decode_state(f.read(), verify_checksum)
@@ -0,0 +1,29 @@
+import argparse
+
+from src.database_manager.binary_storage import COMPRESSIONS
+from src.database_manager.local_file_storage import load_state, save_state
+
+# Converts a state snapshot between the JSON, binary and segmented formats.
+#
+#   python -m src.database_manager.convert_snapshot app_state.json app_state.bin --format binary --compression zstd
+#   python -m src.database_manager.convert_snapshot app_state.bin app_state.json --format json
+#   python -m src.database_manager.convert_snapshot app_state.json app_state.manifest --format segments
+
+def convert_snapshot(source: str, target: str, snapshot_format: str, compression: str = "none", journal_filename: str = None):
+    movies, shops, next_movie_id, next_shop_id = load_state(source, journal_filename)
+    save_state(target, movies, shops, next_movie_id, next_shop_id, snapshot_format, compression)
+    return len(movies), len(shops)
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert a movie shop state snapshot between formats.")
+    parser.add_argument("source", help="existing snapshot, JSON, binary or segments manifest (detected automatically)")
+    parser.add_argument("target", help="snapshot file to write")
+    parser.add_argument("--format", dest="snapshot_format", choices=["json", "binary", "segments"], default="binary")
+    parser.add_argument("--compression", choices=list(COMPRESSIONS), default="none")
+    parser.add_argument("--journal", default=None, help="journal whose tail is folded into the converted snapshot")
+    args = parser.parse_args()
+    total_movies, total_shops = convert_snapshot(args.source, args.target, args.snapshot_format, args.compression, args.journal)
+    print(f"Converted {total_movies} movies and {total_shops} shops into {args.target}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+from typing import Dict, Hashable, Iterable, Set, Union
+
+_EMPTY: Set[int] = frozenset()
+
+
+def trigrams(text: str) -> Set[str]:
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class TrigramIndex:
+    """
+    Inverted index from every 3-character substring of a lowercased text to
+    the ids containing it. A substring query intersects the posting lists of
+    its own trigrams, smallest first, and only verifies the surviving
+    candidates, so the cost follows the number of matches instead of the
+    number of indexed texts. Queries shorter than three characters have no
+    trigram and fall back to scanning the normalized texts.
+    """
+
+    def __init__(self):
+        self._postings: Dict[str, Set[int]] = {}
+        self._texts: Dict[int, str] = {}
+
+    def __len__(self):
+        return len(self._texts)
+
+    def add(self, entity_id: int, text: str):
+        text = text.lower()
+        self._texts[entity_id] = text
+        for gram in trigrams(text):
+            posting = self._postings.get(gram)
+            if posting is None:
+                posting = self._postings[gram] = set()
+            posting.add(entity_id)
+
+    def remove(self, entity_id: int):
+        text = self._texts.pop(entity_id, None)
+        if text is None:
+            return
+        for gram in trigrams(text):
+            posting = self._postings.get(gram)
+            if posting is not None:
+                posting.discard(entity_id)
+                if not posting:
+                    del self._postings[gram]
+
+    def update(self, entity_id: int, text: str):
+        if self._texts.get(entity_id) == text.lower():
+            return
+        self.remove(entity_id)
+        self.add(entity_id, text)
+
+    def search(self, query: str) -> Set[int]:
+        query = query.lower()
+        grams = trigrams(query)
+        if not grams:
+            return {entity_id for entity_id, text in self._texts.items() if query in text}
+        postings = sorted((self._postings.get(gram, _EMPTY) for gram in grams), key=len)
+        candidates: Iterable[int] = postings[0]
+        for posting in postings[1:]:
+            if not candidates:
+                break
+            candidates = posting.intersection(candidates)
+        # Every trigram matching does not mean the query appears contiguously
+        return {entity_id for entity_id in candidates if query in self._texts[entity_id]}
+
+    def estimate(self, query: str) -> int:
+        # Upper bound of the matches: size of the rarest trigram of the query
+        grams = trigrams(query.lower())
+        if not grams:
+            return len(self._texts)
+        return min(len(self._postings.get(gram, _EMPTY)) for gram in grams)
+
+    def matches(self, entity_id: int, query: str) -> bool:
+        return query.lower() in self._texts.get(entity_id, "")
+
+
+class GenreIndex:
+    """
+    Genre -> set of movie ids. A multi-genre AND filter is the intersection of
+    the genre sets, smallest first, and the per-genre cardinalities let the
+    search run whichever filter is most selective before the others.
+    """
+
+    def __init__(self):
+        self._postings: Dict[str, Set[int]] = {}
+
+    def add(self, entity_id: int, genres: Iterable[str]):
+        for genre in genres:
+            posting = self._postings.get(genre)
+            if posting is None:
+                posting = self._postings[genre] = set()
+            posting.add(entity_id)
+
+    def remove(self, entity_id: int, genres: Iterable[str]):
+        for genre in genres:
+            posting = self._postings.get(genre)
+            if posting is not None:
+                posting.discard(entity_id)
+                if not posting:
+                    del self._postings[genre]
+
+    def update(self, entity_id: int, old_genres: Iterable[str], new_genres: Iterable[str]):
+        old_genres, new_genres = set(old_genres), set(new_genres)
+        self.remove(entity_id, old_genres - new_genres)
+        self.add(entity_id, new_genres - old_genres)
+
+    def cardinalities(self) -> Dict[str, int]:
+        # Entries per genre, what `estimate` works from; shown by GET /admin/genres
+        return {genre: len(posting) for genre, posting in self._postings.items()}
+
+    def estimate(self, genres: Iterable[str]) -> int:
+        return min(len(self._postings.get(genre, _EMPTY)) for genre in genres)
+
+    def search(self, genres: Iterable[str]) -> Set[int]:
+        postings = sorted((self._postings.get(genre, _EMPTY) for genre in genres), key=len)
+        candidates: Iterable[int] = postings[0]
+        for posting in postings[1:]:
+            if not candidates:
+                break
+            candidates = posting.intersection(candidates)
+        return set(candidates)
+
+    def matches(self, entity_id: int, genres: Iterable[str]) -> bool:
+        return all(entity_id in self._postings.get(genre, _EMPTY) for genre in genres)
+
+
+
+class MemberIndex:
+    """
+    Group -> ids of its members. A group with a single member, the usual case,
+    keeps the bare id instead of a set.
+    """
+
+    def __init__(self):
+        self._members: Dict[Hashable, Union[int, Set[int]]] = {}
+
+    def __len__(self):
+        return len(self._members)
+
+    def add(self, group: Hashable, member: int) -> bool:
+        """Adds a member; True when the group is new"""
+        members = self._members.get(group)
+        if members is None:
+            self._members[group] = member
+            return True
+        if type(members) is int:
+            self._members[group] = {members, member}
+        else:
+            members.add(member)
+        return False
+
+    def remove(self, group: Hashable, member: int) -> bool:
+        """Removes a member; True when the group is left without members"""
+        members = self._members.get(group)
+        if members is None:
+            return False
+        if type(members) is int:
+            if members != member:
+                return False
+            del self._members[group]
+            return True
+        members.discard(member)
+        if len(members) == 1:
+            self._members[group] = next(iter(members))
+        return False
+
+    def members(self, group: Hashable) -> Iterable[int]:
+        members = self._members.get(group)
+        if members is None:
+            return _EMPTY
+        return (members,) if type(members) is int else members
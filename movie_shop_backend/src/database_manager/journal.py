@@ -0,0 +1,179 @@
+import os, json, threading
+from contextlib import contextmanager
+from typing import Dict, List
+from src.schemas.schemas import Movie, Shop
+
+# Record types (one compact JSON object per line)
+MOVIE_RECORD = "movie"
+MOVIE_DELETED_RECORD = "del_movie"
+SHOP_RECORD = "shop"
+SHOP_DELETED_RECORD = "del_shop"
+# Movies moved to another shop, {"ids": [...], "shop": target}
+MOVIES_MOVED_RECORD = "move_movies"
+# Several records written as one line, so replay applies all of them or none
+BATCH_RECORD = "batch"
+
+
+class Journal:
+    """
+    Append-only write-ahead log. Every mutation writes a single line with the
+    final state of the entity it touched, so the cost of a write does not depend
+    on how many movies or shops are stored.
+
+    Appends are only buffered; `commit` makes everything appended so far durable
+    with a single write + fsync, so many requests share one disk flush.
+    """
+
+    def __init__(self, filename: str):
+        self.filename = filename
+        self.rotated_filename = rotated_filename(filename)
+        self.records_since_compaction = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._file = open(filename, "a", encoding="utf-8")
+
+    def append(self, record: dict):
+        batch = getattr(self._local, "batch", None)
+        if batch is not None:
+            batch.append(record)
+            return
+        line = json.dumps(record, separators=(",", ":")) + "\n"
+        with self._lock:
+            self._file.write(line)
+            self.records_since_compaction += 1
+
+    def commit(self):
+        with self._lock:
+            self._commit_locked()
+
+    def _commit_locked(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    @contextmanager
+    def batch(self):
+        # Records appended by this thread inside the block become a single batch record
+        records = self._local.batch = []
+        try:
+            yield
+        finally:
+            self._local.batch = None
+        if records:
+            self.append({"op": BATCH_RECORD, "records": records})
+
+    def log_movie(self, movie: Movie):
+        self.append({"op": MOVIE_RECORD, "v": movie.model_dump()})
+
+    def log_movies_moved(self, movie_ids: List[int], shop_id: int):
+        self.append({"op": MOVIES_MOVED_RECORD, "ids": movie_ids, "shop": shop_id})
+
+    def log_movie_deleted(self, movie_id: int):
+        self.append({"op": MOVIE_DELETED_RECORD, "id": movie_id})
+
+    def log_shop(self, shop: Shop):
+        self.append({"op": SHOP_RECORD, "v": {"id": shop.id, "address": shop.address, "manager": shop.manager}})
+
+    def log_shop_deleted(self, shop_id: int):
+        self.append({"op": SHOP_DELETED_RECORD, "id": shop_id})
+
+    @contextmanager
+    def rotate(self):
+        # Moves the current log aside and starts a new one. Callers capture the
+        # state to snapshot inside the block: everything in the rotated file is
+        # then covered by that capture, and later appends land in the new log.
+        with self._lock:
+            self._commit_locked()
+            self._file.close()
+            os.replace(self.filename, self.rotated_filename)
+            self._file = open(self.filename, "a", encoding="utf-8")
+            self.records_since_compaction = 0
+            yield
+
+    def discard_rotated(self):
+        if os.path.exists(self.rotated_filename):
+            os.remove(self.rotated_filename)
+
+    def close(self):
+        with self._lock:
+            self._commit_locked()
+            self._file.close()
+
+
+def rotated_filename(filename: str) -> str:
+    return f"{filename}.old"
+
+
+def apply_record(record: dict, movies: Dict[int, Movie], shops: Dict[int, Shop], next_movie_id: int, next_shop_id: int):
+    # Records carry full entity state, so applying one twice leaves the same result
+    op = record["op"]
+    if op == BATCH_RECORD:
+        for batched_record in record["records"]:
+            next_movie_id, next_shop_id = apply_record(batched_record, movies, shops, next_movie_id, next_shop_id)
+    elif op == MOVIE_RECORD:
+        new_movie = Movie(**record["v"])
+        old_movie = movies.get(new_movie.id)
+        if old_movie is None:
+            movies[new_movie.id] = new_movie
+            if new_movie.shop in shops:
+                shops[new_movie.shop].movies.append(new_movie)
+        else:
+            if old_movie.shop != new_movie.shop:
+                if old_movie.shop in shops:
+                    shops[old_movie.shop].movies.remove(old_movie)
+                if new_movie.shop in shops:
+                    shops[new_movie.shop].movies.append(old_movie)
+            old_movie.name = new_movie.name
+            old_movie.director = new_movie.director
+            old_movie.genres = new_movie.genres
+            old_movie.shop = new_movie.shop
+            old_movie.rent = new_movie.rent
+        next_movie_id = max(next_movie_id, new_movie.id + 1)
+    elif op == MOVIES_MOVED_RECORD:
+        # Each source list is filtered once instead of one list.remove per movie
+        target_id, moved, source_ids = record["shop"], [], set()
+        for movie_id in record["ids"]:
+            movie = movies.get(movie_id)
+            if movie is not None and movie.shop != target_id:
+                moved.append(movie)
+                source_ids.add(movie.shop)
+        moved_ids = {movie.id for movie in moved}
+        for source_id in source_ids & shops.keys():
+            shops[source_id].movies = [m for m in shops[source_id].movies if m.id not in moved_ids]
+        for movie in moved:
+            movie.shop = target_id
+            if target_id in shops:
+                shops[target_id].movies.append(movie)
+    elif op == MOVIE_DELETED_RECORD:
+        movie = movies.get(record["id"])
+        if movie is not None:
+            # The shop is read while the movie is still there: a lazily loaded
+            # shop builds its movie list from the movies map on first access
+            if movie.shop in shops:
+                shops[movie.shop].movies.remove(movie)
+            del movies[record["id"]]
+    elif op == SHOP_RECORD:
+        v = record["v"]
+        if v["id"] in shops:
+            shops[v["id"]].address = v["address"]
+            shops[v["id"]].manager = v["manager"]
+        else:
+            shops[v["id"]] = Shop(id=v["id"], address=v["address"], manager=v["manager"], movies=[])
+        next_shop_id = max(next_shop_id, v["id"] + 1)
+    elif op == SHOP_DELETED_RECORD:
+        shop_id = record["id"]
+        for movie_id in [key for key, value in movies.items() if value.shop == shop_id]:
+            movies.pop(movie_id)
+        shops.pop(shop_id, None)
+    return next_movie_id, next_shop_id
+
+
+def replay_journal(filename: str, movies: Dict[int, Movie], shops: Dict[int, Shop], next_movie_id: int, next_shop_id: int):
+    with open(filename, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # Torn last line from a crash in the middle of an append
+                break
+            next_movie_id, next_shop_id = apply_record(record, movies, shops, next_movie_id, next_shop_id)
+    return next_movie_id, next_shop_id
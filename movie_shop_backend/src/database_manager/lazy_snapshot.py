@@ -0,0 +1,95 @@
+import mmap, struct, threading
+from collections.abc import MutableMapping
+from src.schemas.schemas import Movie, Shop
+from src.database_manager.binary_storage import (
+    BODY_OFFSET, COMPRESSIONS, read_footer, read_header, read_index, read_movie, read_shop_record, read_strings,
+)
+
+
+class LazySnapshotMap(MutableMapping):
+    """
+    Dict-like view over the records of a memory-mapped snapshot. Until an entry
+    is accessed its value is just the record offset; the first lookup decodes
+    the record and replaces the offset with the object, keeping insertion order.
+    Journal replay changes those objects in place, so they are kept while it
+    runs. With `cache` off each lookup decodes a fresh object and keeps nothing,
+    for a reader that keeps its own converted copy.
+    """
+
+    def __init__(self, offsets: dict, hydrate):
+        self._data = offsets
+        self._hydrate = hydrate
+        self._lock = threading.Lock()
+        self.cache = True
+
+    def __getitem__(self, key):
+        value = self._data[key]
+        if type(value) is int:
+            if not self.cache:
+                return self._hydrate(value)
+            # Two threads must never build two different objects for the same id
+            with self._lock:
+                value = self._data[key]
+                if type(value) is int:
+                    value = self._data[key] = self._hydrate(value)
+        return value
+
+    def __setitem__(self, key, value):
+        self._data[key] = value
+
+    def __delitem__(self, key):
+        del self._data[key]
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def __iter__(self):
+        return iter(self._data)
+
+    def __len__(self):
+        return len(self._data)
+
+    def copy(self) -> dict:
+        # Plain dict with every entry hydrated; the key snapshot is taken atomically
+        return {key: self[key] for key in self._data.copy()}
+
+
+class LazySnapshot:
+    """
+    Opens an uncompressed binary snapshot with mmap and only reads its string
+    table and id -> offset indexes. Movies and shops are decoded on first access.
+    When the checksum was verified the records are trusted and built without
+    running pydantic validation again.
+    """
+
+    def __init__(self, filename: str, verify_checksum: bool = False):
+        self._file = open(filename, "rb")
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._version, compression, self.next_movie_id, self.next_shop_id = read_header(self._mm)
+        if compression != COMPRESSIONS["none"]:
+            raise ValueError("Lazy loading needs an uncompressed snapshot")
+        index_offset, self.trusted = read_footer(self._mm, verify_checksum)
+        self._strings, _ = read_strings(self._mm, BODY_OFFSET)
+        movie_offsets, pos = read_index(self._mm, index_offset)
+        shop_offsets, _ = read_index(self._mm, pos)
+        self.movies = LazySnapshotMap(movie_offsets, self._hydrate_movie)
+        self.shops = LazySnapshotMap(shop_offsets, self._hydrate_shop)
+
+    def _hydrate_movie(self, offset: int) -> Movie:
+        return read_movie(self._mm, BODY_OFFSET + offset, self._strings, self.trusted, self._version)
+
+    def _hydrate_shop(self, offset: int) -> Shop:
+        shop_id, address, manager, movie_ids = read_shop_record(self._mm, BODY_OFFSET + offset)
+        shop_movies = [self.movies[mid] for mid in movie_ids if mid in self.movies]
+        if self.trusted:
+            return Shop.model_construct(id=shop_id, address=address, manager=manager, movies=shop_movies)
+        return Shop(id=shop_id, address=address, manager=manager, movies=shop_movies)
+
+
+def can_lazy_load(filename: str) -> bool:
+    with open(filename, "rb") as f:
+        try:
+            version, compression, _, _ = read_header(f.read(BODY_OFFSET))
+        except (ValueError, struct.error):
+            return False
+    return version >= 2 and compression == COMPRESSIONS["none"]
@@ -1,10 +1,47 @@
 import os, json
-from typing import Dict
+from typing import Dict, Iterable, Optional, Tuple
 from src.schemas.schemas import Movie, Shop
+from src.database_manager.journal import replay_journal, rotated_filename
+from src.database_manager.binary_storage import is_binary_snapshot, save_state_binary, load_state_binary
+from src.database_manager.lazy_snapshot import LazySnapshot, can_lazy_load
+from src.database_manager.segment_storage import is_segment_manifest, save_state_segments, load_state_segments, saved_segments_size
+try:
+    import fcntl
+except ImportError:
+    # Windows: no advisory locks, the single writer is not enforced
+    fcntl = None
 
-def save_state(filename: str, movies: Dict[int, Movie], shops: Dict[int, Shop], next_movie_id: int, next_shop_id: int):
+def save_state(filename: str, movies: Dict[int, Movie], shops: Dict[int, Shop], next_movie_id: int, next_shop_id: int, snapshot_format: str = "json", compression: str = "none",
+               changed_shops: Optional[Iterable[int]] = None):
+    if snapshot_format == "segments":
+        # Only the segments of `changed_shops` (None: all) are written, see segment_storage
+        save_state_segments(filename, shops, next_movie_id, next_shop_id, changed_shops)
+        return
+    # Write to a temp file and rename so a crash never leaves a half written snapshot
+    tmp_filename = f"{filename}.tmp"
+    if snapshot_format == "binary":
+        save_state_binary(tmp_filename, movies, shops, next_movie_id, next_shop_id, compression)
+    else:
+        save_state_json(tmp_filename, movies, shops, next_movie_id, next_shop_id)
+    os.replace(tmp_filename, filename)
+
+def saved_size(filename: str, snapshot_format: str = "json") -> int:
+    # Bytes written by the last save_state; a segmented save only wrote some of the files
+    if snapshot_format == "segments":
+        return saved_segments_size(filename)
+    return os.path.getsize(filename)
+
+def save_state_json(filename: str, movies: Dict[int, Movie], shops: Dict[int, Shop], next_movie_id: int, next_shop_id: int):
+    # The name, director and genres shared by the copies of a film are written once, in
+    # "titles", and every movie refers to its title by position
+    titles: Dict[Tuple, int] = {}
+    movie_entries = {}
+    for k, v in movies.items():
+        title = titles.setdefault((v.name, v.director, tuple(v.genres)), len(titles))
+        movie_entries[k] = {"id": v.id, "title": title, "shop": v.shop, "rent": v.rent}
     data = {
-        "movies": {k: v.model_dump() for k, v in movies.items()},
+        "titles": [[name, director, list(genres)] for name, director, genres in titles],
+        "movies": movie_entries,
         "shops": {k: {
             "id": v.id,
             "address": v.address,
@@ -17,25 +54,63 @@ def save_state(filename: str, movies: Dict[int, Movie], shops: Dict[int, Shop],
     with open(filename, "w") as f:
         json.dump(data, f)
 
-def load_state(filename: str):
+def load_state(filename: str, journal_filename: Optional[str] = None, lazy: bool = False, verify_checksum: bool = True, verify_lazy_checksum: bool = False):
     movies: Dict[int, Movie] = {}
     shops: Dict[int, Shop] = {}
     next_movie_id = 1
-    next_shop_id = 1     
-    if not os.path.exists(filename):
-        return movies, shops, next_movie_id, next_shop_id
-   
-    with open(filename, "r") as f:
-        data = json.load(f)
-        # Load movies
-        movies.clear()
-        for k, v in data["movies"].items():
-            movies[int(k)] = Movie(**v)
-        # Load shops
-        shops.clear()
-        for k, v in data["shops"].items():
-            shop_movies = [movies[mid] for mid in v["movies"] if mid in movies]
-            shops[int(k)] = Shop(id=v["id"], address=v["address"], manager=v["manager"], movies=shop_movies)
-        next_movie_id = data["next_movie_id"]
-        next_shop_id = data["next_shop_id"]
+    next_shop_id = 1
+    if lazy and os.path.exists(filename) and can_lazy_load(filename):
+        # Only the id -> offset indexes are read now, entities are decoded on first access
+        snapshot = LazySnapshot(filename, verify_lazy_checksum)
+        movies, shops, next_movie_id, next_shop_id = snapshot.movies, snapshot.shops, snapshot.next_movie_id, snapshot.next_shop_id
+    elif os.path.exists(filename) and is_segment_manifest(filename):
+        movies, shops, next_movie_id, next_shop_id = load_state_segments(filename)
+    elif os.path.exists(filename) and is_binary_snapshot(filename):
+        movies, shops, next_movie_id, next_shop_id = load_state_binary(filename, verify_checksum)
+    elif os.path.exists(filename):
+        with open(filename, "r") as f:
+            data = json.load(f)
+            # Load movies; snapshots written before titles were split out have them in every movie
+            movies.clear()
+            titles = data.get("titles")
+            for k, v in data["movies"].items():
+                if titles is not None:
+                    name, director, genres = titles[v["title"]]
+                    v = {"id": v["id"], "name": name, "director": director, "genres": genres, "shop": v["shop"], "rent": v["rent"]}
+                movies[int(k)] = Movie(**v)
+            # Load shops
+            shops.clear()
+            for k, v in data["shops"].items():
+                shop_movies = [movies[mid] for mid in v["movies"] if mid in movies]
+                shops[int(k)] = Shop(id=v["id"], address=v["address"], manager=v["manager"], movies=shop_movies)
+            next_movie_id = data["next_movie_id"]
+            next_shop_id = data["next_shop_id"]
+    # Journal tail: mutations made after the last compaction. A rotated journal
+    # only survives when a compaction was interrupted, and it is older than the live one.
+    if journal_filename:
+        for tail in (rotated_filename(journal_filename), journal_filename):
+            if os.path.exists(tail):
+                next_movie_id, next_shop_id = replay_journal(tail, movies, shops, next_movie_id, next_shop_id)
     return movies, shops, next_movie_id, next_shop_id
+
+def compact_state(filename: str, journal, movies: Dict[int, Movie], shops: Dict[int, Shop], next_movie_id: int, next_shop_id: int, snapshot_format: str = "json", compression: str = "none",
+                  changed_shops: Optional[Iterable[int]] = None):
+    # Fold the rotated journal into a fresh snapshot. The state must have been
+    # captured inside `journal.rotate()`. Replaying is idempotent, so a crash
+    # between both steps only means the old tail gets applied again on startup.
+    save_state(filename, movies, shops, next_movie_id, next_shop_id, snapshot_format, compression, changed_shops)
+    journal.discard_rotated()
+
+def lock_state_file(filename: str):
+    # Exclusive lock on <filename>.lock, held while the returned file stays open, so a
+    # second process writing the same state (e.g. uvicorn --workers N) fails at startup
+    # instead of silently diverging from the first one
+    if fcntl is None:
+        return None
+    lock_file = open(f"{filename}.lock", "w")
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock_file.close()
+        raise RuntimeError(f"{filename} is already owned by another process; start the other processes as read replicas (PRIMARY_URL)")
+    return lock_file
@@ -0,0 +1,93 @@
+import asyncio
+import logging
+from typing import Callable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class PersistenceWorker:
+    """
+    Background group-commit writer. Write requests only mark the state as dirty;
+    a single task coalesces them and runs `flush` in a worker thread once per
+    `interval` seconds or as soon as `batch_size` writes are pending, so a burst
+    of N writes costs one flush instead of N and the event loop never blocks on disk.
+
+    With `ack_after_flush` the caller waits until its write has been flushed,
+    otherwise it returns right away and the write is flushed in the background.
+
+    A failed flush leaves the changes applied in memory but not on disk. Until a
+    later flush succeeds `failure` holds the error, callers must stop taking new
+    writes, and the loop keeps retrying once per `interval`.
+    """
+
+    def __init__(self, flush: Callable[[], None], interval: float, batch_size: int, ack_after_flush: bool = True):
+        self._flush = flush
+        self.interval = interval
+        self.batch_size = batch_size
+        self.ack_after_flush = ack_after_flush
+        self._pending = 0
+        self._waiters: List[asyncio.Future] = []
+        self._dirty = asyncio.Event()
+        self._batch_full = asyncio.Event()
+        self._task = None
+        self._stopping = False
+        self.failure: Optional[BaseException] = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def mark_dirty(self):
+        self._pending += 1
+        self._dirty.set()
+        if self._pending >= self.batch_size:
+            self._batch_full.set()
+        if self.ack_after_flush:
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            await waiter
+
+    async def stop(self):
+        # Drain: wake the loop up, let it finish its current flush and flush the rest
+        self._stopping = True
+        self._dirty.set()
+        self._batch_full.set()
+        if self._task is not None:
+            await self._task
+            self._task = None
+        if self._pending:
+            await self._flush_pending()
+
+    async def _run(self):
+        while not self._stopping:
+            await self._dirty.wait()
+            try:
+                await asyncio.wait_for(self._batch_full.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            if self._pending:
+                await self._flush_pending()
+
+    async def _flush_pending(self):
+        waiters = self._waiters
+        self._waiters = []
+        self._pending = 0
+        self._dirty.clear()
+        self._batch_full.clear()
+        try:
+            await asyncio.to_thread(self._flush)
+        except Exception as exc:
+            logger.exception("State flush failed")
+            self.failure = exc
+            # The unflushed changes are still in memory: keep them pending so they are retried
+            self._pending += len(waiters) or 1
+            self._dirty.set()
+            for waiter in waiters:
+                if not waiter.done():
+                    waiter.set_exception(exc)
+        else:
+            if self.failure is not None:
+                logger.info("State flush recovered")
+            self.failure = None
+            for waiter in waiters:
+                if not waiter.done():
+                    waiter.set_result(None)
@@ -0,0 +1,243 @@
+from bisect import bisect_right
+from collections.abc import Mapping
+from itertools import islice
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+# Keys per chunk: 2 ** CHUNK_BITS consecutive ids
+CHUNK_BITS = 10
+
+_MISSING = object()
+
+
+class PersistentMap(Mapping):
+    """
+    Immutable map with int keys, split into chunks of consecutive keys. A new
+    version made with `edit()` copies the chunk table and only the chunks it
+    changes, every other chunk is shared with the versions before it, so a
+    write costs O(len / 1024 + 1024) instead of a copy of the whole map.
+    Every chunk keeps its keys in order, so iteration is in key order without
+    sorting.
+    """
+
+    __slots__ = ("_chunks", "_len", "_order")
+
+    def __init__(self, chunks: Optional[Dict[int, Mapping]] = None, length: int = 0):
+        self._chunks = chunks if chunks is not None else {}
+        self._len = length
+        # Sorted chunk numbers, computed on the first ordered read
+        self._order: Optional[List[int]] = None
+
+    @classmethod
+    def from_items(cls, items: Iterable[Tuple[int, object]]) -> "PersistentMap":
+        chunks: Dict[int, dict] = {}
+        for key, value in items:
+            chunk = chunks.get(key >> CHUNK_BITS)
+            if chunk is None:
+                chunk = chunks[key >> CHUNK_BITS] = {}
+            chunk[key] = value
+        chunks = {n: dict(sorted(chunk.items())) for n, chunk in chunks.items()}
+        return cls(chunks, sum(map(len, chunks.values())))
+
+    @classmethod
+    def view(cls, source: Mapping, convert: Optional[Callable] = None) -> "PersistentMap":
+        # Chunks that read their values from `source` when asked (passed through
+        # `convert` if given), so a lazily loaded snapshot stays lazy; only the
+        # keys are read here. A snapshot lists its ids in order, so keys are taken
+        # as they come and only a chunk that got one out of order is sorted.
+        keys: Dict[int, Dict[int, None]] = {}
+        unsorted: Set[int] = set()
+        for key in source:
+            chunk_keys = keys.get(key >> CHUNK_BITS)
+            if chunk_keys is None:
+                chunk_keys = keys[key >> CHUNK_BITS] = {}
+            elif key < next(reversed(chunk_keys)):
+                unsorted.add(key >> CHUNK_BITS)
+            chunk_keys[key] = None
+        for n in unsorted:
+            keys[n] = dict.fromkeys(sorted(keys[n]))
+        return cls({n: _SourceChunk(source, chunk_keys, convert) for n, chunk_keys in keys.items()}, len(source))
+
+    def __getitem__(self, key: int):
+        chunk = self._chunks.get(key >> CHUNK_BITS)
+        if chunk is None:
+            raise KeyError(key)
+        return chunk[key]
+
+    def get(self, key: int, default=None):
+        chunk = self._chunks.get(key >> CHUNK_BITS)
+        if chunk is None or key not in chunk:
+            return default
+        return chunk[key]
+
+    def __contains__(self, key) -> bool:
+        chunk = self._chunks.get(key >> CHUNK_BITS)
+        return chunk is not None and key in chunk
+
+    def __len__(self) -> int:
+        return self._len
+
+    def __iter__(self) -> Iterator[int]:
+        chunks = self._chunks
+        return (key for n in self._chunk_order() for key in chunks[n])
+
+    def items(self) -> Iterator[Tuple[int, object]]:
+        return self.items_after(None)
+
+    def values(self) -> Iterator:
+        return (value for _, value in self.items_after(None))
+
+    def _chunk_order(self) -> List[int]:
+        if self._order is None:
+            self._order = sorted(self._chunks)
+        return self._order
+
+    def get_many(self, keys: Iterable[int]) -> List:
+        chunks = self._chunks
+        return [chunks[key >> CHUNK_BITS][key] for key in keys]
+
+    def items_after(self, after: Optional[int]) -> Iterator[Tuple[int, object]]:
+        """(key, value) pairs with key > after (all of them for None), in key order"""
+        order = self._chunk_order()
+        start = 0 if after is None else max(bisect_right(order, after >> CHUNK_BITS) - 1, 0)
+        for n in order[start:]:
+            chunk = self._chunks[n]
+            if after is not None and next(iter(chunk)) <= after:
+                keys = list(chunk)
+                for key in keys[bisect_right(keys, after):]:
+                    yield key, chunk[key]
+            else:
+                yield from chunk.items()
+
+    def page(self, after: int, limit: Optional[int]) -> List:
+        """Values of the first `limit` keys above `after` (all of them for None)"""
+        return [value for _, value in islice(self.items_after(after), limit)]
+
+    def key_page(self, after: int, limit: Optional[int]) -> List[int]:
+        return [key for key, _ in islice(self.items_after(after), limit)]
+
+    def edit(self) -> "MapEditor":
+        return MapEditor(self)
+
+    def set(self, key: int, value) -> "PersistentMap":
+        editor = self.edit()
+        editor[key] = value
+        return editor.finish()
+
+
+class MapEditor:
+    """
+    Changes to a PersistentMap that become a new version with `finish()`. Each
+    touched chunk is copied once however many keys in it change; the original
+    map is never modified. An editor is used once.
+    """
+
+    __slots__ = ("_base", "_chunks", "_owned", "_unsorted", "_len")
+
+    def __init__(self, base: PersistentMap):
+        self._base = base
+        # The chunk table is copied on the first change
+        self._chunks = base._chunks
+        self._owned: Optional[Set[int]] = None
+        # Owned chunks that got a key lower than their last one
+        self._unsorted: Set[int] = set()
+        self._len = len(base)
+
+    def _own(self, n: int) -> dict:
+        if self._owned is None:
+            self._chunks = dict(self._chunks)
+            self._owned = set()
+        chunk = self._chunks.get(n)
+        if n not in self._owned:
+            chunk = self._chunks[n] = dict(chunk) if chunk is not None else {}
+            self._owned.add(n)
+        return chunk
+
+    def __getitem__(self, key: int):
+        chunk = self._chunks.get(key >> CHUNK_BITS)
+        if chunk is None:
+            raise KeyError(key)
+        return chunk[key]
+
+    def get(self, key: int, default=None):
+        chunk = self._chunks.get(key >> CHUNK_BITS)
+        if chunk is None or key not in chunk:
+            return default
+        return chunk[key]
+
+    def __contains__(self, key) -> bool:
+        chunk = self._chunks.get(key >> CHUNK_BITS)
+        return chunk is not None and key in chunk
+
+    def __len__(self) -> int:
+        return self._len
+
+    def __iter__(self) -> Iterator[int]:
+        # Unordered; the keys are listed first so the editor can be changed while iterating
+        return iter([key for chunk in self._chunks.values() for key in chunk])
+
+    def __setitem__(self, key: int, value):
+        n = key >> CHUNK_BITS
+        chunk = self._own(n)
+        if key not in chunk:
+            self._len += 1
+            if chunk and key < next(reversed(chunk)):
+                self._unsorted.add(n)
+        chunk[key] = value
+
+    def pop(self, key: int, default=None):
+        n = key >> CHUNK_BITS
+        if key not in self:
+            return default
+        chunk = self._own(n)
+        value = chunk.pop(key)
+        self._len -= 1
+        if not chunk:
+            del self._chunks[n]
+            self._owned.discard(n)
+        return value
+
+    def finish(self) -> PersistentMap:
+        if self._owned is None:
+            return self._base
+        for n in self._unsorted:
+            if n in self._chunks:
+                self._chunks[n] = dict(sorted(self._chunks[n].items()))
+        result = PersistentMap(self._chunks, self._len)
+        self._chunks = self._owned = self._base = None
+        return result
+
+
+class _SourceChunk(Mapping):
+    """
+    Chunk holding only keys; each value is read from the mapping it was made
+    from, converted, on first access and kept from then on
+    """
+
+    __slots__ = ("_source", "_keys", "_convert", "_values")
+
+    def __init__(self, source: Mapping, keys: Dict[int, None], convert: Optional[Callable] = None):
+        self._source = source
+        self._keys = keys
+        self._convert = convert
+        self._values: dict = {}
+
+    def __getitem__(self, key: int):
+        value = self._values.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+        if key not in self._keys:
+            raise KeyError(key)
+        value = self._source[key]
+        if self._convert:
+            value = self._convert(value)
+        # Two threads converting the same key at once both keep the first value stored
+        return self._values.setdefault(key, value)
+
+    def __contains__(self, key) -> bool:
+        return key in self._keys
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self._keys)
+
+    def __len__(self) -> int:
+        return len(self._keys)
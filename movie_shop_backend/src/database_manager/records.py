@@ -0,0 +1,98 @@
+import sys, threading
+from typing import Dict, Iterable, Optional, Tuple
+from weakref import WeakValueDictionary
+from src.schemas.schemas import Movie
+
+# Bits of MovieRecord.flags
+RENT = 1
+
+# Shop ids are stored once and shared by all the records of the shop, until the shop is deleted
+_shop_ids: Dict[int, int] = {}
+
+
+def release_shop_id(shop_id: int):
+    _shop_ids.pop(shop_id, None)
+
+
+class Title:
+    """
+    Catalog entry of a film: the name, director and genres every copy of it
+    shares. There is one Title per distinct metadata (see `catalog_title`),
+    so titles compare and hash by identity.
+    """
+
+    __slots__ = ("name", "director", "genres", "__weakref__")
+
+    def __init__(self, name: str, director: str, genres: Tuple[str, ...]):
+        self.name = name
+        self.director = director
+        self.genres = genres
+
+
+# (name, director, genres) -> the title with that metadata. Only the records hold
+# titles, so a title leaves the catalog with its last copy.
+_titles: "WeakValueDictionary[Tuple[str, str, Tuple[str, ...]], Title]" = WeakValueDictionary()
+_titles_lock = threading.Lock()
+
+
+def find_title(name: str, director: str, genres: Iterable[str]) -> Optional[Title]:
+    """The title with this metadata, None when no stored movie has it"""
+    return _titles.get((name, director, tuple(genres)))
+
+
+def catalog_title(name: str, director: str, genres: Iterable[str]) -> Title:
+    key = (name, director, tuple(genres))
+    title = _titles.get(key)
+    if title is None:
+        with _titles_lock:
+            title = _titles.get(key)
+            if title is None:
+                title = _titles[key] = Title(name, sys.intern(director), tuple(sys.intern(genre) for genre in key[2]))
+    return title
+
+
+class MovieRecord:
+    """
+    Compact form in which InMemoryRepository keeps a movie, a physical copy in
+    one shop: no id (it is the key of the map holding the record), the Title
+    shared with every other copy of the film, the shop, and rent as a bit of
+    `flags`. A pydantic Movie is only built when a movie leaves the
+    repository. Records are never changed once stored, a change stores a new one.
+    """
+
+    __slots__ = ("title", "shop", "flags")
+
+    def __init__(self, title: Title, shop: int, rent: bool = False):
+        self.title = title
+        self.shop = _shop_ids.setdefault(shop, shop)
+        self.flags = RENT if rent else 0
+
+    @property
+    def name(self) -> str:
+        return self.title.name
+
+    @property
+    def director(self) -> str:
+        return self.title.director
+
+    @property
+    def genres(self) -> Tuple[str, ...]:
+        return self.title.genres
+
+    @property
+    def rent(self) -> bool:
+        return bool(self.flags & RENT)
+
+    @classmethod
+    def from_movie(cls, movie: Movie) -> "MovieRecord":
+        return cls(catalog_title(movie.name, movie.director, movie.genres), movie.shop, movie.rent)
+
+    def replace(self, **changes) -> "MovieRecord":
+        fields = {"title": self.title, "shop": self.shop, "rent": self.rent}
+        fields.update(changes)
+        return MovieRecord(**fields)
+
+    def to_movie(self, movie_id: int) -> Movie:
+        # Validating is done by pydantic-core and costs less than model_construct
+        title = self.title
+        return Movie(id=movie_id, name=title.name, director=title.director, genres=title.genres, shop=self.shop, rent=self.rent)
@@ -0,0 +1,146 @@
+import os, json, asyncio, logging, threading
+from typing import Callable, List, Optional
+from src.database_manager.journal import apply_record, rotated_filename
+from src.database_manager.local_file_storage import load_state
+
+logger = logging.getLogger(__name__)
+
+
+class JournalFollower:
+    """
+    Reads the journal another process appends to. `read()` returns the records
+    completed since the previous call; a line still being written stays
+    buffered until its newline arrives. When a compaction moves the log aside,
+    the rest of the old file is read before switching to the new one.
+
+    The files are opened when the follower is created, before the snapshot is
+    loaded: whatever a compaction folds into the snapshot in the meantime is
+    still read from the open files, and replaying it again changes nothing.
+    """
+
+    def __init__(self, filename: str):
+        self.filename = filename
+        self._file = _open(filename)
+        self._rotated = _open(rotated_filename(filename))
+        self._partial = ""
+        self._lock = threading.Lock()
+
+    def read_rotated(self) -> List[dict]:
+        # Log of a compaction that was running when the follower was created
+        if self._rotated is None:
+            return []
+        with self._rotated:
+            records = _parse(self._rotated.read().split("\n"))
+        self._rotated = None
+        return records
+
+    def read(self) -> List[dict]:
+        with self._lock:
+            records = []
+            while True:
+                if self._file is None:
+                    self._file = _open(self.filename)
+                    if self._file is None:
+                        return records
+                records += self._read_lines()
+                if not self._moved_aside():
+                    return records
+                # Appends made just before the rotation, then the new log from the start
+                records += self._read_lines()
+                self._file.close()
+                self._file = None
+                self._partial = ""
+
+    def _read_lines(self) -> List[dict]:
+        lines = (self._partial + self._file.read()).split("\n")
+        self._partial = lines.pop()
+        return _parse(lines)
+
+    def _moved_aside(self) -> bool:
+        try:
+            return os.stat(self.filename).st_ino != os.fstat(self._file.fileno()).st_ino
+        except FileNotFoundError:
+            # In the middle of a rotation; the new log shows up on the next read
+            return False
+
+    def close(self):
+        for f in (self._file, self._rotated):
+            if f is not None:
+                f.close()
+
+
+def _open(filename: str):
+    try:
+        return open(filename, "r", encoding="utf-8")
+    except FileNotFoundError:
+        return None
+
+
+def _parse(lines: List[str]) -> List[dict]:
+    records = []
+    for line in lines:
+        if not line:
+            continue
+        try:
+            records.append(json.loads(line))
+        except json.JSONDecodeError:
+            # Torn line left by a crash of the primary in the middle of an append
+            logger.warning("Skipping unreadable journal line")
+    return records
+
+
+def load_replica_state(filename: str, journal_filename: str, lazy: bool = False, verify_checksum: bool = True, verify_lazy_checksum: bool = False):
+    """
+    State of a read replica: the snapshot plus every journal record after it,
+    and the follower that keeps reading the records appended from then on.
+    """
+    follower = JournalFollower(journal_filename)
+    movies, shops, next_movie_id, next_shop_id = load_state(filename, None, lazy, verify_checksum, verify_lazy_checksum)
+    for record in follower.read_rotated() + follower.read():
+        next_movie_id, next_shop_id = apply_record(record, movies, shops, next_movie_id, next_shop_id)
+    return (movies, shops, next_movie_id, next_shop_id), follower
+
+
+class ReplicationWorker:
+    """
+    Keeps a read replica up to date: every `interval` seconds the records the
+    primary appended to its journal are read and handed to `apply`, both in a
+    worker thread. `catch_up()` does the same right away, e.g. after forwarding
+    a write so the client reads it back from this process.
+    """
+
+    def __init__(self, follower: JournalFollower, apply: Callable[[List[dict]], None], interval: float = 0.05):
+        self.follower = follower
+        self.apply = apply
+        self.interval = interval
+        self._lock: Optional[asyncio.Lock] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        self._lock = asyncio.Lock()
+        self._task = asyncio.create_task(self._run())
+
+    async def catch_up(self):
+        # One reader at a time, so records are applied in journal order
+        async with self._lock:
+            records = await asyncio.to_thread(self.follower.read)
+            if records:
+                await asyncio.to_thread(self.apply, records)
+
+    async def _run(self):
+        while True:
+            try:
+                await self.catch_up()
+            except Exception:
+                logger.exception("Applying the primary journal failed")
+            await asyncio.sleep(self.interval)
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self.follower.close()
@@ -0,0 +1,880 @@
+import heapq, threading
+from abc import ABC, abstractmethod
+from contextlib import contextmanager, nullcontext
+from itertools import islice
+from typing import Callable, Dict, Iterable, Iterator, List, Mapping, NamedTuple, Optional, Set, Tuple
+from src.schemas.schemas import Movie, MovieBulkUpdate, MovieRequestCreate, MovieRequestUpdate, Shop
+from src.database_manager.journal import BATCH_RECORD, MOVIE_DELETED_RECORD, MOVIE_RECORD, MOVIES_MOVED_RECORD, SHOP_DELETED_RECORD, SHOP_RECORD, Journal
+from src.database_manager.indexes import GenreIndex, MemberIndex, TrigramIndex
+from src.database_manager.lazy_snapshot import LazySnapshotMap
+from src.database_manager.persistent_map import MapEditor, PersistentMap
+from src.database_manager.records import MovieRecord, Title, catalog_title, find_title, release_shop_id
+
+
+class MovieShopRepository(ABC):
+    """
+    Storage used by the API routes. Lookups return None when the entity does
+    not exist and mutators return None when the entity to change is missing,
+    the routes turn that into the 404 responses.
+
+    Listings are in id order and take `after` (only ids greater than it) and
+    `limit` (None for no limit), which is what keyset pagination needs.
+
+    Every method is safe to call from several threads at once. A route that
+    checks something and then changes data based on it runs both inside
+    `transaction()`, so no other write can land in between, and a route that
+    reads several times runs inside `pinned()` to see a single state.
+    """
+
+    def transaction(self):
+        return nullcontext()
+
+    def pinned(self):
+        return nullcontext()
+
+    # Movies
+    @abstractmethod
+    def get_movie(self, movie_id: int) -> Optional[Movie]: ...
+
+    @abstractmethod
+    def list_movies(self, after: int = 0, limit: Optional[int] = None) -> List[Movie]: ...
+
+    @abstractmethod
+    def create_movie(self, name: str, director: str, genres: List[str], shop_id: int) -> Movie: ...
+
+    @abstractmethod
+    def update_movie(self, movie_id: int, name: str, director: str, genres: List[str]) -> Optional[Movie]: ...
+
+    @abstractmethod
+    def update_title(self, title: MovieRequestUpdate, new_title: MovieRequestUpdate) -> List[Movie]:
+        """
+        Gives every copy of a film, the movies of any shop with exactly the name,
+        director and genres of `title`, those of `new_title`. Returns the
+        updated movies in id order, none when no movie has that title.
+        """
+
+    def update_movie_title(self, movie_id: int, new_title: MovieRequestUpdate) -> Optional[List[Movie]]:
+        """update_title for the title of this movie; None when the movie does not exist"""
+        with self.transaction():
+            movie = self.get_movie(movie_id)
+            if movie is None:
+                return None
+            return self.update_title(MovieRequestUpdate(name=movie.name, director=movie.director, genres=movie.genres), new_title)
+
+    @abstractmethod
+    def set_movie_rent(self, movie_id: int, rent: bool) -> Optional[Movie]: ...
+
+    @abstractmethod
+    def move_movie(self, movie_id: int, shop_id: int) -> Optional[Movie]: ...
+
+    @abstractmethod
+    def delete_movie(self, movie_id: int) -> bool: ...
+
+    @abstractmethod
+    def search_movies(self, name: Optional[str], director: Optional[str], genres: Optional[List[str]], after: int = 0, limit: Optional[int] = None) -> List[Movie]: ...
+
+    def search_movie_ids(self, name: Optional[str], director: Optional[str], genres: Optional[List[str]]) -> List[int]:
+        """Ids of every movie matching a search, in id order, without keeping the movies"""
+        return [movie.id for movie in self.iter_search_movies(name, director, genres)]
+
+    def get_movies(self, movie_ids: List[int]) -> List[Movie]:
+        """The movies with these ids, in the given order; ids that no longer exist are skipped"""
+        return [movie for movie in map(self.get_movie, movie_ids) if movie is not None]
+
+    # Shops
+    @abstractmethod
+    def has_shop(self, shop_id: int) -> bool: ...
+
+    @abstractmethod
+    def get_shop(self, shop_id: int) -> Optional[Shop]: ...
+
+    @abstractmethod
+    def list_shops(self, after: int = 0, limit: Optional[int] = None) -> List[Shop]: ...
+
+    @abstractmethod
+    def create_shop(self, address: str, manager: str) -> Shop: ...
+
+    @abstractmethod
+    def update_shop(self, shop_id: int, address: str, manager: str) -> Optional[Shop]: ...
+
+    @abstractmethod
+    def delete_shop(self, shop_id: int) -> bool: ...
+
+    @abstractmethod
+    def list_shop_movies(self, shop_id: int, available_only: bool = False, after: int = 0, limit: Optional[int] = None) -> Optional[List[Movie]]: ...
+
+    @abstractmethod
+    def count_shop_movies(self, shop_id: int) -> Optional[Tuple[int, int]]:
+        """(total, available) movies of a shop, None when the shop does not exist"""
+
+    @abstractmethod
+    def count_entities(self) -> Tuple[int, int]:
+        """(movies, shops) stored"""
+
+    @abstractmethod
+    def genre_cardinalities(self) -> Dict[str, int]:
+        """
+        Entries per genre of the genre search index, the figures the search
+        uses to run its most selective filter first
+        """
+
+    @abstractmethod
+    def transfer_movies(self, source_id: int, target_id: int, genres: Optional[List[str]] = None, available: Optional[bool] = None, delete_source: bool = False) -> Optional[List[int]]:
+        """
+        Moves the movies of a shop that have every genre in `genres` and, when
+        `available` is given, are (not) rented, to another shop as one change;
+        then deletes the source shop, with whatever is left in it, if asked.
+        Returns the moved ids, None when either shop does not exist.
+        """
+
+    @abstractmethod
+    def import_movies(self, movies: List[Movie]) -> List[Movie]:
+        """
+        Adds movies that keep their ids and rent state: the receiving end of a
+        move from another shard. The callers check that the ids are free, that
+        `issues_movie_id` is false for them and that the shops exist.
+        """
+
+    @abstractmethod
+    def issues_movie_id(self, movie_id: int) -> bool:
+        """
+        Whether create_movie may still hand out this id. A movie imported under
+        such an id would later be overwritten by a new one.
+        """
+
+    # Bulk: the routes check every item first, these apply a whole batch at once
+    def create_movies(self, movies: List[MovieRequestCreate]) -> List[Movie]:
+        return [self.create_movie(m.name, m.director, m.genres, m.shop) for m in movies]
+
+    def update_movies(self, movies: List[MovieBulkUpdate]) -> List[Movie]:
+        return [self.update_movie(m.id, m.name, m.director, m.genres) for m in movies]
+
+    def delete_movies(self, movie_ids: List[int]):
+        for movie_id in movie_ids:
+            self.delete_movie(movie_id)
+
+    # Streaming: walk a listing page by page, so only one page is held at a time
+    # and concurrent writes between pages are fine
+    def iter_movies(self, after: int = 0, page_size: int = 500) -> Iterator[Movie]:
+        return _iter_pages(lambda after, limit: self.list_movies(after, limit), after, page_size)
+
+    def iter_shops(self, after: int = 0, page_size: int = 500) -> Iterator[Shop]:
+        return _iter_pages(lambda after, limit: self.list_shops(after, limit), after, page_size)
+
+    def iter_search_movies(self, name: Optional[str], director: Optional[str], genres: Optional[List[str]], after: int = 0, page_size: int = 500) -> Iterator[Movie]:
+        return _iter_pages(lambda after, limit: self.search_movies(name, director, genres, after, limit), after, page_size)
+
+    def close(self):
+        pass
+
+
+def _iter_pages(fetch: Callable[[int, int], List], after: int, page_size: int) -> Iterator:
+    while True:
+        page = fetch(after, page_size)
+        yield from page
+        if len(page) < page_size:
+            return
+        after = page[-1].id
+
+
+def _page_ids(ids: Iterable[int], after: int, limit: Optional[int]) -> List[int]:
+    # Smallest `limit` ids above `after` from an unordered collection: one pass,
+    # without sorting or copying the whole collection
+    ids = (entity_id for entity_id in ids if entity_id > after)
+    if limit is None:
+        return sorted(ids)
+    return heapq.nsmallest(limit, ids)
+
+
+class StoreVersion(NamedTuple):
+    """
+    One committed state of the in-memory store. Nothing in it is changed after
+    it is published, so it is read without any lock.
+    """
+    number: int
+    movies: PersistentMap       # movie id -> MovieRecord
+    shops: PersistentMap        # shop id -> Shop
+    shop_movies: PersistentMap  # shop id -> ShopMovies, for the shops indexed so far
+    next_movie_id: int
+    next_shop_id: int
+
+
+class ShopMovies(NamedTuple):
+    ids: PersistentMap        # movie id -> None
+    available: PersistentMap  # the same, only for the movies not rented
+
+
+def _index_shop(shop: Shop) -> ShopMovies:
+    return ShopMovies(PersistentMap.from_items((movie.id, None) for movie in shop.movies),
+                      PersistentMap.from_items((movie.id, None) for movie in shop.movies if not movie.rent))
+
+
+def _movie_records(movies: Mapping) -> PersistentMap:
+    if isinstance(movies, dict):
+        return PersistentMap.from_items((movie_id, MovieRecord.from_movie(movie)) for movie_id, movie in movies.items())
+    # Lazily loaded snapshot: movies are decoded, and made records, on first access.
+    # The view keeps the records, so the snapshot stops keeping the decoded Movies.
+    if isinstance(movies, LazySnapshotMap):
+        movies.cache = False
+    return PersistentMap.view(movies, MovieRecord.from_movie)
+
+
+def _shop_entries(shops: Mapping, movies: PersistentMap) -> Tuple[PersistentMap, PersistentMap]:
+    """The shops map and the per-shop movie index (see ShopMovies) of a loaded state"""
+    if not isinstance(shops, dict):
+        # Lazily loaded snapshot: each shop is indexed the first time it is touched
+        return PersistentMap.view(shops), PersistentMap()
+    # Fully loaded: every shop is indexed now and kept without its movie list,
+    # so none of the loaded Movie objects stays alive
+    indexed: Dict[int, Tuple[list, list]] = {shop_id: ([], []) for shop_id in shops}
+    for movie_id, movie in movies.items():
+        shop_ids = indexed.get(movie.shop)
+        if shop_ids is not None:
+            shop_ids[0].append((movie_id, None))
+            if not movie.rent:
+                shop_ids[1].append((movie_id, None))
+    shop_movies = PersistentMap.from_items((shop_id, ShopMovies(PersistentMap.from_items(ids), PersistentMap.from_items(available)))
+                                           for shop_id, (ids, available) in indexed.items())
+    return PersistentMap.from_items((shop_id, shop.model_copy(update={"movies": []})) for shop_id, shop in shops.items()), shop_movies
+
+
+def _to_movie(movie_id: int, movie: MovieRecord) -> Movie:
+    return movie.to_movie(movie_id)
+
+
+def _to_movies(movie_ids: List[int], movies: List[MovieRecord]) -> List[Movie]:
+    return [movie.to_movie(movie_id) for movie_id, movie in zip(movie_ids, movies)]
+
+
+def _iter_movie_pages(movies: PersistentMap, movie_ids: List[int], page_size: int) -> Iterator[Movie]:
+    for start in range(0, len(movie_ids), page_size):
+        page = movie_ids[start:start + page_size]
+        # Records are fetched per page; each Movie is built only when the stream reaches it
+        for movie_id, movie in zip(page, movies.get_many(page)):
+            yield movie.to_movie(movie_id)
+
+
+class _StateView(Mapping):
+    """Read-only mapping over a map of a StoreVersion that builds each value as it is read"""
+
+    def __init__(self, entities: PersistentMap, build: Callable):
+        self._entities = entities
+        self._build = build
+
+    def __getitem__(self, key: int):
+        return self._build(key, self._entities[key])
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self._entities)
+
+    def __len__(self) -> int:
+        return len(self._entities)
+
+    def items(self):
+        return ((key, self._build(key, value)) for key, value in self._entities.items())
+
+    def values(self):
+        return (self._build(key, value) for key, value in self._entities.items())
+
+
+def _shard_id(next_id: int, shard_index: int, shard_count: int) -> int:
+    # Smallest id >= next_id owned by the shard: shard i of K hands out i + 1, i + 1 + K, ...
+    return next_id + (shard_index - (next_id - 1)) % shard_count
+
+
+def _matches(movie: Optional[MovieRecord], name: Optional[str], director: Optional[str], genres: Set[str]) -> bool:
+    return (movie is not None
+            and (not name or name.lower() in movie.name.lower())
+            and (not director or director.lower() in movie.director.lower())
+            and genres.issubset(movie.genres))
+
+
+class _VersionEdit:
+    """The changes made by one write, published together as the next StoreVersion"""
+
+    def __init__(self, base: StoreVersion):
+        self.base = base
+        self.movies = base.movies.edit()
+        self.shops = base.shops.edit()
+        self.shop_movies = base.shop_movies.edit()
+        self.next_movie_id = base.next_movie_id
+        self.next_shop_id = base.next_shop_id
+        self._shop_editors: Dict[int, Tuple[MapEditor, MapEditor]] = {}
+        # (movie id, old, new) for the search indexes, old or new None when created or deleted
+        self.reindexed: List[Tuple[int, Optional[MovieRecord], Optional[MovieRecord]]] = []
+        # Shops whose data (the shop or any of its movies) this write changes
+        self.changed_shops: Set[int] = set()
+
+    def shop_ids(self, shop_id: int) -> Tuple[MapEditor, MapEditor]:
+        """Editors of the movie ids and available movie ids of a shop"""
+        self.changed_shops.add(shop_id)
+        editors = self._shop_editors.get(shop_id)
+        if editors is None:
+            entry = self.shop_movies.get(shop_id)
+            if entry is None:
+                # Lazily loaded shops still carry their movie list; it moves into
+                # the index the first time the shop is touched, which keeps startup lazy
+                shop = self.shops[shop_id]
+                entry = _index_shop(shop)
+                self.shops[shop_id] = shop.model_copy(update={"movies": []})
+            editors = self._shop_editors[shop_id] = (entry.ids.edit(), entry.available.edit())
+        return editors
+
+    def add_shop(self, shop: Shop):
+        self.changed_shops.add(shop.id)
+        self.shops[shop.id] = shop
+        self._shop_editors[shop.id] = (PersistentMap().edit(), PersistentMap().edit())
+
+    def drop_shop(self, shop_id: int):
+        self.changed_shops.add(shop_id)
+        self.shops.pop(shop_id)
+        self.shop_movies.pop(shop_id)
+        self._shop_editors.pop(shop_id, None)
+        release_shop_id(shop_id)
+
+    def finish(self) -> StoreVersion:
+        for shop_id, (ids, available) in self._shop_editors.items():
+            self.shop_movies[shop_id] = ShopMovies(ids.finish(), available.finish())
+        return StoreVersion(self.base.number + 1, self.movies.finish(), self.shops.finish(), self.shop_movies.finish(),
+                            self.next_movie_id, self.next_shop_id)
+
+
+class InMemoryRepository(MovieShopRepository):
+    """
+    Keeps every movie and shop in process memory. Durability comes from the
+    snapshot/journal persistence driven by main.py; when a journal is given
+    every mutation appends its record to it.
+
+    The data is a chain of immutable StoreVersions built from persistent maps
+    (MVCC): a write builds the next version next to the current one, sharing
+    everything it did not touch, and publishes it with a single assignment.
+    Readers take the current version without locking and never see a write
+    half done; `pinned()` keeps one version for several reads, and a failed
+    write publishes nothing. Writers run one at a time.
+
+    Which movies belong to a shop is kept in per-shop id maps, not in
+    `Shop.movies`, so removing, moving or deleting a title only touches its
+    own entries. Shop responses are assembled from them.
+
+    Movies are stored as MovieRecords, a fraction of the memory of a pydantic
+    Movie; the Movies handed out are built from them on the way out.
+
+    Every write also records the shops it changed, so a segmented snapshot
+    only writes those again (see `take_changed_shops`).
+
+    As shard `shard_index` of `shard_count` it only hands out the ids of that
+    shard (see `_shard_id`), so ids stay unique across shards and the shard
+    of a shop follows from its id.
+    """
+
+    def __init__(self, movies: Mapping[int, Movie], shops: Mapping[int, Shop], next_movie_id: int = 1, next_shop_id: int = 1, journal: Optional[Journal] = None,
+                 shard_index: int = 0, shard_count: int = 1):
+        self.journal = journal
+        self._id_step = shard_count
+        next_movie_id = _shard_id(next_movie_id, shard_index, shard_count)
+        next_shop_id = _shard_id(next_shop_id, shard_index, shard_count)
+        movies = _movie_records(movies)
+        shops, shop_movies = _shop_entries(shops, movies)
+        self._version = StoreVersion(0, movies, shops, shop_movies, next_movie_id, next_shop_id)
+        self._write_lock = threading.RLock()
+        self._edit: Optional[_VersionEdit] = None
+        # Shops written since the last save, None until a first save (see take_changed_shops)
+        self._changed_shops: Optional[Set[int]] = None
+        self._pinned = threading.local()
+        # Search indexes (substring on name and director, genre sets) over the titles,
+        # so a film stocked by many shops is matched once, and the copies of each
+        # title. Built on the first search so a lazily loaded snapshot does not have
+        # to be hydrated at startup. They follow the latest version: `_index_lock`
+        # covers publishing a version together with its index changes.
+        self._index_lock = threading.Lock()
+        self._name_index: Optional[TrigramIndex] = None
+        self._director_index: Optional[TrigramIndex] = None
+        self._genre_index: Optional[GenreIndex] = None
+        self._title_copies: Optional[MemberIndex] = None
+
+    @property
+    def version(self) -> StoreVersion:
+        return self._version
+
+    def transaction(self):
+        return self._write_lock
+
+    @contextmanager
+    def pinned(self, version: Optional[StoreVersion] = None):
+        # Reads in this thread use `version` (by default the one current now) until the block ends
+        previous = getattr(self._pinned, "version", None)
+        self._pinned.version = version or previous or self._version
+        try:
+            yield self._pinned.version
+        finally:
+            self._pinned.version = previous
+
+    def _read_version(self) -> StoreVersion:
+        return getattr(self._pinned, "version", None) or self._version
+
+    @contextmanager
+    def _writing(self):
+        # Nested writes (a bulk operation, a transfer deleting its source) join the outer edit
+        with self._write_lock:
+            if self._edit is not None:
+                yield self._edit
+                return
+            edit = self._edit = _VersionEdit(self._version)
+            try:
+                yield edit
+            finally:
+                self._edit = None
+            self._publish(edit.finish(), edit.reindexed)
+            if self._changed_shops is not None:
+                self._changed_shops |= edit.changed_shops
+
+    def _publish(self, version: StoreVersion, reindexed: List[Tuple[int, Optional[MovieRecord], Optional[MovieRecord]]] = ()):
+        with self._index_lock:
+            self._version = version
+            if self._name_index is not None:
+                for movie_id, old, new in reindexed:
+                    if old is not None and self._title_copies.remove(old.title, movie_id):
+                        self._name_index.remove(old.title)
+                        self._director_index.remove(old.title)
+                        self._genre_index.remove(old.title, old.genres)
+                    if new is not None and self._title_copies.add(new.title, movie_id):
+                        self._index_title(self._name_index, self._director_index, self._genre_index, new.title)
+
+    @staticmethod
+    def _index_title(name_index: TrigramIndex, director_index: TrigramIndex, genre_index: GenreIndex, title: Title):
+        name_index.add(title, title.name)
+        director_index.add(title, title.director)
+        genre_index.add(title, title.genres)
+
+    def _search_indexes(self):
+        # Called with _index_lock held, so they are built from the latest version
+        if self._name_index is None:
+            name_index, director_index, genre_index, title_copies = TrigramIndex(), TrigramIndex(), GenreIndex(), MemberIndex()
+            for movie_id, movie in self._version.movies.items():
+                if title_copies.add(movie.title, movie_id):
+                    self._index_title(name_index, director_index, genre_index, movie.title)
+            self._name_index, self._director_index, self._genre_index, self._title_copies = name_index, director_index, genre_index, title_copies
+        return self._name_index, self._director_index, self._genre_index, self._title_copies
+
+    def _journal_batch(self):
+        return self.journal.batch() if self.journal else nullcontext()
+
+    def _shop_entry(self, version: StoreVersion, shop_id: int) -> ShopMovies:
+        entry = version.shop_movies.get(shop_id)
+        if entry is None:
+            # Not indexed yet, so no write has touched the shop since it was loaded
+            # and its movie list is still right. The index built here is kept if no
+            # write is running; otherwise the next reader builds it again.
+            entry = _index_shop(version.shops[shop_id])
+            if self._write_lock.acquire(blocking=False):
+                try:
+                    current = self._version
+                    if self._edit is None and shop_id in current.shops and shop_id not in current.shop_movies:
+                        self._publish(current._replace(shop_movies=current.shop_movies.set(shop_id, entry)))
+                finally:
+                    self._write_lock.release()
+        return entry
+
+    def _assemble_shop(self, version: StoreVersion, shop: Shop) -> Shop:
+        movie_ids = list(self._shop_entry(version, shop.id).ids)
+        shop_movies = _to_movies(movie_ids, version.movies.get_many(movie_ids))
+        return Shop.model_construct(id=shop.id, address=shop.address, manager=shop.manager, movies=shop_movies)
+
+    def export_state(self, version: Optional[StoreVersion] = None):
+        # A published version never changes, so it is saved while writes go on.
+        # Movies and shops are built one at a time while the snapshot is written.
+        version = version or self._read_version()
+        shops = _StateView(version.shops, lambda shop_id, shop: self._assemble_shop(version, shop))
+        return _StateView(version.movies, _to_movie), shops, version.next_movie_id, version.next_shop_id
+
+    def take_changed_shops(self) -> Optional[Set[int]]:
+        """
+        Shops whose data changed since the previous call, the only ones a
+        segmented snapshot has to write again; None when it is not known
+        (nothing was saved since loading) and everything has to be written.
+        Called inside transaction(), with the version to save taken there too.
+        """
+        with self._write_lock:
+            changed_shops, self._changed_shops = self._changed_shops, set()
+        return changed_shops
+
+    def restore_changed_shops(self, changed_shops: Optional[Set[int]]):
+        # A save that failed: its shops are written by the next one
+        with self._write_lock:
+            if changed_shops is None or self._changed_shops is None:
+                self._changed_shops = None
+            else:
+                self._changed_shops |= changed_shops
+
+    # Movies
+    def get_movie(self, movie_id: int) -> Optional[Movie]:
+        movie = self._read_version().movies.get(movie_id)
+        return movie.to_movie(movie_id) if movie is not None else None
+
+    def list_movies(self, after: int = 0, limit: Optional[int] = None) -> List[Movie]:
+        return [movie.to_movie(movie_id) for movie_id, movie in islice(self._read_version().movies.items_after(after), limit)]
+
+    def iter_movies(self, after: int = 0, page_size: int = 500) -> Iterator[Movie]:
+        # The whole stream reads the version current when it started
+        return (movie.to_movie(movie_id) for movie_id, movie in self._read_version().movies.items_after(after))
+
+    def create_movie(self, name: str, director: str, genres: List[str], shop_id: int) -> Movie:
+        with self._writing() as edit:
+            movie_id = edit.next_movie_id
+            edit.next_movie_id += self._id_step
+            movie = MovieRecord(catalog_title(name, director, genres), shop_id)
+            self._insert_movie(edit, movie_id, movie)
+            new_movie = movie.to_movie(movie_id)
+            if self.journal:
+                self.journal.log_movie(new_movie)
+        return new_movie
+
+    def update_movie(self, movie_id: int, name: str, director: str, genres: List[str]) -> Optional[Movie]:
+        with self._writing() as edit:
+            old_movie = edit.movies.get(movie_id)
+            if old_movie is None:
+                return None
+            movie = old_movie.replace(title=catalog_title(name, director, genres))
+            self._replace_movie(edit, movie_id, old_movie, movie)
+            movie = movie.to_movie(movie_id)
+            if self.journal:
+                self.journal.log_movie(movie)
+        return movie
+
+    def update_title(self, title: MovieRequestUpdate, new_title: MovieRequestUpdate) -> List[Movie]:
+        with self._writing() as edit:
+            with self._index_lock:
+                # Built before the lookup: a title only exists while some record holds it,
+                # and a lazily loaded movie has no record until it is first read
+                self._search_indexes()
+            old_title = find_title(title.name, title.director, title.genres)
+            if old_title is None:
+                return []
+            return self._retitle(edit, old_title, new_title)
+
+    def update_movie_title(self, movie_id: int, new_title: MovieRequestUpdate) -> Optional[List[Movie]]:
+        with self._writing() as edit:
+            movie = edit.movies.get(movie_id)
+            if movie is None:
+                return None
+            return self._retitle(edit, movie.title, new_title)
+
+    def _retitle(self, edit: _VersionEdit, old_title: Title, new_title: MovieRequestUpdate) -> List[Movie]:
+        with self._index_lock:
+            # The copies in the latest published version, the one this write started from
+            movie_ids = sorted(self._search_indexes()[3].members(old_title))
+        new_title = catalog_title(new_title.name, new_title.director, new_title.genres)
+        updated = []
+        with self._journal_batch():
+            for movie_id in movie_ids:
+                old_movie = edit.movies.get(movie_id)
+                if old_movie is None or old_movie.title is not old_title:
+                    # Changed earlier in the same (outer) write
+                    continue
+                movie = old_movie.replace(title=new_title)
+                self._replace_movie(edit, movie_id, old_movie, movie)
+                updated.append(movie.to_movie(movie_id))
+                if self.journal:
+                    self.journal.log_movie(updated[-1])
+        return updated
+
+    def set_movie_rent(self, movie_id: int, rent: bool) -> Optional[Movie]:
+        with self._writing() as edit:
+            old_movie = edit.movies.get(movie_id)
+            if old_movie is None:
+                return None
+            movie = old_movie.replace(rent=rent)
+            self._replace_movie(edit, movie_id, old_movie, movie)
+            movie = movie.to_movie(movie_id)
+            if self.journal:
+                self.journal.log_movie(movie)
+        return movie
+
+    def move_movie(self, movie_id: int, shop_id: int) -> Optional[Movie]:
+        with self._writing() as edit:
+            movie = edit.movies.get(movie_id)
+            if movie is None:
+                return None
+            self._move(edit, movie_id, movie, shop_id)
+            movie = edit.movies[movie_id].to_movie(movie_id)
+            if self.journal:
+                self.journal.log_movie(movie)
+        return movie
+
+    def _move(self, edit: _VersionEdit, movie_id: int, movie: MovieRecord, shop_id: int):
+        source_ids, source_available = edit.shop_ids(movie.shop)
+        target_ids, target_available = edit.shop_ids(shop_id)
+        source_ids.pop(movie_id)
+        source_available.pop(movie_id)
+        target_ids[movie_id] = None
+        if not movie.rent:
+            target_available[movie_id] = None
+        edit.movies[movie_id] = movie.replace(shop=shop_id)
+
+    def _insert_movie(self, edit: _VersionEdit, movie_id: int, movie: MovieRecord):
+        edit.movies[movie_id] = movie
+        movie_ids, available_ids = edit.shop_ids(movie.shop)
+        movie_ids[movie_id] = None
+        if not movie.rent:
+            available_ids[movie_id] = None
+        edit.reindexed.append((movie_id, None, movie))
+
+    def _replace_movie(self, edit: _VersionEdit, movie_id: int, old_movie: MovieRecord, movie: MovieRecord):
+        # Same id and shop: keeps the available ids and the search indexes in step
+        edit.movies[movie_id] = movie
+        edit.changed_shops.add(movie.shop)
+        if old_movie.rent != movie.rent:
+            _, available_ids = edit.shop_ids(movie.shop)
+            if movie.rent:
+                available_ids.pop(movie_id)
+            else:
+                available_ids[movie_id] = None
+        if old_movie.title is not movie.title:
+            edit.reindexed.append((movie_id, old_movie, movie))
+
+    def _remove_movie(self, edit: _VersionEdit, movie_id: int, movie: MovieRecord):
+        edit.movies.pop(movie_id)
+        movie_ids, available_ids = edit.shop_ids(movie.shop)
+        movie_ids.pop(movie_id)
+        available_ids.pop(movie_id)
+        edit.reindexed.append((movie_id, movie, None))
+
+    def delete_movie(self, movie_id: int) -> bool:
+        with self._writing() as edit:
+            movie = edit.movies.get(movie_id)
+            if movie is None:
+                return False
+            self._remove_movie(edit, movie_id, movie)
+            if self.journal:
+                self.journal.log_movie_deleted(movie_id)
+        return True
+
+    # Bulk operations are a single version and a single journal record
+    def create_movies(self, movies: List[MovieRequestCreate]) -> List[Movie]:
+        with self._writing(), self._journal_batch():
+            return super().create_movies(movies)
+
+    def update_movies(self, movies: List[MovieBulkUpdate]) -> List[Movie]:
+        with self._writing(), self._journal_batch():
+            return super().update_movies(movies)
+
+    def delete_movies(self, movie_ids: List[int]):
+        with self._writing(), self._journal_batch():
+            super().delete_movies(movie_ids)
+
+    def import_movies(self, movies: List[Movie]) -> List[Movie]:
+        # Ids of another shard: the next id of this one is left alone
+        with self._writing() as edit, self._journal_batch():
+            for movie in movies:
+                self._insert_movie(edit, movie.id, MovieRecord.from_movie(movie))
+                if self.journal:
+                    self.journal.log_movie(movie)
+        return movies
+
+    def get_movies(self, movie_ids: List[int]) -> List[Movie]:
+        movies = self._read_version().movies
+        return [movie.to_movie(movie_id) for movie_id, movie in zip(movie_ids, map(movies.get, movie_ids)) if movie is not None]
+
+    def issues_movie_id(self, movie_id: int) -> bool:
+        # This shard hands out next_movie_id, then every _id_step ids after it
+        next_movie_id = self._read_version().next_movie_id
+        return movie_id >= next_movie_id and (movie_id - next_movie_id) % self._id_step == 0
+
+    def search_movies(self, name: Optional[str], director: Optional[str], genres: Optional[List[str]], after: int = 0, limit: Optional[int] = None) -> List[Movie]:
+        wanted_genres = {g for g in genres if g != ""} if genres else set()
+        if not (name or director or wanted_genres):
+            return self.list_movies(after, limit)
+        version = self._read_version()
+        # Ids are handed out in increasing order, so this keeps the catalog order
+        movie_ids = _page_ids(self._search_ids(version, name, director, wanted_genres), after, limit)
+        return _to_movies(movie_ids, version.movies.get_many(movie_ids))
+
+    def search_movie_ids(self, name: Optional[str], director: Optional[str], genres: Optional[List[str]]) -> List[int]:
+        wanted_genres = {g for g in genres if g != ""} if genres else set()
+        version = self._read_version()
+        if not (name or director or wanted_genres):
+            return list(version.movies)
+        return sorted(self._search_ids(version, name, director, wanted_genres))
+
+    def _search_ids(self, version: StoreVersion, name: Optional[str], director: Optional[str], wanted_genres: Set[str]) -> List[int]:
+        # Ids of the movies of `version` matching the filters, in no particular order
+        with self._index_lock:
+            if version is self._version:
+                name_index, director_index, genre_index, title_copies = self._search_indexes()
+                # Each filter is (estimated matching titles, index, query): the most selective
+                # one produces the candidates and the others only check them one by one
+                filters = []
+                if name:
+                    filters.append((name_index.estimate(name), name_index, name))
+                if director:
+                    filters.append((director_index.estimate(director), director_index, director))
+                if wanted_genres:
+                    filters.append((genre_index.estimate(wanted_genres), genre_index, wanted_genres))
+                filters.sort(key=lambda f: f[0])
+                _, index, query = filters[0]
+                titles = index.search(query)
+                for _, index, query in filters[1:]:
+                    titles = [title for title in titles if index.matches(title, query)]
+                return [movie_id for title in titles for movie_id in title_copies.members(title)]
+        # A pinned version older than the indexes: a movie that matched in it may
+        # have been renamed or deleted since and is no longer indexed, so the
+        # version itself is scanned
+        return [movie_id for movie_id, movie in version.movies.items() if _matches(movie, name, director, wanted_genres)]
+
+    def iter_search_movies(self, name: Optional[str], director: Optional[str], genres: Optional[List[str]], after: int = 0, page_size: int = 500) -> Iterator[Movie]:
+        wanted_genres = {g for g in genres if g != ""} if genres else set()
+        if not (name or director or wanted_genres):
+            return self.iter_movies(after, page_size)
+        # Searched once, on the version current now, and streamed from that version.
+        # Only the ids are collected up front; Movies are built a page at a time.
+        version = self._read_version()
+        movie_ids = sorted(movie_id for movie_id in self._search_ids(version, name, director, wanted_genres) if movie_id > after)
+        return _iter_movie_pages(version.movies, movie_ids, page_size)
+
+    # Shops
+    def has_shop(self, shop_id: int) -> bool:
+        return shop_id in self._read_version().shops
+
+    def get_shop(self, shop_id: int) -> Optional[Shop]:
+        version = self._read_version()
+        shop = version.shops.get(shop_id)
+        if shop is None:
+            return None
+        return self._assemble_shop(version, shop)
+
+    def list_shops(self, after: int = 0, limit: Optional[int] = None) -> List[Shop]:
+        version = self._read_version()
+        return [self._assemble_shop(version, shop) for shop in version.shops.page(after, limit)]
+
+    def iter_shops(self, after: int = 0, page_size: int = 500) -> Iterator[Shop]:
+        version = self._read_version()
+        return (self._assemble_shop(version, shop) for _, shop in version.shops.items_after(after))
+
+    def create_shop(self, address: str, manager: str) -> Shop:
+        with self._writing() as edit:
+            new_shop = Shop(id=edit.next_shop_id, address=address, manager=manager)
+            edit.next_shop_id += self._id_step
+            edit.add_shop(new_shop)
+            if self.journal:
+                self.journal.log_shop(new_shop)
+        return new_shop
+
+    def update_shop(self, shop_id: int, address: str, manager: str) -> Optional[Shop]:
+        with self._writing() as edit:
+            if shop_id not in edit.shops:
+                return None
+            # A loaded shop hands its movie list to the index before it is copied
+            movie_ids, _ = edit.shop_ids(shop_id)
+            shop = edit.shops[shop_id] = edit.shops[shop_id].model_copy(update={"address": address, "manager": manager})
+            if self.journal:
+                self.journal.log_shop(shop)
+            shop_movies = [edit.movies[movie_id].to_movie(movie_id) for movie_id in sorted(movie_ids)]
+        return Shop.model_construct(id=shop.id, address=shop.address, manager=shop.manager, movies=shop_movies)
+
+    def delete_shop(self, shop_id: int) -> bool:
+        with self._writing() as edit:
+            if shop_id not in edit.shops:
+                return False
+            self._remove_shop(edit, shop_id)
+            if self.journal:
+                self.journal.log_shop_deleted(shop_id)
+        return True
+
+    def _remove_shop(self, edit: _VersionEdit, shop_id: int):
+        # The shop goes with every movie still in it
+        movie_ids, _ = edit.shop_ids(shop_id)
+        for movie_id in movie_ids:
+            edit.reindexed.append((movie_id, edit.movies.pop(movie_id), None))
+        edit.drop_shop(shop_id)
+
+    def list_shop_movies(self, shop_id: int, available_only: bool = False, after: int = 0, limit: Optional[int] = None) -> Optional[List[Movie]]:
+        version = self._read_version()
+        if shop_id not in version.shops:
+            return None
+        entry = self._shop_entry(version, shop_id)
+        movie_ids = (entry.available if available_only else entry.ids).key_page(after, limit)
+        return _to_movies(movie_ids, version.movies.get_many(movie_ids))
+
+    def count_shop_movies(self, shop_id: int) -> Optional[Tuple[int, int]]:
+        version = self._read_version()
+        if shop_id not in version.shops:
+            return None
+        entry = self._shop_entry(version, shop_id)
+        return len(entry.ids), len(entry.available)
+
+    def count_entities(self) -> Tuple[int, int]:
+        version = self._read_version()
+        return len(version.movies), len(version.shops)
+
+    def genre_cardinalities(self) -> Dict[str, int]:
+        # Titles per genre: the index holds each film once, however many copies it has
+        with self._index_lock:
+            return self._search_indexes()[2].cardinalities()
+
+    def transfer_movies(self, source_id: int, target_id: int, genres: Optional[List[str]] = None, available: Optional[bool] = None, delete_source: bool = False) -> Optional[List[int]]:
+        with self._writing() as edit, self._journal_batch():
+            if source_id not in edit.shops or target_id not in edit.shops:
+                return None
+            source_ids, source_available = edit.shop_ids(source_id)
+            wanted_genres = {g for g in genres if g != ""} if genres else None
+            candidates = ((movie_id, edit.movies[movie_id]) for movie_id in (source_available if available else source_ids))
+            moved = sorted(movie_id for movie_id, movie in candidates
+                           if (available is None or movie.rent != available)
+                           and (not wanted_genres or wanted_genres.issubset(movie.genres)))
+            for movie_id in moved:
+                self._move(edit, movie_id, edit.movies[movie_id], target_id)
+            if self.journal and moved:
+                self.journal.log_movies_moved(moved, target_id)
+            if delete_source:
+                self.delete_shop(source_id)
+        return moved
+
+    # Replication
+    def apply_records(self, records: Iterable[dict]):
+        """
+        Applies journal records written by another process (the primary, on a
+        read replica) as a single new version. Records carry the final state of
+        what they touched, so one that is already reflected changes nothing.
+        """
+        with self._writing() as edit:
+            for record in records:
+                self._apply_record(edit, record)
+
+    def _apply_record(self, edit: _VersionEdit, record: dict):
+        op = record["op"]
+        if op == BATCH_RECORD:
+            for batched_record in record["records"]:
+                self._apply_record(edit, batched_record)
+        elif op == MOVIE_RECORD:
+            v = Movie(**record["v"])
+            movie = MovieRecord.from_movie(v)
+            old_movie = edit.movies.get(v.id)
+            if old_movie is None:
+                self._insert_movie(edit, v.id, movie)
+            else:
+                if old_movie.shop != movie.shop:
+                    self._move(edit, v.id, old_movie, movie.shop)
+                    old_movie = edit.movies[v.id]
+                self._replace_movie(edit, v.id, old_movie, movie)
+            edit.next_movie_id = max(edit.next_movie_id, v.id + 1)
+        elif op == MOVIES_MOVED_RECORD:
+            for movie_id in record["ids"]:
+                movie = edit.movies.get(movie_id)
+                if movie is not None and movie.shop != record["shop"]:
+                    self._move(edit, movie_id, movie, record["shop"])
+        elif op == MOVIE_DELETED_RECORD:
+            movie = edit.movies.get(record["id"])
+            if movie is not None:
+                self._remove_movie(edit, record["id"], movie)
+        elif op == SHOP_RECORD:
+            v = record["v"]
+            if v["id"] in edit.shops:
+                # A loaded shop hands its movie list to the index before it is copied
+                edit.shop_ids(v["id"])
+                edit.shops[v["id"]] = edit.shops[v["id"]].model_copy(update={"address": v["address"], "manager": v["manager"]})
+            else:
+                edit.add_shop(Shop(id=v["id"], address=v["address"], manager=v["manager"]))
+            edit.next_shop_id = max(edit.next_shop_id, v["id"] + 1)
+        elif op == SHOP_DELETED_RECORD:
+            if record["id"] in edit.shops:
+                self._remove_shop(edit, record["id"])
@@ -0,0 +1,131 @@
+import os, json
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, Mapping, Optional
+from src.schemas.schemas import Movie, Shop
+
+# Segmented snapshot: the state is split by shop, so a save only rewrites the shops
+# changed since the previous one.
+#
+#     STATE_FILE                      manifest, JSON:
+#                                     {"segments": {shop id: file name}, "generation": n,
+#                                      "next_movie_id": ..., "next_shop_id": ...}
+#     STATE_FILE.segments/shop-<id>.<generation>.json
+#                                     one shop and its movies, JSON:
+#                                     {"shop": {"id", "address", "manager"},
+#                                      "titles": [[name, director, genres]],
+#                                      "movies": [{"id", "title", "rent"}]}
+#
+# Segment files are never overwritten: a save writes the changed shops under the next
+# generation and then replaces the manifest, which is the only rename that matters.
+# A crash before it leaves the previous manifest and all its files untouched; files no
+# manifest refers to are removed by the next save.
+#
+# Movies whose shop does not exist belong to no segment and are not saved (no write
+# leaves one behind).
+
+MANIFEST_PREFIX = b'{"segments": '
+# Threads reading segment files at startup
+LOAD_WORKERS = 8
+
+
+def segments_dir(filename: str) -> str:
+    return f"{filename}.segments"
+
+
+def is_segment_manifest(filename: str) -> bool:
+    with open(filename, "rb") as f:
+        return f.read(len(MANIFEST_PREFIX)) == MANIFEST_PREFIX
+
+
+def _read_manifest(filename: str) -> Optional[dict]:
+    if not os.path.exists(filename) or not is_segment_manifest(filename):
+        return None
+    with open(filename, "r") as f:
+        return json.load(f)
+
+
+def _encode_segment(shop: Shop) -> dict:
+    titles: Dict[tuple, int] = {}
+    movies = []
+    for movie in shop.movies:
+        title = titles.setdefault((movie.name, movie.director, tuple(movie.genres)), len(titles))
+        movies.append({"id": movie.id, "title": title, "rent": movie.rent})
+    return {
+        "shop": {"id": shop.id, "address": shop.address, "manager": shop.manager},
+        "titles": [[name, director, list(genres)] for name, director, genres in titles],
+        "movies": movies
+    }
+
+
+def save_state_segments(filename: str, shops: Mapping[int, Shop], next_movie_id: int, next_shop_id: int, changed_shops: Optional[Iterable[int]] = None):
+    """
+    Writes the segments of `changed_shops` (a shop no longer in `shops` loses its
+    segment) and a new manifest. With None, or when `filename` is not a segment
+    manifest yet, every shop is written.
+    """
+    directory = segments_dir(filename)
+    os.makedirs(directory, exist_ok=True)
+    manifest = _read_manifest(filename)
+    if manifest is None or changed_shops is None:
+        segments, generation, changed_shops = {}, (manifest or {}).get("generation", 0) + 1, shops.keys()
+    else:
+        segments, generation = manifest["segments"], manifest["generation"] + 1
+    for shop_id in changed_shops:
+        shop = shops.get(shop_id)
+        if shop is None:
+            segments.pop(str(shop_id), None)
+            continue
+        name = f"shop-{shop_id}.{generation}.json"
+        with open(os.path.join(directory, name), "w") as f:
+            json.dump(_encode_segment(shop), f)
+        segments[str(shop_id)] = name
+    data = {"segments": segments, "generation": generation, "next_movie_id": next_movie_id, "next_shop_id": next_shop_id}
+    tmp_filename = f"{filename}.tmp"
+    with open(tmp_filename, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp_filename, filename)
+    # Superseded generations, and files of a save that crashed before its manifest
+    live = set(segments.values())
+    for name in os.listdir(directory):
+        if name not in live:
+            os.remove(os.path.join(directory, name))
+
+
+def saved_segments_size(filename: str) -> int:
+    # Bytes written by the last save: its manifest and the segments of its generation
+    manifest = _read_manifest(filename)
+    suffix = f".{manifest['generation']}.json"
+    directory = segments_dir(filename)
+    return os.path.getsize(filename) + sum(os.path.getsize(os.path.join(directory, name)) for name in manifest["segments"].values() if name.endswith(suffix))
+
+
+def _read_segment(path: str) -> dict:
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def load_state_segments(filename: str):
+    while True:
+        manifest = _read_manifest(filename)
+        directory = segments_dir(filename)
+        paths = [os.path.join(directory, name) for _, name in sorted(manifest["segments"].items(), key=lambda entry: int(entry[0]))]
+        movies: Dict[int, Movie] = {}
+        shops: Dict[int, Shop] = {}
+        try:
+            # Files are read by several threads at once, so reading the next ones
+            # overlaps with building the entities of this one
+            with ThreadPoolExecutor(LOAD_WORKERS) as pool:
+                for segment in pool.map(_read_segment, paths):
+                    v = segment["shop"]
+                    titles = segment["titles"]
+                    shop_movies = []
+                    for m in segment["movies"]:
+                        name, director, genres = titles[m["title"]]
+                        movie = movies[m["id"]] = Movie(id=m["id"], name=name, director=director, genres=genres, shop=v["id"], rent=m["rent"])
+                        shop_movies.append(movie)
+                    shops[v["id"]] = Shop(id=v["id"], address=v["address"], manager=v["manager"], movies=shop_movies)
+        except FileNotFoundError:
+            # The writer (the primary, for a read replica) saved a newer generation
+            # and removed files of the manifest read here; start over from the new one
+            continue
+        return movies, shops, manifest["next_movie_id"], manifest["next_shop_id"]
@@ -0,0 +1,323 @@
+import json, sqlite3, threading
+from typing import Dict, List, Optional, Tuple
+from src.schemas.schemas import Movie, MovieBulkUpdate, MovieRequestCreate, MovieRequestUpdate, Shop
+from src.database_manager.repository import MovieShopRepository
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS shops (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    address TEXT NOT NULL,
+    manager TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS movies (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL,
+    director TEXT NOT NULL,
+    genres TEXT NOT NULL,
+    shop INTEGER NOT NULL,
+    rent INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS movie_genres (
+    genre TEXT NOT NULL,
+    movie_id INTEGER NOT NULL,
+    PRIMARY KEY (genre, movie_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_movies_shop_rent ON movies (shop, rent);
+CREATE INDEX IF NOT EXISTS idx_movies_rent ON movies (rent);
+CREATE INDEX IF NOT EXISTS idx_movies_name ON movies (name);
+CREATE INDEX IF NOT EXISTS idx_movies_director ON movies (director);
+CREATE INDEX IF NOT EXISTS idx_movie_genres_movie ON movie_genres (movie_id);
+"""
+
+# Statements are constant strings with placeholders, so each connection
+# prepares them once and reuses them from its statement cache.
+MOVIE_COLUMNS = "id, name, director, genres, shop, rent"
+SELECT_MOVIE = f"SELECT {MOVIE_COLUMNS} FROM movies WHERE id = ?"
+SELECT_MOVIES = f"SELECT {MOVIE_COLUMNS} FROM movies ORDER BY id"
+# Keyset pages: "LIMIT -1" is no limit in SQLite
+SELECT_MOVIES_PAGE = f"SELECT {MOVIE_COLUMNS} FROM movies WHERE id > ? ORDER BY id LIMIT ?"
+SELECT_SHOP_MOVIES = f"SELECT {MOVIE_COLUMNS} FROM movies WHERE shop = ? ORDER BY id"
+SELECT_SHOP_MOVIES_PAGE = f"SELECT {MOVIE_COLUMNS} FROM movies WHERE shop = ? AND id > ? ORDER BY id LIMIT ?"
+SELECT_SHOP_AVAILABLE_MOVIES_PAGE = f"SELECT {MOVIE_COLUMNS} FROM movies WHERE shop = ? AND rent = 0 AND id > ? ORDER BY id LIMIT ?"
+COUNT_SHOP_MOVIES = "SELECT COUNT(*), COUNT(*) - COALESCE(SUM(rent), 0) FROM movies WHERE shop = ?"
+COUNT_ENTITIES = "SELECT (SELECT COUNT(*) FROM movies), (SELECT COUNT(*) FROM shops)"
+COUNT_GENRES = "SELECT genre, COUNT(*) FROM movie_genres GROUP BY genre"
+INSERT_MOVIE = "INSERT INTO movies (name, director, genres, shop, rent) VALUES (?, ?, ?, ?, 0)"
+INSERT_MOVIE_WITH_ID = "INSERT INTO movies (id, name, director, genres, shop, rent) VALUES (?, ?, ?, ?, ?, ?)"
+UPDATE_MOVIE = "UPDATE movies SET name = ?, director = ?, genres = ? WHERE id = ?"
+# Copies of a film: genres are stored as the JSON of the list, so equal lists are equal text
+SELECT_TITLE_COPIES = "SELECT id FROM movies WHERE name = ? AND director = ? AND genres = ? ORDER BY id"
+UPDATE_MOVIE_RENT = "UPDATE movies SET rent = ? WHERE id = ?"
+UPDATE_MOVIE_SHOP = "UPDATE movies SET shop = ? WHERE id = ?"
+DELETE_MOVIE = "DELETE FROM movies WHERE id = ?"
+INSERT_GENRE = "INSERT OR IGNORE INTO movie_genres (genre, movie_id) VALUES (?, ?)"
+DELETE_MOVIE_GENRES = "DELETE FROM movie_genres WHERE movie_id = ?"
+LAST_MOVIE_ID = "SELECT seq FROM sqlite_sequence WHERE name = 'movies'"
+
+SELECT_SHOP = "SELECT id, address, manager FROM shops WHERE id = ?"
+SELECT_SHOPS_PAGE = "SELECT id, address, manager FROM shops WHERE id > ? ORDER BY id LIMIT ?"
+SHOP_EXISTS = "SELECT 1 FROM shops WHERE id = ?"
+INSERT_SHOP = "INSERT INTO shops (address, manager) VALUES (?, ?)"
+INSERT_SHOP_WITH_ID = "INSERT INTO shops (id, address, manager) VALUES (?, ?, ?)"
+UPDATE_SHOP = "UPDATE shops SET address = ?, manager = ? WHERE id = ?"
+DELETE_SHOP = "DELETE FROM shops WHERE id = ?"
+DELETE_SHOP_MOVIE_GENRES = "DELETE FROM movie_genres WHERE movie_id IN (SELECT id FROM movies WHERE shop = ?)"
+DELETE_SHOP_MOVIES = "DELETE FROM movies WHERE shop = ?"
+UPDATE_MOVIES_SHOP = "UPDATE movies SET shop = ? WHERE shop = ? AND id = ?"
+
+
+def _movie_from_row(row) -> Movie:
+    # Rows were written from validated models, no need to validate them again
+    return Movie.model_construct(id=row[0], name=row[1], director=row[2], genres=json.loads(row[3]), shop=row[4], rent=bool(row[5]))
+
+
+def _sql_limit(limit: Optional[int]) -> int:
+    return -1 if limit is None else limit
+
+
+class SQLiteRepository(MovieShopRepository):
+    """
+    Stores movies and shops in an SQLite database in WAL mode, so the catalog
+    does not need to fit in memory and every write is durable on its own
+    without rewriting a snapshot. Each threadpool thread gets its own
+    connection; WAL lets readers run while a writer commits. SQLite already
+    isolates each statement and write; `transaction()` only serializes the
+    routes that check before they write.
+    """
+
+    def __init__(self, filename: str):
+        self.filename = filename
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._connections_lock = threading.Lock()
+        with self._connection() as conn:
+            conn.executescript(SCHEMA)
+        self._write_lock = threading.RLock()
+
+    def transaction(self):
+        return self._write_lock
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.filename, check_same_thread=False, cached_statements=256)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=5000")
+            # Python's lower() so the search matches the in-memory backend for non ASCII text
+            conn.create_function("py_lower", 1, lambda value: value.lower(), deterministic=True)
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+
+    def is_empty(self) -> bool:
+        conn = self._connection()
+        return conn.execute("SELECT NOT EXISTS (SELECT 1 FROM shops) AND NOT EXISTS (SELECT 1 FROM movies)").fetchone()[0] == 1
+
+    def import_state(self, movies: Dict[int, Movie], shops: Dict[int, Shop], next_movie_id: int, next_shop_id: int):
+        # One-off migration from a snapshot/journal state
+        with self._connection() as conn:
+            conn.executemany(INSERT_SHOP_WITH_ID, [(s.id, s.address, s.manager) for s in shops.values()])
+            conn.executemany(INSERT_MOVIE_WITH_ID, [(m.id, m.name, m.director, json.dumps(m.genres), m.shop, int(m.rent)) for m in movies.values()])
+            conn.executemany(INSERT_GENRE, [(g, m.id) for m in movies.values() for g in m.genres])
+            for table, next_id in (("movies", next_movie_id), ("shops", next_shop_id)):
+                conn.execute("DELETE FROM sqlite_sequence WHERE name = ?", (table,))
+                conn.execute("INSERT INTO sqlite_sequence (name, seq) VALUES (?, ?)", (table, next_id - 1))
+
+    def close(self):
+        with self._connections_lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+        self._local = threading.local()
+
+    # Movies
+    def get_movie(self, movie_id: int) -> Optional[Movie]:
+        row = self._connection().execute(SELECT_MOVIE, (movie_id,)).fetchone()
+        return _movie_from_row(row) if row else None
+
+    def list_movies(self, after: int = 0, limit: Optional[int] = None) -> List[Movie]:
+        return [_movie_from_row(row) for row in self._connection().execute(SELECT_MOVIES_PAGE, (after, _sql_limit(limit)))]
+
+    def create_movie(self, name: str, director: str, genres: List[str], shop_id: int) -> Movie:
+        with self._connection() as conn:
+            cursor = conn.execute(INSERT_MOVIE, (name, director, json.dumps(genres), shop_id))
+            movie_id = cursor.lastrowid
+            conn.executemany(INSERT_GENRE, [(g, movie_id) for g in genres])
+        return Movie(id=movie_id, name=name, director=director, genres=genres, shop=shop_id)
+
+    def update_movie(self, movie_id: int, name: str, director: str, genres: List[str]) -> Optional[Movie]:
+        with self._connection() as conn:
+            if conn.execute(UPDATE_MOVIE, (name, director, json.dumps(genres), movie_id)).rowcount == 0:
+                return None
+            conn.execute(DELETE_MOVIE_GENRES, (movie_id,))
+            conn.executemany(INSERT_GENRE, [(g, movie_id) for g in genres])
+        return self.get_movie(movie_id)
+
+    def update_title(self, title: MovieRequestUpdate, new_title: MovieRequestUpdate) -> List[Movie]:
+        with self._connection() as conn:
+            movie_ids = [row[0] for row in conn.execute(SELECT_TITLE_COPIES, (title.name, title.director, json.dumps(title.genres)))]
+            conn.executemany(UPDATE_MOVIE, [(new_title.name, new_title.director, json.dumps(new_title.genres), movie_id) for movie_id in movie_ids])
+            conn.executemany(DELETE_MOVIE_GENRES, [(movie_id,) for movie_id in movie_ids])
+            conn.executemany(INSERT_GENRE, [(g, movie_id) for movie_id in movie_ids for g in new_title.genres])
+        return [self.get_movie(movie_id) for movie_id in movie_ids]
+
+    def set_movie_rent(self, movie_id: int, rent: bool) -> Optional[Movie]:
+        with self._connection() as conn:
+            if conn.execute(UPDATE_MOVIE_RENT, (int(rent), movie_id)).rowcount == 0:
+                return None
+        return self.get_movie(movie_id)
+
+    def move_movie(self, movie_id: int, shop_id: int) -> Optional[Movie]:
+        with self._connection() as conn:
+            if conn.execute(UPDATE_MOVIE_SHOP, (shop_id, movie_id)).rowcount == 0:
+                return None
+        return self.get_movie(movie_id)
+
+    def delete_movie(self, movie_id: int) -> bool:
+        with self._connection() as conn:
+            conn.execute(DELETE_MOVIE_GENRES, (movie_id,))
+            return conn.execute(DELETE_MOVIE, (movie_id,)).rowcount > 0
+
+    # Bulk: one transaction per batch, so it is committed (and synced) once and all or nothing
+    def create_movies(self, movies: List[MovieRequestCreate]) -> List[Movie]:
+        created = []
+        with self._connection() as conn:
+            for m in movies:
+                movie_id = conn.execute(INSERT_MOVIE, (m.name, m.director, json.dumps(m.genres), m.shop)).lastrowid
+                conn.executemany(INSERT_GENRE, [(g, movie_id) for g in m.genres])
+                created.append(Movie(id=movie_id, name=m.name, director=m.director, genres=m.genres, shop=m.shop))
+        return created
+
+    def update_movies(self, movies: List[MovieBulkUpdate]) -> List[Movie]:
+        with self._connection() as conn:
+            conn.executemany(UPDATE_MOVIE, [(m.name, m.director, json.dumps(m.genres), m.id) for m in movies])
+            conn.executemany(DELETE_MOVIE_GENRES, [(m.id,) for m in movies])
+            conn.executemany(INSERT_GENRE, [(g, m.id) for m in movies for g in m.genres])
+        return [self.get_movie(m.id) for m in movies]
+
+    def delete_movies(self, movie_ids: List[int]):
+        with self._connection() as conn:
+            conn.executemany(DELETE_MOVIE_GENRES, [(movie_id,) for movie_id in movie_ids])
+            conn.executemany(DELETE_MOVIE, [(movie_id,) for movie_id in movie_ids])
+
+    def import_movies(self, movies: List[Movie]) -> List[Movie]:
+        with self._connection() as conn:
+            conn.executemany(INSERT_MOVIE_WITH_ID, [(m.id, m.name, m.director, json.dumps(m.genres), m.shop, int(m.rent)) for m in movies])
+            conn.executemany(INSERT_GENRE, [(g, m.id) for m in movies for g in m.genres])
+        return movies
+
+    def issues_movie_id(self, movie_id: int) -> bool:
+        # AUTOINCREMENT hands out ids above the largest one ever used
+        row = self._connection().execute(LAST_MOVIE_ID).fetchone()
+        return movie_id > (row[0] if row else 0)
+
+    def _search_query(self, columns: str, name: Optional[str], director: Optional[str], genres: Optional[List[str]], after: int, limit: Optional[int]):
+        clauses, params = ["id > ?"], [after]
+        if name:
+            clauses.append("instr(py_lower(name), ?) > 0")
+            params.append(name.lower())
+        if director:
+            clauses.append("instr(py_lower(director), ?) > 0")
+            params.append(director.lower())
+        wanted = sorted({g for g in genres if g != ""}) if genres else []
+        if wanted:
+            # Movies that have every requested genre, resolved on the (genre, movie_id) key
+            placeholders = ", ".join("?" * len(wanted))
+            clauses.append(f"id IN (SELECT movie_id FROM movie_genres WHERE genre IN ({placeholders}) GROUP BY movie_id HAVING COUNT(*) = ?)")
+            params += wanted
+            params.append(len(wanted))
+        params.append(_sql_limit(limit))
+        query = f"SELECT {columns} FROM movies WHERE {' AND '.join(clauses)} ORDER BY id LIMIT ?"
+        return self._connection().execute(query, params)
+
+    def search_movies(self, name: Optional[str], director: Optional[str], genres: Optional[List[str]], after: int = 0, limit: Optional[int] = None) -> List[Movie]:
+        return [_movie_from_row(row) for row in self._search_query(MOVIE_COLUMNS, name, director, genres, after, limit)]
+
+    def search_movie_ids(self, name: Optional[str], director: Optional[str], genres: Optional[List[str]]) -> List[int]:
+        return [row[0] for row in self._search_query("id", name, director, genres, 0, None)]
+
+    # Shops
+    def has_shop(self, shop_id: int) -> bool:
+        return self._connection().execute(SHOP_EXISTS, (shop_id,)).fetchone() is not None
+
+    def get_shop(self, shop_id: int) -> Optional[Shop]:
+        conn = self._connection()
+        row = conn.execute(SELECT_SHOP, (shop_id,)).fetchone()
+        if row is None:
+            return None
+        shop_movies = [_movie_from_row(r) for r in conn.execute(SELECT_SHOP_MOVIES, (shop_id,))]
+        return Shop.model_construct(id=row[0], address=row[1], manager=row[2], movies=shop_movies)
+
+    def list_shops(self, after: int = 0, limit: Optional[int] = None) -> List[Shop]:
+        conn = self._connection()
+        if limit is not None:
+            # A page only needs the movies of its own shops
+            return [Shop.model_construct(id=row[0], address=row[1], manager=row[2],
+                                         movies=[_movie_from_row(r) for r in conn.execute(SELECT_SHOP_MOVIES, (row[0],))])
+                    for row in conn.execute(SELECT_SHOPS_PAGE, (after, limit)).fetchall()]
+        movies_by_shop: Dict[int, List[Movie]] = {}
+        for row in conn.execute(SELECT_MOVIES):
+            movies_by_shop.setdefault(row[4], []).append(_movie_from_row(row))
+        return [Shop.model_construct(id=row[0], address=row[1], manager=row[2], movies=movies_by_shop.get(row[0], []))
+                for row in conn.execute(SELECT_SHOPS_PAGE, (after, -1))]
+
+    def create_shop(self, address: str, manager: str) -> Shop:
+        with self._connection() as conn:
+            shop_id = conn.execute(INSERT_SHOP, (address, manager)).lastrowid
+        return Shop(id=shop_id, address=address, manager=manager)
+
+    def update_shop(self, shop_id: int, address: str, manager: str) -> Optional[Shop]:
+        with self._connection() as conn:
+            if conn.execute(UPDATE_SHOP, (address, manager, shop_id)).rowcount == 0:
+                return None
+        return self.get_shop(shop_id)
+
+    def delete_shop(self, shop_id: int) -> bool:
+        with self._connection() as conn:
+            conn.execute(DELETE_SHOP_MOVIE_GENRES, (shop_id,))
+            conn.execute(DELETE_SHOP_MOVIES, (shop_id,))
+            return conn.execute(DELETE_SHOP, (shop_id,)).rowcount > 0
+
+    def list_shop_movies(self, shop_id: int, available_only: bool = False, after: int = 0, limit: Optional[int] = None) -> Optional[List[Movie]]:
+        if not self.has_shop(shop_id):
+            return None
+        query = SELECT_SHOP_AVAILABLE_MOVIES_PAGE if available_only else SELECT_SHOP_MOVIES_PAGE
+        return [_movie_from_row(row) for row in self._connection().execute(query, (shop_id, after, _sql_limit(limit)))]
+
+    def count_shop_movies(self, shop_id: int) -> Optional[Tuple[int, int]]:
+        if not self.has_shop(shop_id):
+            return None
+        total, available = self._connection().execute(COUNT_SHOP_MOVIES, (shop_id,)).fetchone()
+        return total, available
+
+    def count_entities(self) -> Tuple[int, int]:
+        movies, shops = self._connection().execute(COUNT_ENTITIES).fetchone()
+        return movies, shops
+
+    def genre_cardinalities(self) -> Dict[str, int]:
+        # Movies per genre, from the (genre, movie_id) key the genre filter runs on
+        return dict(self._connection().execute(COUNT_GENRES).fetchall())
+
+    def transfer_movies(self, source_id: int, target_id: int, genres: Optional[List[str]] = None, available: Optional[bool] = None, delete_source: bool = False) -> Optional[List[int]]:
+        if not (self.has_shop(source_id) and self.has_shop(target_id)):
+            return None
+        clauses, params = ["shop = ?"], [source_id]
+        if available is not None:
+            clauses.append("rent = ?")
+            params.append(0 if available else 1)
+        wanted = sorted({g for g in genres if g != ""}) if genres else []
+        if wanted:
+            placeholders = ", ".join("?" * len(wanted))
+            clauses.append(f"id IN (SELECT movie_id FROM movie_genres WHERE genre IN ({placeholders}) GROUP BY movie_id HAVING COUNT(*) = ?)")
+            params += wanted
+            params.append(len(wanted))
+        with self._connection() as conn:
+            moved = [row[0] for row in conn.execute(f"SELECT id FROM movies WHERE {' AND '.join(clauses)} ORDER BY id", params)]
+            conn.executemany(UPDATE_MOVIES_SHOP, [(target_id, source_id, movie_id) for movie_id in moved])
+            if delete_source:
+                conn.execute(DELETE_SHOP_MOVIE_GENRES, (source_id,))
+                conn.execute(DELETE_SHOP_MOVIES, (source_id,))
+                conn.execute(DELETE_SHOP, (source_id,))
+        return moved
@@ -1,34 +1,215 @@
+import os, time
 from fastapi.exceptions import RequestValidationError
 from fastapi.responses import JSONResponse
-from fastapi import FastAPI, Request, status
+from fastapi import FastAPI, Request, Response, status
 from fastapi.concurrency import asynccontextmanager
+from anyio import to_thread
+from typing import Optional
+import httpx
 
-from src.constants import STATE_FILE
-from src.database_manager.local_file_storage import load_state, save_state
+from src.constants import STATE_FILE, STORAGE_BACKEND, SQLITE_FILE, PERSISTENCE_MODE, JOURNAL_FILE, JOURNAL_COMPACT_EVERY, PERSISTENCE_FLUSH_INTERVAL, PERSISTENCE_FLUSH_BATCH_SIZE, PERSISTENCE_ACK, SNAPSHOT_FORMAT, SNAPSHOT_COMPRESSION, SNAPSHOT_FORK, SNAPSHOT_FORK_TIMEOUT, SNAPSHOT_LAZY_LOAD, SNAPSHOT_VERIFY_CHECKSUM, SNAPSHOT_LAZY_VERIFY_CHECKSUM, THREADPOOL_SIZE, PRIMARY_URL, REPLICA_POLL_INTERVAL, PRIMARY_UNAVAILABLE_MESSAGE, STORAGE_UNAVAILABLE_MESSAGE, SHARD_INDEX, SHARD_COUNT, PROCESS_TIME_HEADER
+from src.database_manager.local_file_storage import load_state, save_state, compact_state, lock_state_file, saved_size
+from src.database_manager.background_save import SnapshotWriter
+from src.database_manager.journal import Journal, rotated_filename
+from src.database_manager.persistence_worker import PersistenceWorker
+from src.database_manager.replication import ReplicationWorker, load_replica_state
+from src.database_manager.repository import InMemoryRepository
+from src.database_manager.segment_storage import is_segment_manifest
+from src.database_manager.sqlite_repository import SQLiteRepository
 
-from src.routes import api_routes
+from src import metrics
+from src.routes import admin_routes, api_routes
+from src.routes.errors import validation_exception_handler
+from src.routes.forwarding import forward, relay
+
+WRITE_METHODS = ("POST", "PUT", "PATCH", "DELETE")
+
+def run_save(save):
+    snapshots = api_routes.snapshots
+    snapshots.run(save)
+    metrics.save_duration.observe(snapshots.last_duration, SNAPSHOT_FORMAT)
+    metrics.save_bytes.observe(saved_size(STATE_FILE, SNAPSHOT_FORMAT), SNAPSHOT_FORMAT)
+
+def compact_journal():
+    # Writers append to the journal before publishing their version, so with writes
+    # held off for the rotation the version taken matches the rotated journal exactly.
+    # It is saved afterwards, while writes go on.
+    repo = api_routes.repo
+    with repo.transaction(), repo.journal.rotate():
+        version, changed_shops = repo.version, repo.take_changed_shops()
+    try:
+        run_save(lambda: compact_state(STATE_FILE, repo.journal, *repo.export_state(version), SNAPSHOT_FORMAT, SNAPSHOT_COMPRESSION, changed_shops))
+    except BaseException:
+        repo.restore_changed_shops(changed_shops)
+        raise
+
+def save_snapshot():
+    repo = api_routes.repo
+    with repo.transaction():
+        version, changed_shops = repo.version, repo.take_changed_shops()
+    try:
+        run_save(lambda: save_state(STATE_FILE, *repo.export_state(version), SNAPSHOT_FORMAT, SNAPSHOT_COMPRESSION, changed_shops))
+    except BaseException:
+        repo.restore_changed_shops(changed_shops)
+        raise
+
+def flush_state():
+    if api_routes.repo.journal:
+        if app.state.persistence.failure is not None:
+            # After a failed fsync the kernel may have dropped the unwritten pages and a
+            # second fsync can still succeed, so recover through a full snapshot instead
+            compact_journal()
+            return
+        api_routes.repo.journal.commit()
+        if api_routes.repo.journal.records_since_compaction >= JOURNAL_COMPACT_EVERY:
+            compact_journal()
+    else:
+        save_snapshot()
+
+def segments_hold_state(journal_filename: Optional[str]) -> bool:
+    # Started from segments with no journal tail replayed over them: what is on disk
+    # is already the loaded state, and the first save only writes what changes next
+    tails = (journal_filename, rotated_filename(journal_filename)) if journal_filename else ()
+    return (SNAPSHOT_FORMAT == "segments" and os.path.exists(STATE_FILE) and is_segment_manifest(STATE_FILE)
+            and not any(os.path.exists(tail) and os.path.getsize(tail) for tail in tails))
+
+def open_sqlite_repository():
+    repo = SQLiteRepository(SQLITE_FILE)
+    if repo.is_empty():
+        # First start on SQLite: bring over the data of an existing snapshot
+        repo.import_state(*load_state(STATE_FILE, JOURNAL_FILE))
+    return repo
+
+def start_replica(app: FastAPI):
+    if STORAGE_BACKEND != "memory" or PERSISTENCE_MODE != "journal":
+        raise RuntimeError("Read replicas follow the journal of the primary: they need STORAGE_BACKEND=memory and PERSISTENCE_MODE=journal")
+    state, follower = load_replica_state(STATE_FILE, JOURNAL_FILE, SNAPSHOT_LAZY_LOAD, SNAPSHOT_VERIFY_CHECKSUM, SNAPSHOT_LAZY_VERIFY_CHECKSUM)
+    # No journal: a replica never writes any file
+    api_routes.repo = InMemoryRepository(*state)
+    app.state.replication = ReplicationWorker(follower, api_routes.replicate, REPLICA_POLL_INTERVAL)
+    app.state.replication.start()
+    app.state.primary = httpx.AsyncClient(base_url=PRIMARY_URL, timeout=None)
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    api_routes.movies, api_routes.shops, api_routes._next_movie_id, api_routes._next_shop_id = load_state(STATE_FILE)
+    app.state.persistence = None
+    app.state.replication = None
+    app.state.primary = None
+    state_lock = None
+    to_thread.current_default_thread_limiter().total_tokens = THREADPOOL_SIZE
+    api_routes.json_cache.clear()
+    api_routes.versions.reset()
+    api_routes.search_cache.clear()
+    api_routes.snapshots = None
+    started = time.perf_counter()
+    if PRIMARY_URL:
+        start_replica(app)
+        app.state.load_seconds = time.perf_counter() - started
+    elif STORAGE_BACKEND == "sqlite":
+        if SHARD_COUNT > 1:
+            raise RuntimeError("Shards hand out their own ids: they need STORAGE_BACKEND=memory")
+        # Every write is committed by SQLite itself, there is nothing to flush
+        api_routes.repo = open_sqlite_repository()
+        app.state.load_seconds = time.perf_counter() - started
+    else:
+        state_lock = lock_state_file(STATE_FILE)
+        api_routes.snapshots = SnapshotWriter(SNAPSHOT_FORK, SNAPSHOT_FORK_TIMEOUT or None)
+        saved = segments_hold_state(JOURNAL_FILE if PERSISTENCE_MODE == "journal" else None)
+        if PERSISTENCE_MODE == "journal":
+            api_routes.repo = InMemoryRepository(*load_state(STATE_FILE, JOURNAL_FILE, SNAPSHOT_LAZY_LOAD, SNAPSHOT_VERIFY_CHECKSUM, SNAPSHOT_LAZY_VERIFY_CHECKSUM), journal=Journal(JOURNAL_FILE),
+                                                 shard_index=SHARD_INDEX, shard_count=SHARD_COUNT)
+        else:
+            api_routes.repo = InMemoryRepository(*load_state(STATE_FILE, None, SNAPSHOT_LAZY_LOAD, SNAPSHOT_VERIFY_CHECKSUM, SNAPSHOT_LAZY_VERIFY_CHECKSUM),
+                                                 shard_index=SHARD_INDEX, shard_count=SHARD_COUNT)
+        if saved:
+            api_routes.repo.take_changed_shops()
+        app.state.load_seconds = time.perf_counter() - started
+        app.state.persistence = PersistenceWorker(flush_state, PERSISTENCE_FLUSH_INTERVAL, PERSISTENCE_FLUSH_BATCH_SIZE, ack_after_flush=PERSISTENCE_ACK == "flush")
+        app.state.persistence.start()
     yield
-    save_state(STATE_FILE, api_routes.movies, api_routes.shops, api_routes._next_movie_id, api_routes._next_shop_id)
-    
+    if app.state.replication:
+        await app.state.replication.stop()
+        await app.state.primary.aclose()
+    if app.state.persistence:
+        await app.state.persistence.stop()
+        if api_routes.repo.journal:
+            compact_journal()
+            api_routes.repo.journal.close()
+        else:
+            save_snapshot()
+    api_routes.repo.close()
+    if state_lock:
+        state_lock.close()
+
+
 app = FastAPI(lifespan=lifespan)
 
+async def forward_to_primary(request: Request) -> Response:
+    try:
+        upstream = await forward(request.app.state.primary, request)
+    except httpx.HTTPError:
+        return JSONResponse(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, content={"detail": [PRIMARY_UNAVAILABLE_MESSAGE]})
+    # The primary answers once the write is in its journal: apply it here before answering,
+    # so the client reads its own write back from this replica
+    await request.app.state.replication.catch_up()
+    return relay(upstream)
+
+@app.middleware("http")
+async def forward_writes(request: Request, call_next):
+    # Read replicas only serve reads; writes go to the primary
+    if request.app.state.primary is not None and request.method in WRITE_METHODS:
+        return await forward_to_primary(request)
+    return await call_next(request)
+
+def storage_unavailable() -> JSONResponse:
+    return JSONResponse(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, content={"detail": [STORAGE_UNAVAILABLE_MESSAGE]})
+
 @app.middleware("http")
 async def add_process_time_header(request: Request, call_next):
-    response = await call_next(request)
-    if request.method == "POST" or request.method == "PUT" or request.method == "DELETE":
-        save_state(STATE_FILE, api_routes.movies, api_routes.shops, api_routes._next_movie_id, api_routes._next_shop_id)
+    started = metrics.request_started(request.method)
+    status_code = status.HTTP_500_INTERNAL_SERVER_ERROR
+    persistence = request.app.state.persistence
+    try:
+        if request.method in WRITE_METHODS and persistence and persistence.failure is not None:
+            # A flush failed: nothing new is accepted until the pending changes are on disk
+            response = storage_unavailable()
+        else:
+            response = await call_next(request)
+            if request.method in WRITE_METHODS and response.status_code < 400 and persistence:
+                try:
+                    await persistence.mark_dirty()
+                except Exception:
+                    # Applied in memory but not on disk: it is persisted once a retried flush succeeds
+                    response = storage_unavailable()
+        status_code = response.status_code
+    finally:
+        elapsed = metrics.request_finished(request.scope, request.method, status_code, started)
+    response.headers[PROCESS_TIME_HEADER] = f"{elapsed:.6f}"
     return response
 
-@app.exception_handler(RequestValidationError)
-async def validation_exception_handler(request: Request, exc: RequestValidationError):
-    msgs = [ f"Validation Error: {dict_err['type']} {dict_err['loc'][1]} attribute." for dict_err in exc.errors() ]
-    return JSONResponse(
-        status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
-        content= {"detail": msgs}
-    )
+def collect_state_metrics():
+    movies, shops = api_routes.repo.count_entities()
+    yield "movie_shop_movies", "gauge", "Movies stored", movies
+    yield "movie_shop_shops", "gauge", "Shops stored", shops
+    yield "movie_shop_load_state_seconds", "gauge", "Time taken at startup to load the stored state", app.state.load_seconds
+    snapshots = api_routes.snapshots
+    if snapshots is None:
+        return
+    stats = snapshots.stats()
+    yield "movie_shop_snapshot_in_progress", "gauge", "1 while a save of the in-memory store runs", int(stats["in_progress"])
+    yield "movie_shop_snapshot_saves_total", "counter", "Saves of the in-memory store completed", stats["saves"]
+    yield "movie_shop_snapshot_failures_total", "counter", "Saves of the in-memory store that failed", stats["failures"]
+    if stats["last_success_at"] is not None:
+        yield "movie_shop_snapshot_last_success_timestamp_seconds", "gauge", "Unix time the last successful save finished", stats["last_success_at"].timestamp()
+
+metrics.registry.add_collector(collect_state_metrics)
+
+@app.get("/metrics", include_in_schema=False)
+def read_metrics():
+    return Response(metrics.registry.render(), media_type=metrics.CONTENT_TYPE)
 
+app.add_exception_handler(RequestValidationError, validation_exception_handler)
 app.include_router(api_routes.router)
+app.include_router(admin_routes.router)
+if SHARD_COUNT > 1:
+    app.include_router(admin_routes.shard_router)
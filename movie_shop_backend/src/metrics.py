@@ -0,0 +1,183 @@
+import bisect, threading, time
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple
+
+# Service metrics in the Prometheus text format (version 0.0.4), served by GET /metrics.
+#
+# Recording takes no lock: every thread keeps its own copy of the values of each
+# metric and only ever writes to it (the request middleware always runs on the event
+# loop thread), and a scrape adds the copies up. A lock is only taken the first time
+# a thread records something.
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+# Label of the requests that matched no route (404s, writes a replica forwards), so
+# arbitrary paths never become label values
+UNMATCHED_ROUTE = "unmatched"
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SAVE_DURATION_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+# 1 KiB to 4 GiB
+SIZE_BUCKETS = tuple(1024 * 4 ** i for i in range(12))
+
+# (name, type, help, value) produced at scrape time, for values read from the store
+Sample = Tuple[str, str, str, float]
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._local = threading.local()
+        self._copies: List[Dict[tuple, list]] = []
+        self._lock = threading.Lock()
+
+    def _series(self) -> Dict[tuple, list]:
+        # Label values -> values, of the calling thread
+        series = getattr(self._local, "series", None)
+        if series is None:
+            series = self._local.series = {}
+            with self._lock:
+                self._copies.append(series)
+        return series
+
+    def _collect(self) -> Dict[tuple, list]:
+        # Values of every thread added up; copying a dict or a list holds the GIL throughout
+        with self._lock:
+            copies = list(self._copies)
+        totals: Dict[tuple, list] = {}
+        for series in copies:
+            for label_values, values in list(series.items()):
+                values = list(values)
+                total = totals.get(label_values)
+                if total is None:
+                    totals[label_values] = values
+                else:
+                    for i, value in enumerate(values):
+                        total[i] += value
+        return totals
+
+    def _labels(self, label_values: tuple, extra: str = "") -> str:
+        pairs = [f'{label}="{_escape(value)}"' for label, value in zip(self.labels, label_values)]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for label_values, values in sorted(self._collect().items()):
+            lines += self._render_series(label_values, values)
+        return lines
+
+    def _render_series(self, label_values: tuple, values: list) -> List[str]:
+        raise NotImplementedError
+
+
+class Gauge(_Metric):
+    """Value that goes up and down, e.g. requests in progress"""
+
+    kind = "gauge"
+
+    def inc(self, *label_values, amount: float = 1):
+        series = self._series()
+        values = series.get(label_values)
+        if values is None:
+            values = series[label_values] = [0]
+        values[0] += amount
+
+    def dec(self, *label_values):
+        self.inc(*label_values, amount=-1)
+
+    def _render_series(self, label_values: tuple, values: list) -> List[str]:
+        return [f"{self.name}{self._labels(label_values)} {_number(values[0])}"]
+
+
+class Histogram(_Metric):
+    """Distribution of observed values over fixed buckets, with their count and sum"""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str], buckets: Sequence[float]):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, *label_values):
+        series = self._series()
+        values = series.get(label_values)
+        if values is None:
+            # Per bucket counts (not cumulative), the +Inf bucket last, then the sum
+            values = series[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+        values[bisect.bisect_left(self.buckets, value)] += 1
+        values[-1] += value
+
+    def _render_series(self, label_values: tuple, values: list) -> List[str]:
+        lines, count = [], 0
+        for bound, bucket_count in zip(self.buckets + (float("inf"),), values):
+            count += bucket_count
+            le = 'le="+Inf"' if bound == float("inf") else f'le="{_number(bound)}"'
+            lines.append(f"{self.name}_bucket{self._labels(label_values, le)} {count}")
+        lines.append(f"{self.name}_sum{self._labels(label_values)} {_number(values[-1])}")
+        lines.append(f"{self.name}_count{self._labels(label_values)} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+        self._collectors: List[Callable[[], Iterable[Sample]]] = []
+
+    def gauge(self, name: str, help: str, labels: Sequence[str] = ()) -> Gauge:
+        metric = Gauge(name, help, labels)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, help: str, labels: Sequence[str], buckets: Sequence[float]) -> Histogram:
+        metric = Histogram(name, help, labels, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collect: Callable[[], Iterable[Sample]]):
+        """`collect` is called on every scrape and returns unlabelled samples"""
+        self._collectors.append(collect)
+
+    def render(self, extra: Iterable[Sample] = ()) -> str:
+        """The metrics, the samples of the collectors and then `extra`"""
+        lines = []
+        for metric in self._metrics:
+            lines += metric.render()
+        for samples in [collect() for collect in self._collectors] + [extra]:
+            for name, kind, help, value in samples:
+                lines += [f"# HELP {name} {help}", f"# TYPE {name} {kind}", f"{name} {_number(value)}"]
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+registry = Registry()
+request_duration = registry.histogram("movie_shop_http_request_duration_seconds", "Time to answer a request, by method, route template and status code",
+                                      ("method", "route", "status"), LATENCY_BUCKETS)
+requests_in_flight = registry.gauge("movie_shop_http_requests_in_flight", "Requests being answered, by method", ("method",))
+save_duration = registry.histogram("movie_shop_save_state_duration_seconds", "Time to save the in-memory store (snapshot or journal compaction), by snapshot format",
+                                   ("format",), SAVE_DURATION_BUCKETS)
+save_bytes = registry.histogram("movie_shop_save_state_bytes", "Bytes written by a save of the in-memory store, by snapshot format", ("format",), SIZE_BUCKETS)
+
+
+def request_started(method: str) -> float:
+    requests_in_flight.inc(method)
+    return time.perf_counter()
+
+
+def request_finished(scope: dict, method: str, status_code: int, started: float) -> float:
+    """Records a request started with `request_started` and returns its duration"""
+    elapsed = time.perf_counter() - started
+    requests_in_flight.dec(method)
+    route = scope.get("route")
+    request_duration.observe(elapsed, method, route.path if route is not None else UNMATCHED_ROUTE, str(status_code))
+    return elapsed
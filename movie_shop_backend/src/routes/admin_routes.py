@@ -0,0 +1,63 @@
+from fastapi import APIRouter, status
+from typing import Dict, List
+
+from src.constants import DUPLICATE_MOVIE_MESSAGE, RESERVED_MOVIE_ID_MESSAGE, SHOP_NOT_FOUND_MESSAGE
+from src.schemas.schemas import BulkItemError, EntityIds, Movie, SearchCacheStats, SnapshotStatus, TitleUpdate
+from src.routes import api_routes
+
+router = APIRouter(prefix="/admin")
+# Used only by the shard router (shard_routes.py); main.py mounts it on shards alone
+shard_router = APIRouter(prefix="/admin", include_in_schema=False)
+
+@router.get("/search-cache", response_model=SearchCacheStats)
+def read_search_cache_stats():
+  return api_routes.search_cache.stats()
+
+@router.get("/genres", response_model=Dict[str, int])
+def read_genre_cardinalities():
+  # Entries per genre in the search index, the figures behind the search plan
+  return api_routes.repo.genre_cardinalities()
+
+@router.get("/snapshot", response_model=SnapshotStatus)
+def read_snapshot_status():
+  # State of the save running now, if any, and of the last ones
+  if api_routes.snapshots is None:
+      return SnapshotStatus(mode="none", in_progress=False, saves=0, failures=0)
+  return api_routes.snapshots.stats()
+
+@shard_router.post("/locate", response_model=EntityIds)
+def locate_entities(ids: EntityIds):
+  # The given movie and shop ids that exist in this process
+  with api_routes.repo.pinned():
+      return EntityIds(movies=[movie_id for movie_id in ids.movies if api_routes.repo.get_movie(movie_id) is not None],
+                       shops=[shop_id for shop_id in ids.shops if api_routes.repo.has_shop(shop_id)])
+
+@shard_router.post("/movies/import", response_model=List[Movie], status_code=status.HTTP_201_CREATED)
+def import_movies(movies: List[Movie]):
+  # First phase of a move between shards: the movies are added here with their ids and
+  # rent state, then the router deletes them from their old shard
+  api_routes.check_bulk_size(movies)
+  repo = api_routes.repo
+  with repo.transaction():
+      seen = set()
+      errors = []
+      for index, movie in enumerate(movies):
+          if movie.id in seen or repo.get_movie(movie.id) is not None:
+              errors.append(BulkItemError(index=index, id=movie.id, detail=[DUPLICATE_MOVIE_MESSAGE]))
+          elif repo.issues_movie_id(movie.id):
+              # Not a movie of another shard: create_movie would hand this id out again
+              errors.append(BulkItemError(index=index, id=movie.id, detail=[RESERVED_MOVIE_ID_MESSAGE]))
+          elif not repo.has_shop(movie.shop):
+              errors.append(BulkItemError(index=index, id=movie.id, detail=[SHOP_NOT_FOUND_MESSAGE]))
+          seen.add(movie.id)
+      api_routes.raise_bulk_errors(errors)
+      imported = repo.import_movies(movies)
+  api_routes.movies_changed([movie.id for movie in imported], {movie.shop for movie in imported})
+  return imported
+
+@shard_router.put("/titles", response_model=List[Movie])
+def update_title(title_update: TitleUpdate):
+  # The copies of a film held by this process; the router sends it to every shard
+  updated = api_routes.repo.update_title(title_update.title, title_update.update)
+  api_routes.movies_changed([movie.id for movie in updated], {movie.shop for movie in updated})
+  return updated
@@ -1,156 +1,390 @@
-from fastapi import APIRouter, HTTPException, Query, status
-from typing import List, Dict, Optional
+from fastapi import APIRouter, Body, HTTPException, Query, Request, Response, status
+from typing import Iterable, List, Optional
 
-from src.constants import MOVIE_NOT_FOUND_MESSAGE, SHOP_NOT_FOUND_MESSAGE
-from src.schemas.schemas import Movie, MovieRequestCreate, MovieRequestUpdate, MovieShopRequestUpdate, Shop, ShopRequestCreate, ShopRequestUpdate, MovieRentRequestUpdate
+from src.constants import MAX_PAGE_LIMIT, MOVIE_NOT_FOUND_MESSAGE, SHOP_NOT_FOUND_MESSAGE, SHOP_INVALID_MESSAGE, STREAM_PAGE_SIZE, SEARCH_CACHE_SIZE, SEARCH_CACHE_TTL, BULK_MAX_ITEMS, BULK_TOO_LARGE_MESSAGE, DUPLICATE_MOVIE_MESSAGE
+from src.schemas.schemas import Movie, MovieRequestCreate, MovieRequestUpdate, MovieShopRequestUpdate, Shop, ShopRequestCreate, ShopRequestUpdate, MovieRentRequestUpdate, ShopMovieCount, MovieBulkUpdate, BulkItemError, ShopTransferRequest, ShopTransferResult
+from src.database_manager.journal import BATCH_RECORD, MOVIE_DELETED_RECORD, MOVIE_RECORD, MOVIES_MOVED_RECORD, SHOP_DELETED_RECORD, SHOP_RECORD
+from src.database_manager.repository import MovieShopRepository, InMemoryRepository
+from src.database_manager.background_save import SnapshotWriter
+from src.routes.json_cache import JsonFragmentCache, json_bytes_response
+from src.routes.pagination import decode_cursor, fetch_size, page_limit, paginate
+from src.routes.search_cache import SearchCache, SearchResult, search_key
+from src.routes.streaming import ndjson_response, wants_ndjson
+from src.routes.versions import MOVIES, SHOPS, EntityVersions, movie_key, not_modified, shop_key, shop_movies_key
 
-# In-memory "DB"
-movies: Dict[int, Movie] = {}
-shops: Dict[int, Shop] = {}
-_next_movie_id = 1
-_next_shop_id = 1
+# Storage backend, replaced by the lifespan hook with the configured one
+repo: MovieShopRepository = InMemoryRepository({}, {})
+# Serialized JSON of the entities returned by the GET routes; every route that
+# changes a movie or a shop invalidates its entry after the change
+json_cache = JsonFragmentCache()
+# Version counters behind the ETags of the GET routes
+versions = EntityVersions()
+# Results of the most frequent searches, valid while the movie collection version does not change
+search_cache = SearchCache(SEARCH_CACHE_SIZE, SEARCH_CACHE_TTL)
+# Runs the saves of the in-memory store; None in processes that save nothing (replicas, SQLite)
+snapshots: Optional[SnapshotWriter] = None
 
 router = APIRouter()
 
+
+def movies_changed(movie_ids: Iterable[int], shop_ids: Iterable[int]):
+  # After movies were created, changed or deleted; shop_ids are the shops whose movie list changed
+  movie_ids = list(movie_ids)
+  json_cache.invalidate_movies(movie_ids)
+  versions.bump(MOVIES, SHOPS, *[movie_key(movie_id) for movie_id in movie_ids],
+                *[key for shop_id in shop_ids for key in (shop_key(shop_id), shop_movies_key(shop_id))])
+
+def movie_changed(movie_id: int, *shop_ids: int):
+  movies_changed((movie_id,), shop_ids)
+
+def shop_changed(shop_id: int, deleted_movie_ids: List[int] = ()):
+  json_cache.invalidate_shop(shop_id)
+  json_cache.invalidate_movies(deleted_movie_ids)
+  if deleted_movie_ids:
+      versions.bump(SHOPS, MOVIES, shop_key(shop_id), shop_movies_key(shop_id), *[movie_key(movie_id) for movie_id in deleted_movie_ids])
+      versions.forget(*[movie_key(movie_id) for movie_id in deleted_movie_ids])
+  else:
+      versions.bump(SHOPS, shop_key(shop_id))
+
+def movies_deleted(movie_ids: Iterable[int], shop_ids: Iterable[int]):
+  # Like movies_changed, then drops the versions of the deleted movies
+  movie_ids = list(movie_ids)
+  movies_changed(movie_ids, shop_ids)
+  versions.forget(*[movie_key(movie_id) for movie_id in movie_ids])
+
+def shop_deleted(shop_id: int, deleted_movie_ids: List[int] = ()):
+  # Like shop_changed, then drops the versions of the deleted shop
+  shop_changed(shop_id, deleted_movie_ids)
+  versions.forget(shop_key(shop_id), shop_movies_key(shop_id))
+
+def replicate(records: List[dict]):
+  # Read replicas: applies journal records of the primary, then invalidates what they touched
+  movie_ids, deleted_movie_ids, shop_ids, changed_shops, deleted_shops = set(), set(), set(), set(), {}
+  def collect(record: dict):
+      op = record["op"]
+      if op == BATCH_RECORD:
+          for batched_record in record["records"]:
+              collect(batched_record)
+      elif op in (MOVIE_RECORD, MOVIES_MOVED_RECORD, MOVIE_DELETED_RECORD):
+          ids = record["ids"] if op == MOVIES_MOVED_RECORD else [record["v"]["id"] if op == MOVIE_RECORD else record["id"]]
+          for movie_id in ids:
+              # The last record of a movie decides whether it ends up deleted
+              if op == MOVIE_DELETED_RECORD:
+                  movie_ids.discard(movie_id)
+                  deleted_movie_ids.add(movie_id)
+              else:
+                  deleted_movie_ids.discard(movie_id)
+                  movie_ids.add(movie_id)
+              old_movie = repo.get_movie(movie_id)
+              if old_movie is not None:
+                  shop_ids.add(old_movie.shop)
+          if op != MOVIE_DELETED_RECORD:
+              shop_ids.add(record["shop"] if op == MOVIES_MOVED_RECORD else record["v"]["shop"])
+      elif op == SHOP_RECORD:
+          changed_shops.add(record["v"]["id"])
+      elif op == SHOP_DELETED_RECORD:
+          shop_movies = repo.list_shop_movies(record["id"]) or []
+          deleted_shops[record["id"]] = [movie.id for movie in shop_movies]
+  for record in records:
+      collect(record)
+  repo.apply_records(records)
+  if movie_ids:
+      movies_changed(movie_ids, shop_ids)
+  if deleted_movie_ids:
+      movies_deleted(deleted_movie_ids, shop_ids)
+  for shop_id in changed_shops:
+      shop_changed(shop_id)
+  for shop_id, shop_movie_ids in deleted_shops.items():
+      shop_deleted(shop_id, shop_movie_ids)
+
+def search_movies_cached(name: Optional[str], director: Optional[str], genres: Optional[List[str]], after: int, limit: Optional[int]) -> List[Movie]:
+  key = search_key(name, director, genres)
+  if key is None:
+      return repo.list_movies(after, limit)
+  # Version read before searching: a write during the search leaves the entry already stale
+  version = versions.version(MOVIES)
+  result = search_cache.get(key, version)
+  if result is None:
+      result = SearchResult(repo.search_movie_ids(name, director, genres))
+      search_cache.put(key, version, result)
+  # Only the movies of the page are built; any deleted since the search are left out
+  return repo.get_movies(result.page(after, limit))
+
+# Listings accept `limit` and the opaque `cursor` returned in the X-Next-Cursor
+# header of the previous page; the header is missing on the last page
+LIMIT_QUERY = Query(None, ge=1, le=MAX_PAGE_LIMIT)
+# With "Accept: application/x-ndjson" they are streamed instead, one record per line
+# from `cursor` on (all of them unless `limit` is given)
+# JSON reads carry an ETag and answer 304 to a matching If-None-Match
+
 # Movies
 @router.get("/movies", response_model=List[Movie])
-def read_all_movies():
-  return list(movies.values())
+def read_all_movies(request: Request, response: Response, limit: Optional[int] = LIMIT_QUERY, cursor: Optional[str] = None):
+  if wants_ndjson(request):
+      return ndjson_response(repo.iter_movies(decode_cursor(cursor), STREAM_PAGE_SIZE), json_cache.movie_encoder(json_cache.generation()), limit)
+  unchanged = not_modified(request, response, versions.etag(MOVIES))
+  if unchanged:
+      return unchanged
+  limit = page_limit(limit)
+  generation = json_cache.generation()
+  movies = repo.list_movies(decode_cursor(cursor), fetch_size(limit))
+  return json_bytes_response(json_cache.movies(paginate(response, movies, limit), generation), response)
+
+# Bulk: every item is checked before anything changes. A batch with errors changes
+# nothing and answers 422 with the errors of each item; a valid one is applied and
+# persisted as a single write. Declared before /movies/{movie_id} so "bulk" is not taken for an id.
+def check_bulk_size(items: list):
+  if len(items) > BULK_MAX_ITEMS:
+      raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=[BULK_TOO_LARGE_MESSAGE])
+
+def raise_bulk_errors(errors: List[BulkItemError]):
+  if errors:
+      raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=[error.model_dump() for error in errors])
+
+def check_bulk_movie_ids(movie_ids: List[int]):
+  # Shops of the movies, or the per-item errors for ids that are repeated or do not exist
+  errors, seen, shop_ids = [], set(), set()
+  for index, movie_id in enumerate(movie_ids):
+      movie = None if movie_id in seen else repo.get_movie(movie_id)
+      if movie_id in seen:
+          errors.append(BulkItemError(index=index, id=movie_id, detail=[DUPLICATE_MOVIE_MESSAGE]))
+      elif movie is None:
+          errors.append(BulkItemError(index=index, id=movie_id, detail=[MOVIE_NOT_FOUND_MESSAGE]))
+      else:
+          shop_ids.add(movie.shop)
+      seen.add(movie_id)
+  raise_bulk_errors(errors)
+  return shop_ids
+
+@router.post("/movies/bulk", response_model=List[Movie], status_code=status.HTTP_201_CREATED)
+def create_movies_bulk(movies: List[MovieRequestCreate]):
+  check_bulk_size(movies)
+  with repo.transaction():
+      existing_shops = {shop_id: repo.has_shop(shop_id) for shop_id in {movie.shop for movie in movies}}
+      raise_bulk_errors([BulkItemError(index=index, detail=[SHOP_NOT_FOUND_MESSAGE])
+                         for index, movie in enumerate(movies) if not existing_shops[movie.shop]])
+      created = repo.create_movies(movies)
+  movies_changed([movie.id for movie in created], existing_shops)
+  return created
+
+@router.put("/movies/bulk", response_model=List[Movie])
+def update_movies_bulk(movies: List[MovieBulkUpdate]):
+  check_bulk_size(movies)
+  with repo.transaction():
+      shop_ids = check_bulk_movie_ids([movie.id for movie in movies])
+      updated = repo.update_movies(movies)
+  movies_changed([movie.id for movie in movies], shop_ids)
+  return updated
+
+@router.delete("/movies/bulk", status_code=status.HTTP_204_NO_CONTENT)
+def delete_movies_bulk(movie_ids: List[int] = Body(...)):
+  check_bulk_size(movie_ids)
+  with repo.transaction():
+      shop_ids = check_bulk_movie_ids(movie_ids)
+      repo.delete_movies(movie_ids)
+  movies_deleted(movie_ids, shop_ids)
 
 @router.get("/movies/{movie_id}", response_model=Movie)
-def read_movie_by_id(movie_id : int):
-  if movie_id not in movies.keys():
+def read_movie_by_id(movie_id : int, request: Request, response: Response):
+  etag = versions.etag(movie_key(movie_id))
+  generation = json_cache.generation()
+  movie = repo.get_movie(movie_id)
+  if movie is None:
       raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=[MOVIE_NOT_FOUND_MESSAGE])
-  return movies[movie_id]
+  unchanged = not_modified(request, response, etag)
+  if unchanged:
+      return unchanged
+  return json_bytes_response(json_cache.movie(movie, generation), response)
 
 @router.post("/movies", response_model=Movie, status_code=status.HTTP_201_CREATED)
 def create_movie(movie : MovieRequestCreate):
-  global _next_movie_id
-
-  if movie.shop not in shops.keys():
-      raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=[SHOP_NOT_FOUND_MESSAGE])
-  
-  new_movie = Movie(id=_next_movie_id, **movie.model_dump())
-  movies[_next_movie_id] = new_movie
-  shops[movie.shop].movies.append(new_movie)
-  
-  _next_movie_id += 1
+  # The shop cannot be deleted between the check and the insert
+  with repo.transaction():
+      if not repo.has_shop(movie.shop):
+          raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=[SHOP_NOT_FOUND_MESSAGE])
+      new_movie = repo.create_movie(movie.name, movie.director, movie.genres, movie.shop)
+  movie_changed(new_movie.id, new_movie.shop)
   return new_movie
 
 @router.put("/movies/{movie_id}", response_model=Movie)
 def update_movie(movie_id : int, new_movie : MovieRequestUpdate):
-  if movie_id not in movies.keys():
+  movie = repo.update_movie(movie_id, new_movie.name, new_movie.director, new_movie.genres)
+  if movie is None:
       raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=[MOVIE_NOT_FOUND_MESSAGE])
-  movies[movie_id].name = new_movie.name
-  movies[movie_id].director = new_movie.director
-  movies[movie_id].genres = new_movie.genres
-  return movies[movie_id]
+  movie_changed(movie_id, movie.shop)
+  return movie
+
+@router.put("/movies/{movie_id}/title", response_model=List[Movie])
+def update_movie_title(movie_id: int, new_title: MovieRequestUpdate):
+  # Every copy of the film, in every shop, gets the new name, director and genres
+  updated = repo.update_movie_title(movie_id, new_title)
+  if updated is None:
+      raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=[MOVIE_NOT_FOUND_MESSAGE])
+  movies_changed([movie.id for movie in updated], {movie.shop for movie in updated})
+  return updated
 
 @router.patch("/movies/{movie_id}/rent", response_model=Movie)
 def update_rent_movie(movie_id: int, rent_update: MovieRentRequestUpdate):
-  if movie_id not in movies.keys():
+  movie = repo.set_movie_rent(movie_id, rent_update.rent)
+  if movie is None:
       raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=[MOVIE_NOT_FOUND_MESSAGE])
-  movies[movie_id].rent = rent_update.rent
-  return movies[movie_id]
+  movie_changed(movie_id, movie.shop)
+  return movie
 
 
 @router.delete("/movies/{movie_id}", status_code=status.HTTP_204_NO_CONTENT)
 def delete_movie(movie_id : int):
-  if movie_id not in movies.keys():
+  with repo.transaction():
+      movie = repo.get_movie(movie_id)
+      deleted = movie is not None and repo.delete_movie(movie_id)
+  if not deleted:
       raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=[MOVIE_NOT_FOUND_MESSAGE])
-  movie=movies[movie_id]
-  old_shop = movie.shop
-  shops[old_shop].movies.remove(movie)
-  _ = movies.pop(movie_id)
+  movies_deleted((movie_id,), (movie.shop,))
 
 
 # Shops
 @router.get("/shops", response_model=List[Shop])
-def read_all_shops():
-  return list(shops.values())
+def read_all_shops(request: Request, response: Response, limit: Optional[int] = LIMIT_QUERY, cursor: Optional[str] = None):
+  if wants_ndjson(request):
+      return ndjson_response(repo.iter_shops(decode_cursor(cursor), STREAM_PAGE_SIZE), json_cache.shop_encoder(json_cache.generation()), limit)
+  unchanged = not_modified(request, response, versions.etag(SHOPS))
+  if unchanged:
+      return unchanged
+  limit = page_limit(limit)
+  generation = json_cache.generation()
+  shops = repo.list_shops(decode_cursor(cursor), fetch_size(limit))
+  return json_bytes_response(json_cache.shops(paginate(response, shops, limit), generation), response)
 
 @router.get("/shops/{shop_id}", response_model=Shop)
-def read_shop_by_id(shop_id : int):
-  if shop_id not in shops.keys():
-      raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=[SHOP_NOT_FOUND_MESSAGE])
-  return shops[shop_id]
+def read_shop_by_id(shop_id : int, request: Request, response: Response):
+  etag = versions.etag(shop_key(shop_id))
+  generation = json_cache.generation()
+  # One version for the existence check and the read
+  with repo.pinned():
+      if not repo.has_shop(shop_id):
+          raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=[SHOP_NOT_FOUND_MESSAGE])
+      unchanged = not_modified(request, response, etag)
+      if unchanged:
+          return unchanged
+      shop = repo.get_shop(shop_id)
+      if shop is None:
+          raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=[SHOP_NOT_FOUND_MESSAGE])
+      return json_bytes_response(json_cache.shop(shop, generation), response)
 
 @router.post("/shops", response_model=Shop, status_code=status.HTTP_201_CREATED)
 def create_shop(shop : ShopRequestCreate):
-  global _next_shop_id
-  new_shop = Shop(id=_next_shop_id, **shop.model_dump())
-  shops[_next_shop_id] = new_shop
-  _next_shop_id += 1
+  new_shop = repo.create_shop(shop.address, shop.manager)
+  shop_changed(new_shop.id)
   return new_shop
 
 @router.put("/shops/{shop_id}", response_model=Shop)
 def update_shop(shop_id : int, new_shop : ShopRequestUpdate):
-  if shop_id not in shops.keys():
+  shop = repo.update_shop(shop_id, new_shop.address, new_shop.manager)
+  if shop is None:
       raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=[SHOP_NOT_FOUND_MESSAGE])
-  shops[shop_id].address = new_shop.address
-  shops[shop_id].manager = new_shop.manager
-  return shops[shop_id]
+  shop_changed(shop_id)
+  return shop
 
 @router.delete("/shops/{shop_id}", status_code=status.HTTP_204_NO_CONTENT)
 def delete_shop(shop_id: int):
-    if shop_id not in shops.keys():
+    with repo.transaction():
+        shop_movies = repo.list_shop_movies(shop_id)
+        deleted = shop_movies is not None and repo.delete_shop(shop_id)
+    if not deleted:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=[SHOP_NOT_FOUND_MESSAGE])
-    
-    movies_to_delete = [key for key, value in movies.items() if value.shop == shop_id]
-
-    for movie_id in movies_to_delete:
-        movies.pop(movie_id)
-
-    _ = shops.pop(shop_id)
+    shop_deleted(shop_id, [movie.id for movie in shop_movies])
 
 # Extra
 @router.get("/shops/{shop_id}/movies", response_model=List[Movie])
-def get_all_movies_by_shop(shop_id: int):
-  if shop_id not in shops.keys():
-      raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=[SHOP_NOT_FOUND_MESSAGE])
-  return shops[shop_id].movies
+def get_all_movies_by_shop(shop_id: int, request: Request, response: Response, limit: Optional[int] = LIMIT_QUERY, cursor: Optional[str] = None):
+  etag = versions.etag(shop_movies_key(shop_id))
+  generation = json_cache.generation()
+  # One version for the existence check and the read
+  with repo.pinned():
+      if not repo.has_shop(shop_id):
+          raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=[SHOP_NOT_FOUND_MESSAGE])
+      unchanged = not_modified(request, response, etag)
+      if unchanged:
+          return unchanged
+      limit = page_limit(limit)
+      shop_movies = repo.list_shop_movies(shop_id, after=decode_cursor(cursor), limit=fetch_size(limit))
+      if shop_movies is None:
+          raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=[SHOP_NOT_FOUND_MESSAGE])
+      return json_bytes_response(json_cache.movies(paginate(response, shop_movies, limit), generation), response)
 
 @router.get("/shops/{shop_id}/movies/available", response_model=List[Movie])
-def get_all_availables_movies_by_shop(shop_id: int):
-  if shop_id not in shops.keys():
+def get_all_availables_movies_by_shop(shop_id: int, request: Request, response: Response, limit: Optional[int] = LIMIT_QUERY, cursor: Optional[str] = None):
+  etag = versions.etag(shop_movies_key(shop_id))
+  generation = json_cache.generation()
+  # One version for the existence check and the read
+  with repo.pinned():
+      if not repo.has_shop(shop_id):
+          raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=[SHOP_NOT_FOUND_MESSAGE])
+      unchanged = not_modified(request, response, etag)
+      if unchanged:
+          return unchanged
+      limit = page_limit(limit)
+      available_movies = repo.list_shop_movies(shop_id, available_only=True, after=decode_cursor(cursor), limit=fetch_size(limit))
+      if available_movies is None:
+          raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=[SHOP_NOT_FOUND_MESSAGE])
+      return json_bytes_response(json_cache.movies(paginate(response, available_movies, limit), generation), response)
+
+@router.get("/shops/{shop_id}/movies/count", response_model=ShopMovieCount)
+def count_movies_by_shop(shop_id: int):
+  counts = repo.count_shop_movies(shop_id)
+  if counts is None:
       raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=[SHOP_NOT_FOUND_MESSAGE])
-  all_movies = shops[shop_id].movies
-  available_movies = [movie for movie in all_movies if not movie.rent]
-  return available_movies
+  total, available = counts
+  return ShopMovieCount(total=total, available=available, rented=total - available)
+
+@router.post("/shops/{shop_id}/transfer", response_model=ShopTransferResult)
+def transfer_shop_movies(shop_id: int, transfer: ShopTransferRequest):
+  # Moves all the movies of a shop, or those matching the filters, to `target` as one
+  # change and one persistence write; with delete_source the source shop is deleted after
+  if transfer.target == shop_id:
+      raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=[SHOP_INVALID_MESSAGE])
+  with repo.transaction():
+      source_movies = repo.list_shop_movies(shop_id) if transfer.delete_source else []
+      moved = repo.transfer_movies(shop_id, transfer.target, transfer.genres, transfer.available, transfer.delete_source)
+  if moved is None:
+      raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=[SHOP_NOT_FOUND_MESSAGE])
+  movies_changed(moved, (shop_id, transfer.target))
+  if transfer.delete_source:
+      moved_ids = set(moved)
+      shop_deleted(shop_id, [movie.id for movie in source_movies if movie.id not in moved_ids])
+  return ShopTransferResult(moved=moved, source_deleted=transfer.delete_source)
 
 @router.patch("/movies/{movie_id}/move", response_model=Movie)
 def change_movie_shop(movie_id : int, new_movie_shop : MovieShopRequestUpdate):
-  if movie_id not in movies.keys():
-      raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=[MOVIE_NOT_FOUND_MESSAGE])
-  
-  if new_movie_shop.shop not in shops.keys():
-      raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=[SHOP_NOT_FOUND_MESSAGE])
+  with repo.transaction():
+      movie = repo.get_movie(movie_id)
+      if movie is None:
+          raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=[MOVIE_NOT_FOUND_MESSAGE])
 
-  movie = movies[movie_id]
-  old_shop = movie.shop
-  new_shop = new_movie_shop.shop
+      if not repo.has_shop(new_movie_shop.shop):
+          raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=[SHOP_NOT_FOUND_MESSAGE])
 
-  shops[old_shop].movies.remove(movie)
-  shops[new_shop].movies.append(movie)
-  movie.shop = new_shop
+      old_shop_id = movie.shop
+      movie = repo.move_movie(movie_id, new_movie_shop.shop)
+  movie_changed(movie_id, old_shop_id, new_movie_shop.shop)
   return movie
 
 @router.get("/search/movies", response_model=List[Movie])
 def get_movies_by_values(
+    request: Request,
+    response: Response,
     name: Optional[str] = None,
     director: Optional[str] = None,
-    genres: Optional[List[str]] = Query(None)
+    genres: Optional[List[str]] = Query(None),
+    limit: Optional[int] = LIMIT_QUERY,
+    cursor: Optional[str] = None
 ):
-    results = list(movies.values())
-
-    if name:
-        results = [m for m in results if name.lower() in m.name.lower()]
-
-    if director:
-        results = [m for m in results if director.lower() in m.director.lower()]
-
-    if genres:
-        results = [m for m in results if all(g in m.genres for g in genres if g != "")]
-
-    return results
-  
\ No newline at end of file
+    if wants_ndjson(request):
+        return ndjson_response(repo.iter_search_movies(name, director, genres, decode_cursor(cursor), STREAM_PAGE_SIZE), json_cache.movie_encoder(json_cache.generation()), limit)
+    unchanged = not_modified(request, response, versions.etag(MOVIES))
+    if unchanged:
+        return unchanged
+    limit = page_limit(limit)
+    generation = json_cache.generation()
+    movies = search_movies_cached(name, director, genres, decode_cursor(cursor), fetch_size(limit))
+    return json_bytes_response(json_cache.movies(paginate(response, movies, limit), generation), response)
@@ -0,0 +1,23 @@
+from typing import Optional
+import httpx
+from fastapi import Request, Response
+
+# Not copied when a request or its response goes through another process:
+# hop-by-hop, or set again for the new message
+SKIPPED_HEADERS = {"host", "content-length", "content-encoding", "connection", "keep-alive", "transfer-encoding"}
+
+
+def forwarded_headers(headers) -> dict:
+    return {k: v for k, v in headers.items() if k.lower() not in SKIPPED_HEADERS}
+
+
+async def forward(client: httpx.AsyncClient, request: Request, path: Optional[str] = None, content: Optional[bytes] = None) -> httpx.Response:
+    # The same request (or the same one with another path or body) sent to the process behind `client`
+    if content is None:
+        content = await request.body()
+    return await client.request(request.method, path or request.url.path, params=request.url.query,
+                                content=content, headers=forwarded_headers(request.headers))
+
+
+def relay(upstream: httpx.Response) -> Response:
+    return Response(upstream.content, status_code=upstream.status_code, headers=forwarded_headers(upstream.headers))
@@ -0,0 +1,102 @@
+import json, threading
+from typing import Callable, Dict, Iterable
+from fastapi import Response
+
+from src.schemas.schemas import Movie, Shop
+
+try:
+    import orjson
+except ImportError:  # optional, install the "orjson" extra
+    orjson = None
+
+MOVIE_FIELDS = tuple(Movie.model_fields)
+SHOP_FIELDS = tuple(name for name in Shop.model_fields if name != "movies")
+
+
+def _dumps(value) -> bytes:
+    # Same bytes as FastAPI's JSONResponse: compact separators and UTF-8 text
+    if orjson is not None:
+        return orjson.dumps(value)
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+class JsonFragmentCache:
+    """
+    Serialized JSON of every movie and shop, kept until a mutation invalidates
+    it, so reads skip the response_model validation and encoding and list
+    responses are the cached fragments joined together. A shop is cached
+    without its movies, which are filled in from the movie fragments; that way
+    a change to a movie only invalidates the movie.
+
+    Routes take the generation before reading the entities from the repository
+    and pass it in; an entry is only stored while that is still the current
+    generation. Routes invalidate after mutating, so an entity read before an
+    invalidation may hold the old state and is encoded but not stored.
+    """
+
+    def __init__(self):
+        self._movies: Dict[int, bytes] = {}
+        self._shops: Dict[int, bytes] = {}
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def generation(self) -> int:
+        return self._generation
+
+    def _store(self, entries: Dict[int, bytes], entity_id: int, generation: int, data: bytes):
+        with self._lock:
+            if self._generation == generation:
+                entries[entity_id] = data
+
+    def movie(self, movie: Movie, generation: int) -> bytes:
+        data = self._movies.get(movie.id)
+        if data is None:
+            data = _dumps({name: getattr(movie, name) for name in MOVIE_FIELDS})
+            self._store(self._movies, movie.id, generation, data)
+        return data
+
+    def shop(self, shop: Shop, generation: int) -> bytes:
+        head = self._shops.get(shop.id)
+        if head is None:
+            # Without the closing brace, the movies are appended per response
+            head = _dumps({name: getattr(shop, name) for name in SHOP_FIELDS})[:-1]
+            self._store(self._shops, shop.id, generation, head)
+        return head + b',"movies":' + self.movies(shop.movies, generation) + b"}"
+
+    def movies(self, movies: Iterable[Movie], generation: int) -> bytes:
+        return b"[" + b",".join([self.movie(movie, generation) for movie in movies]) + b"]"
+
+    def shops(self, shops: Iterable[Shop], generation: int) -> bytes:
+        return b"[" + b",".join([self.shop(shop, generation) for shop in shops]) + b"]"
+
+    def movie_encoder(self, generation: int) -> Callable[[Movie], bytes]:
+        return lambda movie: self.movie(movie, generation)
+
+    def shop_encoder(self, generation: int) -> Callable[[Shop], bytes]:
+        return lambda shop: self.shop(shop, generation)
+
+    def invalidate_movies(self, movie_ids: Iterable[int]):
+        with self._lock:
+            self._generation += 1
+            for movie_id in movie_ids:
+                self._movies.pop(movie_id, None)
+
+    def invalidate_movie(self, movie_id: int):
+        self.invalidate_movies((movie_id,))
+
+    def invalidate_shop(self, shop_id: int):
+        with self._lock:
+            self._generation += 1
+            self._shops.pop(shop_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._movies.clear()
+            self._shops.clear()
+
+
+def json_bytes_response(content: bytes, response: Response = None, status_code: int = 200) -> Response:
+    # Keeps the headers set on the injected response, such as X-Next-Cursor
+    headers = dict(response.headers) if response is not None else None
+    return Response(content=content, status_code=status_code, media_type="application/json", headers=headers)
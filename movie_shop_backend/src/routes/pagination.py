@@ -0,0 +1,42 @@
+import base64, binascii
+from typing import List, Optional
+from fastapi import HTTPException, Response, status
+
+from src.constants import DEFAULT_PAGE_LIMIT, INVALID_CURSOR_MESSAGE, NEXT_CURSOR_HEADER
+
+# A cursor is the id of the last item of the previous page. Listings are id
+# ordered, so the next page is simply "ids greater than the cursor" (keyset
+# pagination): it does not shift when earlier items are created or deleted.
+
+
+def encode_cursor(last_id: int) -> str:
+    return base64.urlsafe_b64encode(f"id:{last_id}".encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: Optional[str]) -> int:
+    if cursor is None:
+        return 0
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        prefix, last_id = raw.split(":", 1)
+        if prefix != "id":
+            raise ValueError(raw)
+        return int(last_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=[INVALID_CURSOR_MESSAGE])
+
+
+def page_limit(limit: Optional[int]) -> Optional[int]:
+    return limit or DEFAULT_PAGE_LIMIT or None
+
+
+def fetch_size(limit: Optional[int]) -> Optional[int]:
+    # One extra item tells whether there is a next page
+    return limit + 1 if limit else None
+
+
+def paginate(response: Response, items: List, limit: Optional[int]) -> List:
+    if limit and len(items) > limit:
+        items = items[:limit]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(items[-1].id)
+    return items
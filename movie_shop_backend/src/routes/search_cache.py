@@ -0,0 +1,98 @@
+import threading, time
+from array import array
+from bisect import bisect_right
+from collections import OrderedDict
+from typing import Hashable, List, Optional, Tuple
+
+
+def search_key(name: Optional[str], director: Optional[str], genres: Optional[List[str]]) -> Optional[Tuple]:
+    """
+    Normalized form of a search, equal for every query that returns the same
+    movies: text lowercased like the matching does, genres as a sorted set. None
+    for a search without filters, which is just the movie listing.
+    """
+    wanted_genres = tuple(sorted({g for g in genres if g != ""})) if genres else ()
+    if not (name or director or wanted_genres):
+        return None
+    return (name.lower() if name else None, director.lower() if director else None, wanted_genres)
+
+
+class SearchResult:
+    """
+    Ids of every movie matching a search, in id order, paged without searching
+    again. Only the ids are kept, 8 bytes each; the routes build the movies of
+    the page they serve.
+    """
+
+    def __init__(self, movie_ids: List[int]):
+        self.movie_ids = array("q", movie_ids)
+
+    def page(self, after: int, limit: Optional[int]) -> List[int]:
+        start = bisect_right(self.movie_ids, after)
+        return self.movie_ids[start:None if limit is None else start + limit].tolist()
+
+
+class SearchCache:
+    """
+    LRU cache of search results with an optional TTL. Each entry remembers the
+    movie collection version it was computed at and is only served while that
+    is still the current version, so any movie write invalidates exactly the
+    results computed before it.
+    """
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[Hashable, Tuple[int, float, SearchResult]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.expirations = 0
+
+    def get(self, key: Hashable, version: int) -> Optional[SearchResult]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry_version, expires_at, result = entry
+                if entry_version != version:
+                    self.invalidations += 1
+                    del self._entries[key]
+                elif expires_at < time.monotonic():
+                    self.expirations += 1
+                    del self._entries[key]
+                else:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return result
+            self.misses += 1
+            return None
+
+    def put(self, key: Hashable, version: int, result: SearchResult):
+        if self.max_entries <= 0:
+            return
+        expires_at = time.monotonic() + self.ttl if self.ttl > 0 else float("inf")
+        with self._lock:
+            self._entries[key] = (version, expires_at, result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "expirations": self.expirations,
+            }
@@ -0,0 +1,456 @@
+import asyncio, heapq, itertools, json
+from contextlib import AsyncExitStack, asynccontextmanager
+from typing import Dict, Iterable, List, Optional
+
+import httpx
+from fastapi import APIRouter, Body, HTTPException, Query, Request, Response, status
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from src import metrics
+from src.constants import MAX_PAGE_LIMIT, MOVIE_NOT_FOUND_MESSAGE, SHOP_NOT_FOUND_MESSAGE, DUPLICATE_MOVIE_MESSAGE, NEXT_CURSOR_HEADER, NDJSON_MEDIA_TYPE
+from src.schemas.schemas import BulkItemError, EntityIds, MovieBulkUpdate, MovieRequestCreate, MovieRequestUpdate, MovieShopRequestUpdate, SearchCacheStats, ShopTransferRequest, ShopTransferResult, SnapshotStatus, TitleUpdate
+from src.routes.api_routes import LIMIT_QUERY, check_bulk_size, raise_bulk_errors
+from src.routes.forwarding import forward, relay
+from src.routes.pagination import decode_cursor, encode_cursor, page_limit
+from src.routes.streaming import CHUNK_SIZE, wants_ndjson
+
+# Router in front of the shard processes (see SHARD_URLS in constants.py). A shop and
+# its movies live on one shard, so everything about a shop goes to that shard; the
+# movie collection and the search are asked to every shard and merged by id, and a
+# move to a shop of another shard copies the movies over and then deletes them.
+
+
+class WriteGate:
+  """
+  Writes that stay on one shard run together; a move between shards runs
+  alone, so nothing changes the movies it copies until they are deleted from
+  the old shard.
+  """
+
+  def __init__(self):
+      self._writes = 0
+      self._handoff = False
+      self._changed = asyncio.Condition()
+
+  @asynccontextmanager
+  async def write(self):
+      async with self._changed:
+          await self._changed.wait_for(lambda: not self._handoff)
+          self._writes += 1
+      try:
+          yield
+      finally:
+          async with self._changed:
+              self._writes -= 1
+              self._changed.notify_all()
+
+  @asynccontextmanager
+  async def handoff(self):
+      async with self._changed:
+          await self._changed.wait_for(lambda: not self._handoff)
+          self._handoff = True
+          await self._changed.wait_for(lambda: self._writes == 0)
+      try:
+          yield
+      finally:
+          async with self._changed:
+              self._handoff = False
+              self._changed.notify_all()
+
+
+# One client per shard, in shard order, and the write gate; set by the lifespan hook of shard_router.py
+shards: List[httpx.AsyncClient] = []
+gate: Optional[WriteGate] = None
+# New shops go to the shards in turn
+shop_placement = itertools.count()
+
+router = APIRouter()
+
+
+def shard_of(entity_id: int) -> int:
+  # The shard that handed out the id; shops never leave it, movies can be moved to another one
+  return (entity_id - 1) % len(shards)
+
+def check_status(upstream: httpx.Response, expected: int):
+  if upstream.status_code != expected:
+      is_json = upstream.headers.get("content-type", "").startswith("application/json")
+      raise HTTPException(status_code=upstream.status_code, detail=upstream.json().get("detail") if is_json else upstream.text)
+
+async def locate(movie_ids: Iterable[int] = (), shop_ids: Iterable[int] = ()) -> Dict[str, Dict[int, int]]:
+  # Shard holding each of the given movies and shops that exist; a movie being moved is
+  # found on its old shard. Shops are only asked to the shard that owns them.
+  movie_ids, by_shard = list(movie_ids), {}
+  for shop_id in shop_ids:
+      by_shard.setdefault(shard_of(shop_id), []).append(shop_id)
+  responses = await asyncio.gather(*(client.post("/admin/locate", json={"movies": movie_ids, "shops": by_shard.get(n, [])})
+                                     for n, client in enumerate(shards)))
+  found = {"movies": {}, "shops": {}}
+  for n, upstream in enumerate(responses):
+      check_status(upstream, status.HTTP_200_OK)
+      ids = EntityIds(**upstream.json())
+      for movie_id in ids.movies:
+          if found["movies"].get(movie_id) != shard_of(movie_id):
+              found["movies"][movie_id] = n
+      for shop_id in ids.shops:
+          found["shops"][shop_id] = n
+  return found
+
+async def forward_to_movie(request: Request, movie_id: int) -> Response:
+  # Tried on the shard of the id first, where movies stay unless moved to a shop of another shard
+  home = shard_of(movie_id)
+  upstream = await forward(shards[home], request)
+  if upstream.status_code == status.HTTP_404_NOT_FOUND:
+      shard = (await locate([movie_id]))["movies"].get(movie_id)
+      if shard is not None and shard != home:
+          upstream = await forward(shards[shard], request)
+  return relay(upstream)
+
+async def fetch_all(client: httpx.AsyncClient, path: str) -> List[dict]:
+  items, params = [], {"limit": MAX_PAGE_LIMIT}
+  while True:
+      upstream = await client.get(path, params=params)
+      check_status(upstream, status.HTTP_200_OK)
+      items += upstream.json()
+      if NEXT_CURSOR_HEADER not in upstream.headers:
+          return items
+      params["cursor"] = upstream.headers[NEXT_CURSOR_HEADER]
+
+async def hand_off(movies: List[dict], source: int, target_shop: int) -> List[dict]:
+  # Two phases: the movies are added to the shard of the target shop with their ids,
+  # then deleted from the source shard; if that fails the copies are deleted again
+  target = shard_of(target_shop)
+  imported = await shards[target].post("/admin/movies/import", json=[{**movie, "shop": target_shop} for movie in movies])
+  check_status(imported, status.HTTP_201_CREATED)
+  movie_ids = [movie["id"] for movie in movies]
+  try:
+      deleted = await shards[source].request("DELETE", "/movies/bulk", json=movie_ids)
+      check_status(deleted, status.HTTP_204_NO_CONTENT)
+  except (httpx.HTTPError, HTTPException):
+      await shards[target].request("DELETE", "/movies/bulk", json=movie_ids)
+      raise
+  return imported.json()
+
+def movie_id_errors(movie_ids: List[int], found: Dict[int, int]) -> List[BulkItemError]:
+  # Same checks as check_bulk_movie_ids on a single process
+  errors, seen = [], set()
+  for index, movie_id in enumerate(movie_ids):
+      if movie_id in seen:
+          errors.append(BulkItemError(index=index, id=movie_id, detail=[DUPLICATE_MOVIE_MESSAGE]))
+      elif movie_id not in found:
+          errors.append(BulkItemError(index=index, id=movie_id, detail=[MOVIE_NOT_FOUND_MESSAGE]))
+      seen.add(movie_id)
+  return errors
+
+def partition(shard_by_index: List[int]) -> Dict[int, List[int]]:
+  # Item indexes per shard, in request order
+  indexes = {}
+  for index, shard in enumerate(shard_by_index):
+      indexes.setdefault(shard, []).append(index)
+  return indexes
+
+async def send_partitions(method: str, items: List, shard_by_index: List[int]) -> Dict[int, httpx.Response]:
+  indexes = partition(shard_by_index)
+  responses = await asyncio.gather(*(shards[n].request(method, "/movies/bulk", json=[items[i] for i in item_indexes])
+                                     for n, item_indexes in indexes.items()))
+  return dict(zip(indexes, responses))
+
+def partition_failure(responses: Dict[int, httpx.Response], shard_by_index: List[int], expected: int) -> Optional[Response]:
+  # A shard that rejected its part (something changed since the checks): its errors, with request indexes
+  indexes = partition(shard_by_index)
+  for n, upstream in responses.items():
+      if upstream.status_code != expected:
+          detail = upstream.json().get("detail")
+          if upstream.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY and isinstance(detail, list):
+              detail = [{**error, "index": indexes[n][error["index"]]} if isinstance(error, dict) else error for error in detail]
+          return JSONResponse(status_code=upstream.status_code, content={"detail": detail})
+  return None
+
+def in_request_order(responses: Dict[int, httpx.Response], shard_by_index: List[int]) -> List[dict]:
+  results = [None] * len(shard_by_index)
+  for n, item_indexes in partition(shard_by_index).items():
+      for index, item in zip(item_indexes, responses[n].json()):
+          results[index] = item
+  return results
+
+
+# Listings merged from every shard
+def split_etag(if_none_match: Optional[str]) -> Optional[List[str]]:
+  # The ETag of a merged listing joins the ETags of the shards
+  if if_none_match:
+      for tag in if_none_match.split(","):
+          parts = tag.strip().removeprefix("W/").strip('"').split("+")
+          if len(parts) == len(shards):
+              return [f'"{part}"' for part in parts]
+  return None
+
+def join_etags(responses: List[httpx.Response]) -> str:
+  return '"' + "+".join(upstream.headers.get("etag", "").strip('"') for upstream in responses) + '"'
+
+async def gather_listing(request: Request, limit: Optional[int], cursor: Optional[str]) -> Response:
+  decode_cursor(cursor)
+  if wants_ndjson(request):
+      return StreamingResponse(merge_streams(request, limit), media_type=NDJSON_MEDIA_TYPE)
+  limit = page_limit(limit)
+  params = [(key, value) for key, value in request.query_params.multi_items() if key != "limit"]
+  if limit:
+      params.append(("limit", str(limit)))
+  etags = split_etag(request.headers.get("if-none-match"))
+  responses = await asyncio.gather(*(client.get(request.url.path, params=params, headers={"if-none-match": etags[n]} if etags else None)
+                                     for n, client in enumerate(shards)))
+  if all(upstream.status_code == status.HTTP_304_NOT_MODIFIED for upstream in responses):
+      return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": join_etags(responses)})
+  responses = list(responses)
+  for n, upstream in enumerate(responses):
+      if upstream.status_code == status.HTTP_304_NOT_MODIFIED:
+          responses[n] = await shards[n].get(request.url.path, params=params)
+      if responses[n].status_code != status.HTTP_200_OK:
+          return relay(responses[n])
+  items, last_id = [], None
+  for item in heapq.merge(*(upstream.json() for upstream in responses), key=lambda item: item["id"]):
+      # A movie being moved between shards is in both for a moment
+      if item["id"] != last_id:
+          items.append(item)
+          last_id = item["id"]
+  headers = {"ETag": join_etags(responses)}
+  has_more = any(NEXT_CURSOR_HEADER in upstream.headers for upstream in responses)
+  if limit and items and (len(items) > limit or has_more):
+      items = items[:limit]
+      headers[NEXT_CURSOR_HEADER] = encode_cursor(items[-1]["id"])
+  return JSONResponse(items, headers=headers)
+
+async def _ndjson_records(upstream: httpx.Response):
+  async for line in upstream.aiter_lines():
+      if line:
+          yield json.loads(line)["id"], line
+
+async def _push_next(heap: list, n: int, records):
+  try:
+      entity_id, line = await records.__anext__()
+  except StopAsyncIteration:
+      return
+  heapq.heappush(heap, (entity_id, n, line))
+
+async def merge_streams(request: Request, limit: Optional[int]):
+  # k-way merge of the NDJSON streams of every shard, without holding any of them whole
+  async with AsyncExitStack() as stack:
+      streams = [_ndjson_records(await stack.enter_async_context(client.stream("GET", request.url.path, params=request.url.query, headers={"accept": NDJSON_MEDIA_TYPE})))
+                 for client in shards]
+      heap = []
+      for n, records in enumerate(streams):
+          await _push_next(heap, n, records)
+      chunk, count, last_id = bytearray(), 0, None
+      while heap and (limit is None or count < limit):
+          entity_id, n, line = heapq.heappop(heap)
+          if entity_id != last_id:
+              chunk += line.encode()
+              chunk += b"\n"
+              count += 1
+              last_id = entity_id
+              if len(chunk) >= CHUNK_SIZE:
+                  yield bytes(chunk)
+                  chunk.clear()
+          await _push_next(heap, n, streams[n])
+      if chunk:
+          yield bytes(chunk)
+
+
+# Movies
+@router.get("/movies")
+async def read_all_movies(request: Request, limit: Optional[int] = LIMIT_QUERY, cursor: Optional[str] = None):
+  return await gather_listing(request, limit, cursor)
+
+@router.post("/movies/bulk", status_code=status.HTTP_201_CREATED)
+async def create_movies_bulk(movies: List[MovieRequestCreate]):
+  check_bulk_size(movies)
+  async with gate.write():
+      existing_shops = (await locate(shop_ids={movie.shop for movie in movies}))["shops"]
+      raise_bulk_errors([BulkItemError(index=index, detail=[SHOP_NOT_FOUND_MESSAGE])
+                         for index, movie in enumerate(movies) if movie.shop not in existing_shops])
+      shard_by_index = [shard_of(movie.shop) for movie in movies]
+      responses = await send_partitions("POST", [movie.model_dump() for movie in movies], shard_by_index)
+      failure = partition_failure(responses, shard_by_index, status.HTTP_201_CREATED)
+      if failure:
+          # All or nothing: the parts created on the other shards are deleted again
+          await asyncio.gather(*(shards[n].request("DELETE", "/movies/bulk", json=[movie["id"] for movie in upstream.json()])
+                                 for n, upstream in responses.items() if upstream.status_code == status.HTTP_201_CREATED))
+          return failure
+  return JSONResponse(in_request_order(responses, shard_by_index), status_code=status.HTTP_201_CREATED)
+
+@router.put("/movies/bulk")
+async def update_movies_bulk(movies: List[MovieBulkUpdate]):
+  check_bulk_size(movies)
+  async with gate.write():
+      found = (await locate([movie.id for movie in movies]))["movies"]
+      raise_bulk_errors(movie_id_errors([movie.id for movie in movies], found))
+      shard_by_index = [found[movie.id] for movie in movies]
+      responses = await send_partitions("PUT", [movie.model_dump() for movie in movies], shard_by_index)
+  return partition_failure(responses, shard_by_index, status.HTTP_200_OK) or JSONResponse(in_request_order(responses, shard_by_index))
+
+@router.delete("/movies/bulk", status_code=status.HTTP_204_NO_CONTENT)
+async def delete_movies_bulk(movie_ids: List[int] = Body(...)):
+  check_bulk_size(movie_ids)
+  async with gate.write():
+      found = (await locate(movie_ids))["movies"]
+      raise_bulk_errors(movie_id_errors(movie_ids, found))
+      shard_by_index = [found[movie_id] for movie_id in movie_ids]
+      responses = await send_partitions("DELETE", movie_ids, shard_by_index)
+  return partition_failure(responses, shard_by_index, status.HTTP_204_NO_CONTENT) or Response(status_code=status.HTTP_204_NO_CONTENT)
+
+@router.get("/movies/{movie_id}")
+async def read_movie_by_id(movie_id: int, request: Request):
+  return await forward_to_movie(request, movie_id)
+
+@router.post("/movies", status_code=status.HTTP_201_CREATED)
+async def create_movie(movie: MovieRequestCreate, request: Request):
+  async with gate.write():
+      return relay(await forward(shards[shard_of(movie.shop)], request))
+
+@router.api_route("/movies/{movie_id}", methods=["PUT", "DELETE"])
+@router.patch("/movies/{movie_id}/rent")
+async def change_movie(movie_id: int, request: Request):
+  async with gate.write():
+      return await forward_to_movie(request, movie_id)
+
+@router.put("/movies/{movie_id}/title")
+async def update_movie_title(movie_id: int, new_title: MovieRequestUpdate):
+  # Copies of the film can be on every shard: each one updates the copies it holds.
+  # Runs alone, like a move, so no shard sees a new copy of the old title meanwhile.
+  async with gate.handoff():
+      shard = (await locate([movie_id]))["movies"].get(movie_id)
+      if shard is None:
+          raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=[MOVIE_NOT_FOUND_MESSAGE])
+      movie = await shards[shard].get(f"/movies/{movie_id}")
+      check_status(movie, status.HTTP_200_OK)
+      title_update = TitleUpdate(title=MovieRequestUpdate(**movie.json()), update=new_title)
+      responses = await asyncio.gather(*(client.put("/admin/titles", json=title_update.model_dump()) for client in shards))
+      for upstream in responses:
+          check_status(upstream, status.HTTP_200_OK)
+  return JSONResponse(list(heapq.merge(*(upstream.json() for upstream in responses), key=lambda item: item["id"])))
+
+@router.patch("/movies/{movie_id}/move")
+async def change_movie_shop(movie_id: int, new_movie_shop: MovieShopRequestUpdate, request: Request):
+  target = shard_of(new_movie_shop.shop)
+  async with gate.write():
+      source = (await locate([movie_id]))["movies"].get(movie_id)
+      if source is None:
+          raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=[MOVIE_NOT_FOUND_MESSAGE])
+      if source == target:
+          return relay(await forward(shards[source], request))
+  async with gate.handoff():
+      found = await locate([movie_id], [new_movie_shop.shop])
+      source = found["movies"].get(movie_id)
+      if source is None:
+          raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=[MOVIE_NOT_FOUND_MESSAGE])
+      if new_movie_shop.shop not in found["shops"]:
+          raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=[SHOP_NOT_FOUND_MESSAGE])
+      if source == target:
+          return relay(await forward(shards[source], request))
+      movie = await shards[source].get(f"/movies/{movie_id}")
+      check_status(movie, status.HTTP_200_OK)
+      return JSONResponse((await hand_off([movie.json()], source, new_movie_shop.shop))[0])
+
+
+# Shops
+@router.get("/shops")
+async def read_all_shops(request: Request, limit: Optional[int] = LIMIT_QUERY, cursor: Optional[str] = None):
+  return await gather_listing(request, limit, cursor)
+
+@router.post("/shops", status_code=status.HTTP_201_CREATED)
+async def create_shop(request: Request):
+  async with gate.write():
+      return relay(await forward(shards[next(shop_placement) % len(shards)], request))
+
+@router.get("/shops/{shop_id}")
+@router.get("/shops/{shop_id}/movies")
+@router.get("/shops/{shop_id}/movies/available")
+@router.get("/shops/{shop_id}/movies/count")
+async def read_shop(shop_id: int, request: Request):
+  return relay(await forward(shards[shard_of(shop_id)], request))
+
+@router.api_route("/shops/{shop_id}", methods=["PUT", "DELETE"])
+async def change_shop(shop_id: int, request: Request):
+  # The movies of a shop are on its shard, so deleting it stays there too
+  async with gate.write():
+      return relay(await forward(shards[shard_of(shop_id)], request))
+
+@router.post("/shops/{shop_id}/transfer", response_model=ShopTransferResult)
+async def transfer_shop_movies(shop_id: int, transfer: ShopTransferRequest, request: Request):
+  source = shard_of(shop_id)
+  if shard_of(transfer.target) == source:
+      async with gate.write():
+          return relay(await forward(shards[source], request))
+  async with gate.handoff():
+      if len((await locate(shop_ids=[shop_id, transfer.target]))["shops"]) < 2:
+          raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=[SHOP_NOT_FOUND_MESSAGE])
+      # Same selection as transfer_movies of the repositories
+      wanted_genres = {g for g in transfer.genres if g != ""} if transfer.genres else None
+      moving = [movie for movie in await fetch_all(shards[source], f"/shops/{shop_id}/movies")
+                if (transfer.available is None or movie["rent"] != transfer.available)
+                and (not wanted_genres or wanted_genres.issubset(movie["genres"]))]
+      if moving:
+          await hand_off(moving, source, transfer.target)
+      if transfer.delete_source:
+          check_status(await shards[source].delete(f"/shops/{shop_id}"), status.HTTP_204_NO_CONTENT)
+  return ShopTransferResult(moved=[movie["id"] for movie in moving], source_deleted=transfer.delete_source)
+
+
+@router.get("/search/movies")
+async def get_movies_by_values(
+    request: Request,
+    name: Optional[str] = None,
+    director: Optional[str] = None,
+    genres: Optional[List[str]] = Query(None),
+    limit: Optional[int] = LIMIT_QUERY,
+    cursor: Optional[str] = None
+):
+    return await gather_listing(request, limit, cursor)
+
+
+# Admin
+@router.get("/admin/search-cache", response_model=SearchCacheStats)
+async def read_search_cache_stats():
+  # Every shard has its own cache: the counters are added up
+  responses = await asyncio.gather(*(client.get("/admin/search-cache") for client in shards))
+  stats = [SearchCacheStats(**upstream.json()) for upstream in responses]
+  totals = {field: sum(getattr(s, field) for s in stats) for field in SearchCacheStats.model_fields if field != "ttl"}
+  return SearchCacheStats(ttl=stats[0].ttl, **totals)
+
+@router.get("/admin/genres", response_model=Dict[str, int])
+async def read_genre_cardinalities():
+  # Each shard indexes its own films: the counts are added up
+  responses = await asyncio.gather(*(client.get("/admin/genres") for client in shards))
+  totals: Dict[str, int] = {}
+  for upstream in responses:
+      for genre, count in upstream.json().items():
+          totals[genre] = totals.get(genre, 0) + count
+  return totals
+
+@router.get("/admin/snapshot", response_model=SnapshotStatus)
+async def read_snapshot_status():
+  # One status for all the shards: the state is only saved up to the oldest last save
+  responses = await asyncio.gather(*(client.get("/admin/snapshot") for client in shards))
+  statuses = [SnapshotStatus(**upstream.json()) for upstream in responses]
+  started = [s.started_at for s in statuses if s.started_at is not None]
+  durations = [s.last_duration for s in statuses if s.last_duration is not None]
+  successes = [s.last_success_at for s in statuses]
+  errors = [s.last_error for s in statuses if s.last_error]
+  return SnapshotStatus(mode=statuses[0].mode, in_progress=any(s.in_progress for s in statuses),
+                        started_at=max(started, default=None), last_duration=max(durations, default=None),
+                        last_success_at=None if None in successes else min(successes),
+                        last_error=errors[0] if errors else None,
+                        saves=sum(s.saves for s in statuses), failures=sum(s.failures for s in statuses))
+
+@router.get("/metrics", include_in_schema=False)
+async def read_metrics():
+  # The router's own requests, and the entities of every shard added up; the latency
+  # and the saves of a shard are at the /metrics of that shard
+  responses = await asyncio.gather(*(client.get("/metrics") for client in shards))
+  totals = {"movie_shop_movies": 0, "movie_shop_shops": 0}
+  for upstream in responses:
+      for line in upstream.text.splitlines():
+          name, _, value = line.partition(" ")
+          if name in totals:
+              totals[name] += int(value)
+  entities = [("movie_shop_movies", "gauge", "Movies stored, in all the shards", totals["movie_shop_movies"]),
+              ("movie_shop_shops", "gauge", "Shops stored, in all the shards", totals["movie_shop_shops"])]
+  return Response(metrics.registry.render(entities), media_type=metrics.CONTENT_TYPE)
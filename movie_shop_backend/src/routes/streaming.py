@@ -0,0 +1,33 @@
+from itertools import islice
+from typing import Callable, Iterable, Iterator, Optional
+from fastapi import Request
+from fastapi.responses import StreamingResponse
+
+from src.constants import NDJSON_MEDIA_TYPE
+
+
+def wants_ndjson(request: Request) -> bool:
+    return NDJSON_MEDIA_TYPE in request.headers.get("accept", "")
+
+
+# Starlette hands every chunk of a sync iterator over from the threadpool, so
+# lines are sent in chunks of about this size rather than one by one
+CHUNK_SIZE = 64 * 1024
+
+
+def _ndjson_lines(records: Iterable, encode: Callable[..., bytes]) -> Iterator[bytes]:
+    chunk = bytearray()
+    for record in records:
+        chunk += encode(record)
+        chunk += b"\n"
+        if len(chunk) >= CHUNK_SIZE:
+            yield bytes(chunk)
+            chunk.clear()
+    if chunk:
+        yield bytes(chunk)
+
+
+def ndjson_response(records: Iterable, encode: Callable[..., bytes], limit: Optional[int] = None) -> StreamingResponse:
+    # The records come from a lazy repository iterator; Starlette pulls it from the
+    # threadpool, so the first line goes out before the rest has been read
+    return StreamingResponse(_ndjson_lines(islice(records, limit), encode), media_type=NDJSON_MEDIA_TYPE)
@@ -0,0 +1,76 @@
+import secrets, threading
+from typing import Dict, Hashable, Optional
+from fastapi import Request, Response, status
+
+# Version keys
+MOVIES = ("movies",)
+SHOPS = ("shops",)
+
+
+def movie_key(movie_id: int):
+    return ("movie", movie_id)
+
+
+def shop_key(shop_id: int):
+    return ("shop", shop_id)
+
+
+def shop_movies_key(shop_id: int):
+    return ("shop_movies", shop_id)
+
+
+class EntityVersions:
+    """
+    Version of every movie, shop and collection, taken from one process-wide
+    counter each time the routes change it. Something never changed since
+    startup is at version 0. The ETag also carries a random epoch per process,
+    so versions counted again after a restart never match old ETags.
+
+    Deleting an entity forgets its versions, so only existing entities are
+    kept. Creating one bumps its key again, to a clock value no earlier ETag
+    carries, so an id used again never matches the ETags of the deleted one.
+    """
+
+    def __init__(self):
+        self.epoch = secrets.token_hex(4)
+        self._clock = 0
+        self._versions: Dict[Hashable, int] = {}
+        self._lock = threading.Lock()
+
+    def bump(self, *keys: Hashable):
+        with self._lock:
+            self._clock += 1
+            for key in keys:
+                self._versions[key] = self._clock
+
+    def forget(self, *keys: Hashable):
+        with self._lock:
+            for key in keys:
+                self._versions.pop(key, None)
+
+    def version(self, key: Hashable) -> int:
+        return self._versions.get(key, 0)
+
+    def etag(self, key: Hashable) -> str:
+        return f'"{self.epoch}-{self.version(key)}"'
+
+    def reset(self):
+        with self._lock:
+            self.epoch = secrets.token_hex(4)
+            self._versions.clear()
+
+
+def not_modified(request: Request, response: Response, etag: str) -> Optional[Response]:
+    """
+    Sets the ETag of the response and returns a 304 when the client already has
+    it. Take the ETag before reading the entity: a write in between then only
+    makes the ETag older than the body, and the next request gets a fresh 200.
+    """
+    response.headers["ETag"] = etag
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is None:
+        return None
+    candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    if etag in candidates or "*" in candidates:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+    return None
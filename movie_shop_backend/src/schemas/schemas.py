@@ -1,3 +1,4 @@
+from datetime import datetime
 from typing import List, Optional
 from pydantic import BaseModel
 
@@ -21,9 +22,22 @@ class MovieRequestUpdate(BaseModel):
     director: str
     genres: List[str]
 
+class TitleUpdate(BaseModel):
+    # The copies to change are the movies with exactly the name, director and genres of `title`
+    title: MovieRequestUpdate
+    update: MovieRequestUpdate
+
 class MovieRentRequestUpdate(BaseModel):
     rent: bool
 
+class MovieBulkUpdate(MovieRequestUpdate):
+    id: int
+
+class BulkItemError(BaseModel):
+    index: int
+    id: Optional[int] = None
+    detail: List[str]
+
 ##SHOPS!!
 class Shop(BaseModel):
     id: int
@@ -40,4 +54,45 @@ class ShopRequestUpdate(BaseModel):
     manager: str
 
 class MovieShopRequestUpdate(BaseModel):
-    shop: int
\ No newline at end of file
+    shop: int
+
+class ShopTransferRequest(BaseModel):
+    target: int
+    genres: Optional[List[str]] = None
+    available: Optional[bool] = None
+    delete_source: bool = False
+
+class ShopTransferResult(BaseModel):
+    moved: List[int]
+    source_deleted: bool
+
+class ShopMovieCount(BaseModel):
+    total: int
+    available: int
+    rented: int
+
+##ADMIN
+class SearchCacheStats(BaseModel):
+    entries: int
+    max_entries: int
+    ttl: float
+    hits: int
+    misses: int
+    evictions: int
+    invalidations: int
+    expirations: int
+
+class SnapshotStatus(BaseModel):
+    mode: str
+    in_progress: bool
+    pid: Optional[int] = None
+    started_at: Optional[datetime] = None
+    last_duration: Optional[float] = None
+    last_success_at: Optional[datetime] = None
+    last_error: Optional[str] = None
+    saves: int
+    failures: int
+
+class EntityIds(BaseModel):
+    movies: List[int] = []
+    shops: List[int] = []
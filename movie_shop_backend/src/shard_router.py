@@ -0,0 +1,43 @@
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import JSONResponse
+from fastapi import FastAPI, Request, status
+from fastapi.concurrency import asynccontextmanager
+import httpx
+
+from src import metrics
+from src.constants import SHARD_URLS, SHARD_UNAVAILABLE_MESSAGE, PROCESS_TIME_HEADER
+from src.routes import shard_routes
+from src.routes.errors import validation_exception_handler
+
+# Entry point of the router in front of the shards: uvicorn src.shard_router:app
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if not SHARD_URLS:
+        raise RuntimeError("SHARD_URLS must list the shard processes, in shard order")
+    shard_routes.shards = [httpx.AsyncClient(base_url=url, timeout=None) for url in SHARD_URLS]
+    shard_routes.gate = shard_routes.WriteGate()
+    yield
+    for client in shard_routes.shards:
+        await client.aclose()
+
+app = FastAPI(lifespan=lifespan)
+
+async def shard_unavailable_handler(request: Request, exc: httpx.HTTPError):
+    return JSONResponse(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, content={"detail": [SHARD_UNAVAILABLE_MESSAGE]})
+
+@app.middleware("http")
+async def add_process_time_header(request: Request, call_next):
+    started = metrics.request_started(request.method)
+    status_code = status.HTTP_500_INTERNAL_SERVER_ERROR
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+    finally:
+        elapsed = metrics.request_finished(request.scope, request.method, status_code, started)
+    response.headers[PROCESS_TIME_HEADER] = f"{elapsed:.6f}"
+    return response
+
+app.add_exception_handler(RequestValidationError, validation_exception_handler)
+app.add_exception_handler(httpx.HTTPError, shard_unavailable_handler)
+app.include_router(shard_routes.router)
@@ -1,7 +1,7 @@
 import os
 from http import HTTPMethod
 from time import time
-from typing import Any, Dict, Optional, Type, TypeVar, List, get_args
+from typing import Any, Dict, Iterator, Optional, Type, TypeVar, List, get_args
 import requests
 from dotenv import load_dotenv
 from pydantic import BaseModel
@@ -11,6 +11,8 @@ from src.models.responses.base.response import Response
 
 T = TypeVar("T")
 
+NEXT_CURSOR_HEADER = "x-next-cursor"
+
 
 def _issubclass_safe(obj: Any, cls: type) -> bool:
     """issubclass sin romperse si obj no es un tipo."""
@@ -97,6 +99,24 @@ class ServiceBase(Session):
     def connect(self, url: str, response_model: Type[T] = None, **kwargs: Any) -> Response[T]:
         return self._request(HTTPMethod.CONNECT, url, response_model=response_model, **kwargs)
 
+    def iter_pages(self, url: str, page_size: int = 100, config: Optional[Dict[str, Any]] = None) -> Iterator[Any]:
+        """
+        Recorre un listado paginado: pide `limit` elementos y sigue el cursor de
+        la cabecera X-Next-Cursor hasta que la respuesta deja de traerla.
+        """
+        config = config or self.default_config
+        params: Dict[str, Any] = {"limit": page_size}
+        while True:
+            response = self.get(url, config={**config, "params": params})
+            if response.status != 200:
+                raise RuntimeError(f"GET {url} returned {response.status}: {response.data}")
+            yield from response.data
+            headers = {key.lower(): value for key, value in response.headers.items()}
+            cursor = headers.get(NEXT_CURSOR_HEADER)
+            if not cursor:
+                return
+            params = {"limit": page_size, "cursor": cursor}
+
  
     def _request(
         self,
@@ -1,25 +1,59 @@
-from typing import Type
+import json
+from http import HTTPMethod
+from typing import Iterator, Type
 from src.base.service_base import ServiceBase
 from src.models.responses.base.response import T, Response
 
 
 class MovieService(ServiceBase):
-    def __init__(self):
+    def __init__(self, base_url: str = ""):
         # Base path → /movies
-        super().__init__("movies")
+        super().__init__("movies", base_url)
 
     def get_movies(
         self,
         response_type: Type[T],
+        params: dict | None = None,
         config: dict | None = None
     ) -> Response[T]:
-        config = config or self.default_config
+        """
+        GET /movies
+        Admite paginación vía params (ej. {"limit": 50, "cursor": "..."}).
+        """
+        cfg = config or self.default_config
+        if params:
+            cfg = {**cfg, "params": params}
         return self.get(
             self.url,
-            config=config,
+            config=cfg,
             response_model=response_type,
         )
 
+    def iter_movies(
+        self,
+        page_size: int = 100,
+        config: dict | None = None
+    ) -> Iterator[dict]:
+        """Recorre /movies página a página siguiendo la cabecera X-Next-Cursor."""
+        yield from self.iter_pages(self.url, page_size, config)
+
+    def stream_movies(
+        self,
+        params: dict | None = None,
+        config: dict | None = None
+    ) -> Iterator[dict]:
+        """
+        GET /movies con "Accept: application/x-ndjson": una película por línea,
+        leída a medida que llega.
+        """
+        cfg = config or self.default_config
+        headers = {**cfg.get("headers", {}), "Accept": "application/x-ndjson"}
+        with super(ServiceBase, self).get(self.url, params=params, headers=headers, stream=True) as response:
+            response.raise_for_status()
+            for line in response.iter_lines():
+                if line:
+                    yield json.loads(line)
+
     def get_movie(
         self,
         movie_id: int | str,
@@ -62,6 +96,25 @@ class MovieService(ServiceBase):
             response_model=response_type,
         )
 
+    def update_title(
+        self,
+        movie_id: int | str,
+        title: dict,
+        response_type: Type[T],
+        config: dict | None = None
+    ) -> Response[T]:
+        """
+        PUT /movies/{movie_id}/title
+        Cambia nombre, director y géneros de todas las copias de la película, en todas las tiendas.
+        """
+        config = config or self.default_config
+        return self.put(
+            f"{self.url}/{movie_id}/title",
+            title,
+            config=config,
+            response_model=response_type,
+        )
+
     def delete_movie(
         self,
         movie_id: int | str,
@@ -75,6 +128,49 @@ class MovieService(ServiceBase):
             response_model=response_type,
         )
 
+    def create_movies_bulk(
+        self,
+        movies: list[dict],
+        response_type: Type[T],
+        config: dict | None = None
+    ) -> Response[T]:
+        config = config or self.default_config
+        return self.post(
+            f"{self.url}/bulk",
+            movies,
+            config=config,
+            response_model=response_type,
+        )
+
+    def update_movies_bulk(
+        self,
+        movies: list[dict],
+        response_type: Type[T],
+        config: dict | None = None
+    ) -> Response[T]:
+        config = config or self.default_config
+        return self.put(
+            f"{self.url}/bulk",
+            movies,
+            config=config,
+            response_model=response_type,
+        )
+
+    def delete_movies_bulk(
+        self,
+        movie_ids: list[int],
+        response_type: Type[T],
+        config: dict | None = None
+    ) -> Response[T]:
+        config = config or self.default_config
+        return self._request(
+            HTTPMethod.DELETE,
+            f"{self.url}/bulk",
+            movie_ids,
+            config=config,
+            response_model=response_type,
+        )
+
     def search(
         self, 
         name: str, 
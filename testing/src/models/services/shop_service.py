@@ -1,24 +1,44 @@
-from typing import Type
+from typing import Iterator, Type
 from src.base.service_base import ServiceBase
 from src.models.responses.base.response import T, Response
 
 
 class ShopService(ServiceBase):
-    def __init__(self):
-        super().__init__("shops")
+    def __init__(self, base_url: str = ""):
+        super().__init__("shops", base_url)
 
     def get_shops(
         self,
         response_type: Type[T],
+        params: dict | None = None,
         config: dict | None = None
     ) -> Response[T]:
-        config = config or self.default_config
+        cfg = config or self.default_config
+        if params:
+            cfg = {**cfg, "params": params}
         return self.get(
             self.url,
-            config=config,
+            config=cfg,
             response_model=response_type,
         )
 
+    def iter_shops(
+        self,
+        page_size: int = 100,
+        config: dict | None = None
+    ) -> Iterator[dict]:
+        """Recorre /shops página a página siguiendo la cabecera X-Next-Cursor."""
+        yield from self.iter_pages(self.url, page_size, config)
+
+    def iter_shop_movies(
+        self,
+        shop_id: int | str,
+        page_size: int = 100,
+        config: dict | None = None
+    ) -> Iterator[dict]:
+        """Recorre /shops/{id}/movies página a página."""
+        yield from self.iter_pages(f"{self.url}/{shop_id}/movies", page_size, config)
+
     def add_shop(
         self,
         shop: dict,
@@ -33,6 +53,20 @@ class ShopService(ServiceBase):
             response_model=response_type,
         )
 
+    def delete_shop(
+        self,
+        shop_id: int | str,
+        response_type: Type[T],
+        config: dict | None = None
+    ) -> Response[T]:
+        """DELETE /shops/{id}: borra la tienda junto con sus películas."""
+        config = config or self.default_config
+        return self.delete(
+            f"{self.url}/{shop_id}",
+            config=config,
+            response_model=response_type,
+        )
+
     def get_shop_movies(
         self,
         shop_id: int | str,
@@ -52,3 +86,39 @@ class ShopService(ServiceBase):
             config=cfg,
             response_model=response_type,
         )
+
+    def count_shop_movies(
+        self,
+        shop_id: int | str,
+        response_type: Type[T],
+        config: dict | None = None
+    ) -> Response[T]:
+        """
+        GET /shops/{id}/movies/count
+        Devuelve {"total", "available", "rented"} sin listar las películas.
+        """
+        config = config or self.default_config
+        return self.get(
+            f"{self.url}/{shop_id}/movies/count",
+            config=config,
+            response_model=response_type,
+        )
+
+    def transfer_shop_movies(
+        self,
+        shop_id: int | str,
+        body: dict,
+        response_type: Type[T],
+        config: dict | None = None
+    ) -> Response[T]:
+        """
+        POST /shops/{id}/transfer
+        Body: {"target", "genres"?, "available"?, "delete_source"?}.
+        """
+        config = config or self.default_config
+        return self.post(
+            f"{self.url}/{shop_id}/transfer",
+            body,
+            config=config,
+            response_model=response_type,
+        )
@@ -29,6 +29,48 @@ def shop_id(services):
     yield _id
     # Cleanup best-effort
     try:
-        shop_service.delete_shop(_id)
+        shop_service.delete_shop(_id, response_type=None)
     except Exception:
         pass
+
+@pytest.fixture
+def make_shop(services):
+    """Crea tiendas (devuelve el id) y las borra, con sus películas, al terminar el test."""
+    shop_service = services["shop_service"]
+    created = []
+
+    def _make_shop(address="Cine Center", manager="Eva"):
+        resp = shop_service.add_shop({"address": address, "manager": manager}, response_type=None)
+        assert resp.status in (200, 201)
+        created.append(resp.data["id"])
+        return resp.data["id"]
+
+    yield _make_shop
+    # Cleanup best-effort
+    for _id in created:
+        try:
+            shop_service.delete_shop(_id, response_type=None)
+        except Exception:
+            pass
+
+@pytest.fixture
+def make_movie(services):
+    """Crea películas (devuelve el id) y borra las que sigan existiendo al terminar el test."""
+    movie_service = services["movie_service"]
+    created = []
+
+    def _make_movie(shop, name="Solaris", director="Tarkovsky", genres=()):
+        resp = movie_service.create_movie(
+            {"name": name, "director": director, "genres": list(genres), "shop": shop}, response_type=None
+        )
+        assert resp.status in (200, 201)
+        created.append(resp.data["id"])
+        return resp.data["id"]
+
+    yield _make_movie
+    # Cleanup best-effort: the movies of a deleted shop are already gone (404)
+    for _id in created:
+        try:
+            movie_service.delete_movie(_id, response_type=None)
+        except Exception:
+            pass
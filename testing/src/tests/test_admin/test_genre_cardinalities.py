@@ -0,0 +1,11 @@
+def test_genre_cardinalities_count_the_indexed_genres(movie_service, make_shop, make_movie):
+    shop = make_shop("Genre Street 1", "Planner")
+    before = movie_service.get(f"{movie_service.base_url}/admin/genres", response_model=dict)
+    assert before.status == 200
+    make_movie(shop, "Cardinality Test A", "Planner", ["Cardinality-Rare"])
+    make_movie(shop, "Cardinality Test B", "Planner", ["Cardinality-Rare", "Cardinality-Common"])
+
+    after = movie_service.get(f"{movie_service.base_url}/admin/genres", response_model=dict)
+    assert after.status == 200
+    assert after.data["Cardinality-Rare"] == before.data.get("Cardinality-Rare", 0) + 2
+    assert after.data["Cardinality-Common"] == before.data.get("Cardinality-Common", 0) + 1
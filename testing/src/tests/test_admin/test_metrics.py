@@ -0,0 +1,13 @@
+def test_metrics_exposes_request_latency_and_entity_counts(shop_service, movie_service):
+    resp = shop_service.add_shop({"address": "Metrics Street 1", "manager": "Prometheus"}, response_type=None)
+    assert resp.status in (200, 201)
+    assert "x-process-time" in {key.lower() for key in resp.headers}
+
+    metrics = movie_service.request("GET", f"{movie_service.base_url}/metrics")
+    assert metrics.status_code == 200
+    assert metrics.headers["content-type"].startswith("text/plain")
+    assert 'movie_shop_http_request_duration_seconds_bucket{method="POST",route="/shops",status="201"' in metrics.text \
+        or 'movie_shop_http_request_duration_seconds_bucket{method="POST",route="/shops",status="200"' in metrics.text
+    assert "movie_shop_http_requests_in_flight" in metrics.text
+    shops = [line for line in metrics.text.splitlines() if line.startswith("movie_shop_shops ")]
+    assert len(shops) == 1 and float(shops[0].split()[1]) >= 1
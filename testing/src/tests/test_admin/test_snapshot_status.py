@@ -0,0 +1,12 @@
+def test_snapshot_status_reports_the_saves(shop_service, movie_service):
+    resp = shop_service.add_shop({"address": "Snapshot Street 1", "manager": "Status"}, response_type=None)
+    assert resp.status in (200, 201)
+
+    status = movie_service.get(f"{movie_service.base_url}/admin/snapshot", response_model=dict)
+    assert status.status == 200
+    assert status.data["mode"] in ("thread", "fork", "none")
+    assert isinstance(status.data["in_progress"], bool)
+    assert status.data["failures"] == 0
+    if status.data["saves"]:
+        assert status.data["last_success_at"] is not None
+        assert status.data["last_duration"] >= 0
@@ -0,0 +1,53 @@
+import pytest
+
+
+def _movies(shop_id, count, prefix="Bulk"):
+    return [
+        {"name": f"{prefix} {i}", "director": "Batch", "genres": ["Drama"], "shop": shop_id}
+        for i in range(count)
+    ]
+
+
+@pytest.mark.smoke
+def test_bulk_create_update_delete(services, shop_id):
+    movie_service = services["movie_service"]
+
+    created = movie_service.create_movies_bulk(_movies(shop_id, 3), response_type=list[dict])
+    assert created.status == 201
+    assert [m["name"] for m in created.data] == ["Bulk 0", "Bulk 1", "Bulk 2"]
+    ids = [m["id"] for m in created.data]
+
+    updates = [{"id": mid, "name": f"Renamed {mid}", "director": "Batch", "genres": ["Comedy"]} for mid in ids]
+    updated = movie_service.update_movies_bulk(updates, response_type=list[dict])
+    assert updated.status == 200
+    assert [m["name"] for m in updated.data] == [f"Renamed {mid}" for mid in ids]
+
+    deleted = movie_service.delete_movies_bulk(ids, response_type=None)
+    assert deleted.status == 204
+    for mid in ids:
+        assert movie_service.get_movie(mid, response_type=dict).status == 404
+
+
+def test_bulk_create_with_missing_shop_creates_nothing(services, shop_id):
+    movie_service = services["movie_service"]
+    payload = _movies(shop_id, 2, prefix="Atomic") + _movies(999_999_999, 1, prefix="Atomic")
+
+    resp = movie_service.create_movies_bulk(payload, response_type=dict)
+    assert resp.status == 422
+    errors = resp.data["detail"]
+    assert [e["index"] for e in errors] == [2]
+
+    search = movie_service.search(name="Atomic", response_type=list[dict])
+    assert search.status == 200
+    assert search.data == []
+
+
+def test_bulk_delete_reports_missing_and_repeated_ids(services, shop_id):
+    movie_service = services["movie_service"]
+    created = movie_service.create_movies_bulk(_movies(shop_id, 1, prefix="Kept"), response_type=list[dict])
+    mid = created.data[0]["id"]
+
+    resp = movie_service.delete_movies_bulk([mid, 999_999_999, mid], response_type=dict)
+    assert resp.status == 422
+    assert [(e["index"], e["id"]) for e in resp.data["detail"]] == [(1, 999_999_999), (2, mid)]
+    assert movie_service.get_movie(mid, response_type=dict).status == 200
@@ -1,4 +1,6 @@
 import pytest
+from concurrent.futures import ThreadPoolExecutor
+from src.models.services.movie_service import MovieService
 
 @pytest.mark.smoke
 def test_create_movie_success(services, shop_id):
@@ -50,3 +52,19 @@ def test_create_movie_invalid_body_format(services, shop_id):
     }
     resp = movie_service.create_movie(movie=invalid_payload, response_type=dict)
     assert resp.status == 422, f"Esperaba 422 y recibí {resp.status}"
+
+
+def test_concurrent_creates_get_distinct_ids(services, shop_id):
+    def create(i):
+        payload = {"name": f"Concurrent {i}", "director": "Race", "genres": ["Drama"], "shop": shop_id}
+        return MovieService().create_movie(movie=payload, response_type=dict)
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        responses = list(pool.map(create, range(40)))
+
+    assert all(resp.status == 201 for resp in responses)
+    ids = {resp.data["id"] for resp in responses}
+    assert len(ids) == 40
+
+    shop_movies = services["shop_service"].get_shop_movies(shop_id, response_type=list[dict])
+    assert {m["id"] for m in shop_movies.data} == ids
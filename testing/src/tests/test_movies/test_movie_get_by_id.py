@@ -32,3 +32,30 @@ def test_get_movie_by_id_nonexistent_returns_404(services):
     movie_service = services["movie_service"]
     resp = movie_service.get_movie(999_999_999, response_type=dict)
     assert resp.status == 404
+
+
+def test_get_movie_by_id_conditional_get(services, shop_id):
+    movie_service = services["movie_service"]
+    r = movie_service.create_movie(
+        {"name": "Polled", "director": "Kiosk", "genres": ["Drama"], "shop": shop_id},
+        response_type=None,
+    )
+    assert r.status in (200, 201)
+    movie_id = r.data["id"]
+
+    first = movie_service.get_movie(movie_id, response_type=dict)
+    assert first.status == 200
+    etag = {k.lower(): v for k, v in first.headers.items()}.get("etag")
+    assert etag
+
+    cached = movie_service.get_movie(movie_id, response_type=dict, config={"headers": {"If-None-Match": etag}})
+    assert cached.status == 304
+
+    upd = movie_service.update_movie(
+        movie_id, {"name": "Polled 2", "director": "Kiosk", "genres": ["Drama"]}, response_type=None
+    )
+    assert upd.status == 200
+
+    changed = movie_service.get_movie(movie_id, response_type=dict, config={"headers": {"If-None-Match": etag}})
+    assert changed.status == 200
+    assert changed.data["name"] == "Polled 2"
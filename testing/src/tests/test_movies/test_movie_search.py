@@ -41,3 +41,26 @@ def test_search_movies_is_case_insensitive(services, shop_id, query):
     resp = movie_service.search(name=query, response_type=list[dict])
     assert resp.status == 200
     assert any(isinstance(m, dict) and m.get("id") == mid for m in resp.data)
+
+
+def test_search_movies_repeated_query_sees_new_movies(services, shop_id):
+    movie_service = services["movie_service"]
+    query = "Cached Query Title"
+    first = movie_service.search(name=query, response_type=list[dict])
+    assert first.status == 200
+    again = movie_service.search(name=query.upper(), response_type=list[dict])
+    assert again.data == first.data
+
+    stats = movie_service.get(f"{movie_service.base_url}/admin/search-cache", response_model=dict)
+    assert stats.status == 200
+    assert stats.data["hits"] >= 1
+
+    r = movie_service.create_movie(
+        {"name": query, "director": "Cache", "genres": ["Drama"], "shop": shop_id},
+        response_type=None,
+    )
+    assert r.status in (200, 201)
+
+    after = movie_service.search(name=query, response_type=list[dict])
+    assert after.status == 200
+    assert r.data["id"] in [m["id"] for m in after.data]
@@ -0,0 +1,33 @@
+import pytest
+
+
+@pytest.mark.smoke
+def test_update_title_changes_every_copy(movie_service, make_shop, make_movie):
+    first_shop = make_shop("Copies Street 1", "Catalog")
+    second_shop = make_shop("Copies Street 2", "Catalog")
+    copy = make_movie(first_shop, genres=["Sci-Fi"])
+    other_copy = make_movie(second_shop, genres=["Sci-Fi"])
+    other_film = make_movie(second_shop, genres=["Drama"])
+
+    new_title = {"name": "Solaris (1972)", "director": "Andrei Tarkovsky", "genres": ["Sci-Fi", "Drama"]}
+    resp = movie_service.update_title(copy, new_title, response_type=list[dict])
+    assert resp.status == 200
+    updated = {movie["id"]: movie for movie in resp.data}
+    assert {copy, other_copy} <= set(updated)
+    assert other_film not in updated
+    assert all({key: movie[key] for key in new_title} == new_title for movie in resp.data)
+
+    moved = movie_service.get_movie(other_copy, response_type=dict)
+    assert moved.status == 200
+    assert moved.data["name"] == "Solaris (1972)"
+    assert moved.data["shop"] == second_shop
+
+    untouched = movie_service.get_movie(other_film, response_type=dict)
+    assert untouched.status == 200
+    assert untouched.data["name"] == "Solaris"
+    assert untouched.data["genres"] == ["Drama"]
+
+
+def test_update_title_of_missing_movie_returns_404(movie_service):
+    resp = movie_service.update_title(999999999, {"name": "N", "director": "D", "genres": []}, response_type=None)
+    assert resp.status == 404
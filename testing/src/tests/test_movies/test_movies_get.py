@@ -17,3 +17,48 @@ def test_get_movies_returns_list_type(services):
     response = movie_service.get_movies(response_type=list[dict])
     assert response.status == 200
     assert isinstance(response.data, list)
+
+
+def test_get_movies_pages_cover_full_list(services, shop_id):
+    movie_service = services["movie_service"]
+    for i in range(5):
+        created = movie_service.create_movie(
+            {"name": f"Paged {i}", "director": "Pager", "genres": ["Drama"], "shop": shop_id},
+            response_type=dict,
+        )
+        assert created.status == 201
+
+    full = movie_service.get_movies(response_type=list[dict])
+    assert full.status == 200
+
+    first_page = movie_service.get_movies(response_type=list[dict], params={"limit": 2})
+    assert first_page.status == 200
+    assert len(first_page.data) == 2
+
+    paged = list(movie_service.iter_movies(page_size=2))
+    assert [m["id"] for m in paged] == [m["id"] for m in full.data]
+
+
+def test_get_movies_invalid_cursor_returns_400(services):
+    movie_service = services["movie_service"]
+    response = movie_service.get_movies(response_type=dict, params={"limit": 2, "cursor": "not-a-cursor"})
+    assert response.status == 400
+
+
+def test_get_movies_limit_out_of_range_returns_422(services):
+    movie_service = services["movie_service"]
+    response = movie_service.get_movies(response_type=dict, params={"limit": 0})
+    assert response.status == 422
+
+
+def test_get_movies_ndjson_stream_matches_list(services, shop_id):
+    movie_service = services["movie_service"]
+    created = movie_service.create_movie(
+        {"name": "Streamed", "director": "Lines", "genres": ["Drama"], "shop": shop_id},
+        response_type=dict,
+    )
+    assert created.status == 201
+
+    full = movie_service.get_movies(response_type=list[dict])
+    streamed = list(movie_service.stream_movies())
+    assert streamed == full.data
@@ -0,0 +1,154 @@
+# testing/src/tests/test_persistence/conftest.py
+"""
+Pruebas de persistencia: cada test levanta su propio backend (uvicorn en un puerto
+libre, con el estado en un directorio temporal), escribe datos, lo reinicia y
+verifica lo que quedó. No usan BASE_URL.
+
+BACKEND_DIR apunta al proyecto del backend (por defecto ../movie_shop_backend) y
+BACKEND_PYTHON al intérprete con sus dependencias (por defecto el que corre pytest).
+"""
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import pytest
+import requests
+
+from src.models.services.movie_service import MovieService
+from src.models.services.shop_service import ShopService
+
+BACKEND_DIR = Path(os.getenv("BACKEND_DIR", Path(__file__).resolve().parents[4] / "movie_shop_backend"))
+BACKEND_PYTHON = os.getenv("BACKEND_PYTHON", sys.executable)
+STARTUP_TIMEOUT = 30
+
+# Configuración del backend que no se hereda del entorno de quien corre las pruebas
+_BACKEND_PREFIXES = ("STATE_", "JOURNAL_", "SNAPSHOT_", "PERSISTENCE_", "STORAGE_", "SQLITE_", "PRIMARY_", "REPLICA_", "SHARD_")
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _backend_available() -> bool:
+    if not (BACKEND_DIR / "src" / "main.py").exists():
+        return False
+    check = subprocess.run([BACKEND_PYTHON, "-c", "import fastapi, uvicorn"], capture_output=True)
+    return check.returncode == 0
+
+
+class BackendServer:
+    """Un proceso del backend. `restart()` lo apaga y lo vuelve a levantar sobre los mismos archivos."""
+
+    def __init__(self, state_dir: Path, env: dict, app: str = "src.main:app"):
+        inherited = {key: value for key, value in os.environ.items() if not key.startswith(_BACKEND_PREFIXES)}
+        self.state_dir = state_dir
+        self.app = app
+        self.env = {
+            **inherited,
+            "STATE_FILE": str(state_dir / "app_state"),
+            "JOURNAL_FILE": str(state_dir / "app_state.journal"),
+            "SQLITE_FILE": str(state_dir / "app_state.db"),
+            **env,
+        }
+        self.port = _free_port()
+        self.base_url = f"http://127.0.0.1:{self.port}"
+        self.log_file = state_dir / f"server-{self.port}.log"
+        self.process = None
+
+    def start(self):
+        log = open(self.log_file, "ab")
+        self.process = subprocess.Popen(
+            [BACKEND_PYTHON, "-m", "uvicorn", self.app, "--port", str(self.port)],
+            cwd=BACKEND_DIR, env=self.env, stdout=log, stderr=subprocess.STDOUT,
+        )
+        log.close()
+        deadline = time.monotonic() + STARTUP_TIMEOUT
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                pytest.fail(f"El backend terminó al iniciar:\n{self.log()}")
+            try:
+                # Una ruta que no lee datos, para no cargar nada de un snapshot perezoso
+                requests.get(f"{self.base_url}/openapi.json", timeout=1)
+                return self
+            except requests.ConnectionError:
+                time.sleep(0.1)
+        self.stop(crash=True)
+        pytest.fail(f"El backend no respondió en {STARTUP_TIMEOUT} s:\n{self.log()}")
+
+    def stop(self, crash: bool = False):
+        """Apagado normal (SIGTERM, guarda el estado) o caída (SIGKILL, solo queda lo que ya estaba en disco)."""
+        if self.process is None:
+            return
+        self.process.send_signal(signal.SIGKILL if crash else signal.SIGTERM)
+        try:
+            self.process.wait(timeout=STARTUP_TIMEOUT)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
+        self.process = None
+
+    def restart(self, crash: bool = False, **env):
+        self.stop(crash)
+        self.env.update({key: str(value) for key, value in env.items()})
+        return self.start()
+
+    def populate(self) -> dict:
+        """Escribe un poco de todo (altas, cambios, alquiler, traslado y bajas) y devuelve los ids creados."""
+        shops, movies = self.shop_service, self.movie_service
+        shop_ids = [shops.add_shop({"address": f"Restart Street {n}", "manager": "Disk"}, response_type=dict).data["id"] for n in (1, 2, 3)]
+        films = [("Solaris", "Tarkovsky", ["Sci-Fi"]), ("Stalker", "Tarkovsky", ["Sci-Fi", "Drama"]),
+                 ("Ran", "Kurosawa", ["Drama"]), ("Ikiru", "Kurosawa", []), ("Solaris", "Tarkovsky", ["Sci-Fi"])]
+        movie_ids = [movies.create_movie({"name": name, "director": director, "genres": genres, "shop": shop_ids[0]}, response_type=dict).data["id"]
+                     for name, director, genres in films]
+        movies.update_movie(movie_ids[2], {"name": "Ran (1985)", "director": "Akira Kurosawa", "genres": ["Drama", "War"]}, response_type=dict)
+        movies.patch(f"{movies.url}/{movie_ids[1]}/rent", {"rent": True})
+        movies.patch(f"{movies.url}/{movie_ids[4]}/move", {"shop": shop_ids[1]})
+        movies.delete_movie(movie_ids[3], response_type=None)
+        shops.delete_shop(shop_ids[2], response_type=None)
+        return {"shops": shop_ids[:2], "movies": [movie_ids[0], movie_ids[1], movie_ids[2], movie_ids[4]]}
+
+    def catalog(self) -> dict:
+        """Todo lo que el backend devuelve: películas y tiendas (con sus películas), por id."""
+        movies = {movie["id"]: movie for movie in self.movie_service.iter_movies()}
+        shops = {shop["id"]: shop for shop in self.shop_service.iter_shops()}
+        return {"movies": movies, "shops": shops}
+
+    def log(self) -> str:
+        return self.log_file.read_text(errors="replace")[-4000:]
+
+    @property
+    def movie_service(self) -> MovieService:
+        return MovieService(self.base_url)
+
+    @property
+    def shop_service(self) -> ShopService:
+        return ShopService(self.base_url)
+
+
+@pytest.fixture
+def backend(tmp_path):
+    """
+    Levanta backends con la configuración dada (variables de entorno) y los apaga al
+    terminar. Comparten `tmp_path` salvo que se pase otro `state_dir`; `app` elige
+    la aplicación (por ejemplo el router de shards).
+    """
+    if not _backend_available():
+        pytest.skip(f"No se puede levantar el backend de {BACKEND_DIR} con {BACKEND_PYTHON}")
+    servers = []
+
+    def _backend(state_dir: Path = None, app: str = "src.main:app", **env):
+        state_dir = state_dir or tmp_path
+        state_dir.mkdir(parents=True, exist_ok=True)
+        server = BackendServer(state_dir, {key: str(value) for key, value in env.items()}, app)
+        servers.append(server)
+        return server.start()
+
+    yield _backend
+    for server in servers:
+        server.stop(crash=True)
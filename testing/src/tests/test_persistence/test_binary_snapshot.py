@@ -0,0 +1,31 @@
+import json
+
+import pytest
+
+BINARY_MAGIC = b"MSHPSNAP"
+
+
+@pytest.mark.parametrize("compression", ["none", "gzip"])
+def test_binary_snapshot_round_trip(backend, tmp_path, compression):
+    server = backend(SNAPSHOT_FORMAT="binary", SNAPSHOT_COMPRESSION=compression)
+    server.populate()
+    before = server.catalog()
+
+    server.restart()
+    assert (tmp_path / "app_state").read_bytes().startswith(BINARY_MAGIC)
+    assert server.catalog() == before
+
+
+def test_existing_json_snapshot_is_loaded_and_rewritten_as_binary(backend, tmp_path):
+    server = backend(SNAPSHOT_FORMAT="json")
+    server.populate()
+    before = server.catalog()
+    server.stop()
+    json.loads((tmp_path / "app_state").read_text())
+
+    # El formato del archivo se detecta al cargar; el nuevo se usa desde el primer guardado
+    server.restart(SNAPSHOT_FORMAT="binary", SNAPSHOT_COMPRESSION="gzip")
+    assert server.catalog() == before
+    server.restart()
+    assert (tmp_path / "app_state").read_bytes().startswith(BINARY_MAGIC)
+    assert server.catalog() == before
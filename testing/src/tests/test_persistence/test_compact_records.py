@@ -0,0 +1,28 @@
+import json
+
+
+def test_shared_titles_round_trip(backend, tmp_path):
+    # Las copias de una película comparten un título en memoria y en el snapshot
+    server = backend(SNAPSHOT_FORMAT="json")
+    shops = [server.shop_service.add_shop({"address": f"Copies Street {n}", "manager": "Records"}, response_type=dict).data["id"] for n in (1, 2)]
+    film = {"name": "Ivanovo detstvo · Иваново детство", "director": "Tarkovsky", "genres": ["War", "Drama"]}
+    copies = [server.movie_service.create_movie({**film, "shop": shop}, response_type=dict).data["id"] for shop in shops for _ in range(3)]
+    untitled = server.movie_service.create_movie({"name": "", "director": "", "genres": [], "shop": shops[0]}, response_type=dict).data["id"]
+    server.movie_service.patch(f"{server.movie_service.url}/{copies[0]}/rent", {"rent": True})
+    # Cambiar una sola copia la separa de las demás
+    server.movie_service.update_movie(copies[1], {**film, "genres": ["Drama", "War"]}, response_type=dict)
+    before = server.catalog()
+
+    server.restart()
+    after = server.catalog()
+    assert after == before
+    assert [after["movies"][movie_id]["genres"] for movie_id in copies] == [["War", "Drama"], ["Drama", "War"]] + [["War", "Drama"]] * 4
+    assert [after["movies"][movie_id]["rent"] for movie_id in copies] == [True] + [False] * 5
+    assert after["movies"][untitled]["name"] == ""
+
+    saved = json.loads((tmp_path / "app_state").read_text())
+    assert len(saved["titles"]) == 3
+
+    # Un cambio de título después de reiniciar alcanza a todas las copias que lo comparten
+    updated = server.movie_service.update_title(copies[2], {**film, "name": "Ivan's Childhood"}, response_type=list[dict])
+    assert sorted(movie["id"] for movie in updated.data) == [copies[0]] + copies[2:]
@@ -0,0 +1,22 @@
+import os
+
+import pytest
+
+pytestmark = pytest.mark.skipif(not hasattr(os, "fork"), reason="SNAPSHOT_FORK necesita os.fork")
+
+
+@pytest.mark.parametrize("env", [{}, {"PERSISTENCE_MODE": "journal", "JOURNAL_COMPACT_EVERY": "2"}], ids=["snapshot", "journal"])
+def test_forked_saves_survive_a_crash(backend, env):
+    # Cada guardado (o compactación) lo escribe un proceso hijo
+    server = backend(SNAPSHOT_FORK="1", SNAPSHOT_FORMAT="binary", **env)
+    server.populate()
+    before = server.catalog()
+
+    status = server.movie_service.get(f"{server.base_url}/admin/snapshot", response_model=dict).data
+    assert status["mode"] == "fork"
+    assert status["saves"] > 0
+    assert status["failures"] == 0
+    assert status["in_progress"] is False
+
+    server.restart(crash=True)
+    assert server.catalog() == before
@@ -0,0 +1,40 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+
+def _create_concurrently(server, shop_id, count):
+    def create(n):
+        resp = server.movie_service.create_movie(
+            {"name": f"Burst {n}", "director": "Group", "genres": ["Commit"], "shop": shop_id}, response_type=dict
+        )
+        assert resp.status == 201
+        return resp.data
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        return list(pool.map(create, range(count)))
+
+
+def test_acknowledged_writes_survive_a_crash(backend):
+    # Con PERSISTENCE_ACK=flush (por defecto) una escritura se responde cuando ya está en disco,
+    # aunque el flush agrupe las de muchos requests
+    server = backend(PERSISTENCE_FLUSH_INTERVAL="0.05", PERSISTENCE_FLUSH_BATCH_SIZE="10")
+    shop_id = server.shop_service.add_shop({"address": "Burst Street 1", "manager": "Flush"}, response_type=dict).data["id"]
+    created = _create_concurrently(server, shop_id, 40)
+
+    server.restart(crash=True)
+    movies = server.catalog()["movies"]
+    assert all(movies.get(movie["id"]) == movie for movie in created)
+
+
+@pytest.mark.parametrize("mode", ["snapshot", "journal"])
+def test_pending_writes_are_flushed_on_shutdown(backend, mode):
+    # Con PERSISTENCE_ACK=immediate lo pendiente se escribe al apagar el servicio
+    server = backend(PERSISTENCE_MODE=mode, PERSISTENCE_ACK="immediate", PERSISTENCE_FLUSH_INTERVAL="5")
+    shop_id = server.shop_service.add_shop({"address": "Burst Street 2", "manager": "Drain"}, response_type=dict).data["id"]
+    created = _create_concurrently(server, shop_id, 20)
+    before = server.catalog()
+
+    server.restart()
+    assert server.catalog() == before
+    assert {movie["id"] for movie in created} <= set(before["movies"])
@@ -0,0 +1,35 @@
+def test_journal_is_replayed_after_a_crash(backend, tmp_path):
+    # Sin compactar: después de la caída todo el estado sale del journal
+    server = backend(PERSISTENCE_MODE="journal", JOURNAL_COMPACT_EVERY="100000")
+    ids = server.populate()
+    before = server.catalog()
+    assert not (tmp_path / "app_state").exists()
+
+    server.restart(crash=True)
+    after = server.catalog()
+    assert after == before
+    assert set(after["movies"]) == set(ids["movies"])
+    assert after["movies"][ids["movies"][2]]["name"] == "Ran (1985)"
+    assert after["movies"][ids["movies"][1]]["rent"] is True
+    assert after["movies"][ids["movies"][3]]["shop"] == ids["shops"][1]
+
+
+def test_compacted_journal_keeps_the_state(backend, tmp_path):
+    server = backend(PERSISTENCE_MODE="journal", JOURNAL_COMPACT_EVERY="3")
+    server.populate()
+    before = server.catalog()
+    # Cada 3 registros el journal se vuelca al snapshot y vuelve a empezar
+    assert (tmp_path / "app_state").exists()
+    assert len((tmp_path / "app_state.journal").read_text().splitlines()) < 3
+
+    server.restart(crash=True)
+    assert server.catalog() == before
+
+    # Lo escrito después de reiniciar se suma a lo compactado
+    movie = server.movie_service.create_movie(
+        {"name": "Mirror", "director": "Tarkovsky", "genres": ["Drama"], "shop": next(iter(before["shops"]))}, response_type=dict
+    ).data
+    server.restart()
+    after = server.catalog()
+    assert after["movies"][movie["id"]] == movie
+    assert {movie_id: after["movies"][movie_id] for movie_id in before["movies"]} == before["movies"]
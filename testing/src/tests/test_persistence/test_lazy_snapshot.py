@@ -0,0 +1,69 @@
+def _lazy_backend(backend):
+    """Backend con snapshot binario sin comprimir, reiniciado para cargarlo con mmap."""
+    return backend(SNAPSHOT_FORMAT="binary", SNAPSHOT_LAZY_LOAD="1")
+
+
+def test_update_title_after_lazy_restart(backend):
+    server = _lazy_backend(backend)
+    shop = server.shop_service.add_shop({"address": "Lazy Street 1", "manager": "Mmap"}, response_type=dict).data["id"]
+    film = {"name": "Stalker", "director": "Tarkovsky", "genres": ["Sci-Fi"], "shop": shop}
+    copy = server.movie_service.create_movie(film, response_type=dict).data["id"]
+    other_copy = server.movie_service.create_movie(film, response_type=dict).data["id"]
+    other_film = server.movie_service.create_movie({**film, "name": "Mirror"}, response_type=dict).data["id"]
+
+    server.restart()
+    # Ninguna película se leyó todavía: el título solo existe en el archivo
+    new_title = {"name": "Stalker (1979)", "director": "Andrei Tarkovsky", "genres": ["Sci-Fi", "Drama"]}
+    resp = server.movie_service.update_title(copy, new_title, response_type=list[dict])
+    assert resp.status == 200
+    assert sorted(movie["id"] for movie in resp.data) == [copy, other_copy]
+
+    assert server.movie_service.get_movie(other_copy, response_type=dict).data["name"] == "Stalker (1979)"
+    assert server.movie_service.get_movie(other_film, response_type=dict).data["name"] == "Mirror"
+
+    missing = server.movie_service.update_title(999999999, new_title, response_type=None)
+    assert missing.status == 404
+
+
+def test_shard_title_update_after_lazy_restart(backend):
+    # El router pide el cambio por metadatos: el shard busca el título sin haber leído ninguna copia
+    server = backend(SNAPSHOT_FORMAT="binary", SNAPSHOT_LAZY_LOAD="1", SHARD_COUNT="2", SHARD_INDEX="0")
+    shop = server.shop_service.add_shop({"address": "Lazy Street 2", "manager": "Shard"}, response_type=dict).data["id"]
+    title = {"name": "Nostalghia", "director": "Tarkovsky", "genres": ["Drama"]}
+    copy = server.movie_service.create_movie({**title, "shop": shop}, response_type=dict).data["id"]
+
+    server.restart()
+    update = {"name": "Nostalghia (1983)", "director": "Tarkovsky", "genres": ["Drama"]}
+    resp = server.movie_service.put(f"{server.base_url}/admin/titles", {"title": title, "update": update}, response_model=list[dict])
+    assert resp.status == 200
+    assert [movie["id"] for movie in resp.data] == [copy]
+    assert server.movie_service.get_movie(copy, response_type=dict).data["name"] == "Nostalghia (1983)"
+
+
+def test_lazy_restart_serves_the_saved_state(backend):
+    server = _lazy_backend(backend)
+    server.populate()
+    before = server.catalog()
+
+    server.restart()
+    assert server.catalog() == before
+    # Y sigue aceptando cambios sobre lo cargado con mmap
+    movie_id = next(iter(before["movies"]))
+    resp = server.movie_service.update_movie(movie_id, {"name": "Solaris (1972)", "director": "Tarkovsky", "genres": ["Sci-Fi"]}, response_type=dict)
+    assert resp.status == 200
+    server.restart()
+    assert server.movie_service.get_movie(movie_id, response_type=dict).data["name"] == "Solaris (1972)"
+
+
+def test_journal_tail_is_replayed_over_a_lazy_snapshot(backend):
+    server = backend(SNAPSHOT_FORMAT="binary", SNAPSHOT_LAZY_LOAD="1", PERSISTENCE_MODE="journal", JOURNAL_COMPACT_EVERY="100000")
+    saved = server.populate()
+    # Apagado normal: compacta el journal en el snapshot binario
+    server.restart()
+    # Cambios que solo quedan en el journal, incluida la baja de una película que el snapshot todavía tiene
+    server.populate()
+    assert server.movie_service.delete_movie(saved["movies"][0], response_type=None).status == 204
+    before = server.catalog()
+
+    server.restart(crash=True)
+    assert server.catalog() == before
@@ -0,0 +1,42 @@
+import time
+
+
+def _wait_for(condition, timeout=10):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "la réplica no alcanzó al primario"
+        time.sleep(0.1)
+
+
+def test_replica_follows_the_primary_across_restarts(backend):
+    # Compacta seguido, así la réplica también sigue las rotaciones del journal
+    primary = backend(PERSISTENCE_MODE="journal", JOURNAL_COMPACT_EVERY="3")
+    replica = backend(PERSISTENCE_MODE="journal", PRIMARY_URL=primary.base_url, REPLICA_POLL_INTERVAL="0.05")
+    ids = primary.populate()
+    _wait_for(lambda: replica.catalog() == primary.catalog())
+
+    # Una escritura a la réplica va al primario y se lee enseguida en la réplica
+    movie = replica.movie_service.create_movie(
+        {"name": "Mirror", "director": "Tarkovsky", "genres": ["Drama"], "shop": ids["shops"][0]}, response_type=dict
+    )
+    assert movie.status == 201
+    assert replica.movie_service.get_movie(movie.data["id"], response_type=dict).data == movie.data
+    assert primary.movie_service.get_movie(movie.data["id"], response_type=dict).data == movie.data
+
+    # Una réplica que reinicia carga el snapshot y el journal del primario
+    replica.restart(crash=True)
+    assert replica.catalog() == primary.catalog()
+
+    # Y sigue al primario después de que este se cae y vuelve a levantar
+    primary.restart(crash=True)
+    primary.movie_service.delete_movie(movie.data["id"], response_type=None)
+    _wait_for(lambda: replica.catalog() == primary.catalog())
+
+
+def test_replica_rejects_writes_without_the_primary(backend):
+    primary = backend(PERSISTENCE_MODE="journal")
+    replica = backend(PERSISTENCE_MODE="journal", PRIMARY_URL=primary.base_url)
+    primary.stop()
+
+    resp = replica.shop_service.add_shop({"address": "Replica Street 1", "manager": "Nobody"}, response_type=None)
+    assert resp.status == 503
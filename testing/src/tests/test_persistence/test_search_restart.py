@@ -0,0 +1,31 @@
+import pytest
+
+QUERIES = [
+    {"name": "olar"},
+    {"name": "ran (1985"},
+    {"director": "kurosawa"},
+    {"genres": ["Sci-Fi"]},
+    {"name": "s", "genres": ["Drama"]},
+]
+
+
+def _search(server, params):
+    resp = server.movie_service.get(f"{server.base_url}/search/movies", config={"params": params}, response_model=list[dict])
+    assert resp.status == 200
+    return [movie["id"] for movie in resp.data]
+
+
+@pytest.mark.parametrize("env", [{}, {"SNAPSHOT_FORMAT": "binary", "SNAPSHOT_LAZY_LOAD": "1"}], ids=["json", "lazy"])
+def test_search_finds_the_same_movies_after_restart(backend, env):
+    # Los índices de búsqueda no se guardan: se rearman con lo cargado
+    server = backend(**env)
+    ids = server.populate()
+    before = {str(query): _search(server, query) for query in QUERIES}
+    assert before[str({"name": "ran (1985"})] == [ids["movies"][2]]
+
+    server.restart()
+    assert {str(query): _search(server, query) for query in QUERIES} == before
+    # La película renombrada se encuentra por sus datos nuevos y la borrada no aparece
+    assert _search(server, {"name": "Ran", "director": "Kurosawa", "genres": ["War"]}) == [ids["movies"][2]]
+    assert _search(server, {"director": "Akira"}) == [ids["movies"][2]]
+    assert _search(server, {"name": "ikiru"}) == []
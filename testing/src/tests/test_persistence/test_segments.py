@@ -0,0 +1,33 @@
+import json
+
+import pytest
+
+
+def _manifest(tmp_path):
+    return json.loads((tmp_path / "app_state").read_text())
+
+
+@pytest.mark.parametrize("env,crash", [({}, False), ({"PERSISTENCE_MODE": "journal", "JOURNAL_COMPACT_EVERY": "1"}, True)], ids=["snapshot", "journal"])
+def test_segments_round_trip_and_rewrite_only_changed_shops(backend, tmp_path, env, crash):
+    server = backend(SNAPSHOT_FORMAT="segments", **env)
+    ids = server.populate()
+    before = server.catalog()
+    segments = _manifest(tmp_path)["segments"]
+    # Una tienda por archivo; la borrada ya no está
+    assert sorted(int(shop_id) for shop_id in segments) == sorted(ids["shops"])
+
+    server.restart(crash=crash)
+    assert server.catalog() == before
+
+    # Un cambio en una tienda reescribe solo su archivo
+    changed, untouched = ids["shops"]
+    server.movie_service.patch(f"{server.movie_service.url}/{ids['movies'][0]}/rent", {"rent": True})
+    after_write = _manifest(tmp_path)["segments"]
+    assert after_write[str(changed)] != segments[str(changed)]
+    assert after_write[str(untouched)] == segments[str(untouched)]
+    assert sorted(path.name for path in (tmp_path / "app_state.segments").iterdir()) == sorted(after_write.values())
+
+    expected = server.catalog()
+    server.restart(crash=crash)
+    assert server.catalog() == expected
+    assert expected["movies"][ids["movies"][0]]["rent"] is True
@@ -0,0 +1,34 @@
+import pytest
+
+
+@pytest.fixture
+def sharded(backend, tmp_path):
+    """Dos shards (cada uno con su directorio de estado) y el router delante."""
+    shards = [
+        backend(tmp_path / f"shard{index}", SHARD_INDEX=index, SHARD_COUNT=2, PERSISTENCE_MODE="journal")
+        for index in range(2)
+    ]
+    router = backend(tmp_path / "router", app="src.shard_router:app", SHARD_URLS=",".join(shard.base_url for shard in shards))
+    return router, shards
+
+
+def test_sharded_data_survives_shard_crashes(sharded):
+    router, shards = sharded
+    # populate mueve una película a una tienda de otro shard (copia al destino y borrado en el origen)
+    ids = router.populate()
+    before = router.catalog()
+    assert {shop_id % 2 for shop_id in ids["shops"]} == {0, 1}
+    assert before["movies"][ids["movies"][3]]["shop"] == ids["shops"][1]
+
+    for shard in shards:
+        shard.restart(crash=True)
+    assert router.catalog() == before
+    # Cada shard guarda solo sus tiendas
+    for index, shard in enumerate(shards):
+        assert {shop_id % 2 for shop_id in shard.catalog()["shops"]} == {(index + 1) % 2}
+
+    router.restart()
+    assert router.catalog() == before
+    moved = router.movie_service.get_movie(ids["movies"][3], response_type=dict)
+    assert moved.status == 200
+    assert moved.data["shop"] == ids["shops"][1]
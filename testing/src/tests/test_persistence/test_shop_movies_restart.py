@@ -0,0 +1,32 @@
+import pytest
+
+
+def _shop_views(server, shop_ids):
+    shops = server.shop_service
+    return {
+        shop_id: {
+            "movies": [movie["id"] for movie in shops.iter_shop_movies(shop_id)],
+            "available": [movie["id"] for movie in shops.get(f"{shops.url}/{shop_id}/movies/available", response_model=list[dict]).data],
+            "count": shops.count_shop_movies(shop_id, response_type=dict).data,
+        }
+        for shop_id in shop_ids
+    }
+
+
+@pytest.mark.parametrize("env,crash", [({}, False), ({"PERSISTENCE_MODE": "journal"}, True)], ids=["snapshot", "journal"])
+def test_shop_movie_lists_after_restart(backend, env, crash):
+    # Las películas de cada tienda salen del índice tienda -> películas, que se rearma al cargar
+    server = backend(**env)
+    ids = server.populate()
+    source, target = ids["shops"]
+    resp = server.shop_service.transfer_shop_movies(source, {"target": target, "genres": ["Drama"]}, response_type=dict)
+    assert resp.status == 200
+    before = _shop_views(server, ids["shops"])
+    assert before[source]["count"]["total"] + before[target]["count"]["total"] == len(ids["movies"])
+    assert before[target]["count"]["rented"] == 1
+
+    server.restart(crash=crash)
+    assert _shop_views(server, ids["shops"]) == before
+    assert {shop_id: [movie["id"] for movie in shop["movies"]] for shop_id, shop in server.catalog()["shops"].items()} == {
+        shop_id: views["movies"] for shop_id, views in before.items()
+    }
@@ -0,0 +1,23 @@
+def test_sqlite_keeps_every_write_after_a_crash(backend, tmp_path):
+    # SQLite confirma cada escritura: no hay nada pendiente que perder
+    server = backend(STORAGE_BACKEND="sqlite")
+    server.populate()
+    before = server.catalog()
+
+    server.restart(crash=True)
+    assert (tmp_path / "app_state.db").exists()
+    assert server.catalog() == before
+
+
+def test_first_sqlite_start_imports_the_snapshot(backend):
+    server = backend(PERSISTENCE_MODE="journal")
+    server.populate()
+    before = server.catalog()
+
+    server.restart(STORAGE_BACKEND="sqlite")
+    assert server.catalog() == before
+    # Desde ahí los datos son los de la base, no los del snapshot
+    shop_id = next(iter(before["shops"]))
+    created = server.movie_service.create_movie({"name": "Mirror", "director": "Tarkovsky", "genres": [], "shop": shop_id}, response_type=dict).data
+    server.restart()
+    assert server.movie_service.get_movie(created["id"], response_type=dict).data == created
@@ -32,3 +32,15 @@ def test_get_shops_invalid_response(shop_service):
     bad_config = {"headers": {"Authorization": "Bearer wrong_token"}}
     response = shop_service.get_shops(response_type=list[dict], config=bad_config)
     assert response.status != 200
+
+
+def test_get_shops_pages_cover_full_list(shop_service):
+    for i in range(3):
+        created = shop_service.add_shop({"address": f"Paged Street {i}", "manager": "Pager"}, response_type=dict)
+        assert created.status == 201
+
+    full = shop_service.get_shops(response_type=list[dict])
+    assert full.status == 200
+
+    paged = list(shop_service.iter_shops(page_size=2))
+    assert [s["id"] for s in paged] == [s["id"] for s in full.data]
@@ -103,3 +103,56 @@ def test_get_shop_movies_invalid_id_format(shop_service):
     invalid_id = "abc"
     resp = shop_service.get_shop_movies(shop_id=invalid_id, response_type=list[dict])
     assert resp.status in (400, 422)
+
+
+def test_count_movies_in_a_shop(shop_service, movie_service):
+    shop_resp = shop_service.add_shop({"address": "Shop Count", "manager": "Ciro"}, response_type=None)
+    assert shop_resp.status in (200, 201)
+    shop_id = shop_resp.data["id"]
+
+    for name in ("Alien", "Aliens"):
+        created = movie_service.create_movie(
+            {"name": name, "director": "Scott", "genres": ["Sci-Fi"], "shop": shop_id},
+            response_type=None,
+        )
+        assert created.status in (200, 201)
+    rented_id = created.data["id"]
+
+    rent = movie_service.patch(f"{movie_service.url}/{rented_id}/rent", {"rent": True}, response_model=dict)
+    assert rent.status == 200
+
+    resp = shop_service.count_shop_movies(shop_id=shop_id, response_type=dict)
+    assert resp.status == 200
+    assert resp.data == {"total": 2, "available": 1, "rented": 1}
+
+    available = shop_service.get(f"{shop_service.url}/{shop_id}/movies/available", response_model=list[dict])
+    assert available.status == 200
+    assert [m["rent"] for m in available.data] == [False]
+
+
+def test_count_movies_nonexistent_shop_returns_404(shop_service):
+    resp = shop_service.count_shop_movies(shop_id=999_999_999, response_type=dict)
+    assert resp.status == 404
+
+
+def test_shop_movies_etag_changes_when_a_movie_is_added(shop_service, movie_service):
+    shop_resp = shop_service.add_shop({"address": "Polled Shop", "manager": "Kiosk"}, response_type=None)
+    shop_id = shop_resp.data["id"]
+
+    first = shop_service.get_shop_movies(shop_id, response_type=list[dict])
+    assert first.status == 200
+    etag = {k.lower(): v for k, v in first.headers.items()}.get("etag")
+    assert etag
+
+    cached = shop_service.get_shop_movies(shop_id, response_type=list[dict], config={"headers": {"If-None-Match": etag}})
+    assert cached.status == 304
+
+    created = movie_service.create_movie(
+        {"name": "New Arrival", "director": "Kiosk", "genres": ["Drama"], "shop": shop_id},
+        response_type=None,
+    )
+    assert created.status in (200, 201)
+
+    changed = shop_service.get_shop_movies(shop_id, response_type=list[dict], config={"headers": {"If-None-Match": etag}})
+    assert changed.status == 200
+    assert [m["id"] for m in changed.data] == [created.data["id"]]
@@ -0,0 +1,39 @@
+import pytest
+
+
+@pytest.mark.smoke
+def test_transfer_filtered_movies_between_shops(shop_service, movie_service, make_shop, make_movie):
+    source = make_shop("Closing Street 1", "Merger")
+    target = make_shop("Main Street 2", "Merger")
+    horror = make_movie(source, "Scream", "Transfer", ["Horror"])
+    comedy = make_movie(source, "Airplane", "Transfer", ["Comedy"])
+
+    resp = shop_service.transfer_shop_movies(source, {"target": target, "genres": ["Horror"]}, response_type=dict)
+    assert resp.status == 200
+    assert resp.data == {"moved": [horror], "source_deleted": False}
+
+    source_movies = shop_service.get_shop_movies(source, response_type=list[dict])
+    target_movies = shop_service.get_shop_movies(target, response_type=list[dict])
+    assert [m["id"] for m in source_movies.data] == [comedy]
+    assert [m["id"] for m in target_movies.data] == [horror]
+    assert movie_service.get_movie(horror, response_type=dict).data["shop"] == target
+
+
+def test_transfer_all_movies_and_delete_source(shop_service, make_shop, make_movie):
+    source = make_shop("Closing Street 3", "Merger")
+    target = make_shop("Main Street 4", "Merger")
+    ids = [make_movie(source, f"Merged {i}", "Transfer", ["Drama"]) for i in range(3)]
+
+    resp = shop_service.transfer_shop_movies(source, {"target": target, "delete_source": True}, response_type=dict)
+    assert resp.status == 200
+    assert resp.data == {"moved": ids, "source_deleted": True}
+
+    assert shop_service.get_shop_movies(source, response_type=dict).status == 404
+    target_movies = shop_service.get_shop_movies(target, response_type=list[dict])
+    assert [m["id"] for m in target_movies.data] == ids
+
+
+def test_transfer_to_missing_shop_returns_404(shop_service, make_shop):
+    source = make_shop("Closing Street 5", "Merger")
+    resp = shop_service.transfer_shop_movies(source, {"target": 999_999_999}, response_type=dict)
+    assert resp.status == 404